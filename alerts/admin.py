@@ -1,6 +1,7 @@
 # src/alerts/admin.py
 from django.contrib import admin
-from .models import SeuilAlerte, Alerte
+from .models import SeuilAlerte, Alerte, TacheEvaluation
+from .services import alertes_enregistrees
 
 @admin.register(SeuilAlerte)
 class SeuilAlerteAdmin(admin.ModelAdmin):
@@ -9,6 +10,17 @@ class SeuilAlerteAdmin(admin.ModelAdmin):
 
 @admin.register(Alerte)
 class AlerteAdmin(admin.ModelAdmin):
-    list_display = ('seuil', 'compteur', 'date_detection', 'est_traitee')
-    list_filter = ('est_traitee', 'date_detection')
-    actions = ['mark_as_traitee']
\ No newline at end of file
+    list_display = ('seuil', 'compteur', 'date_detection', 'nombre_depassements', 'valeur_pic', 'episode_ouvert', 'est_traitee')
+    list_filter = ('est_traitee', 'episode_ouvert', 'date_detection')
+    actions = ['mark_as_traitee']
+
+    @admin.action(description="Marquer comme traitée (clôt l'épisode)")
+    def mark_as_traitee(self, request, queryset):
+        alertes = list(queryset)
+        queryset.update(est_traitee=True, episode_ouvert=False)
+        alertes_enregistrees.send(sender=Alerte, alertes=alertes)
+
+@admin.register(TacheEvaluation)
+class TacheEvaluationAdmin(admin.ModelAdmin):
+    list_display = ('releve_id', 'compteur', 'date_releve', 'date_creation', 'reservee_le', 'tentatives')
+    list_filter = ('tentatives',)
@@ -0,0 +1,165 @@
+# src/alerts/detection.py
+"""
+Détection périodique des relevés anormaux (ANOMALIE_RELEVE) sur tout le parc.
+
+La série analysée est le débit horaire de chaque compteur, déduit des agrégats
+horaires (AgregatCompteur) : une seule requête ordonnée pour tous les compteurs,
+sans relire les relevés bruts ni l'archive froide. Pour chaque heure de la fenêtre
+évaluée, trois tests sont comparés à l'historique du compteur :
+
+- z-score          : écart à la moyenne en nombre d'écarts-types ;
+- IQR              : sortie des barrières de Tukey (Q1 - f.IQR, Q3 + f.IQR) ;
+- profil saisonnier : écart à la médiane du même créneau (jour de semaine, heure),
+                     rapporté à l'écart absolu médian (MAD) des résidus.
+
+Une heure est signalée quand au moins deux tests sur trois la rejettent, ou quand
+l'écart au profil saisonnier dépasse à lui seul deux fois la sensibilité.
+La sensibilité (nombre d'écarts tolérés) est la valeur_seuil du seuil
+ANOMALIE_RELEVE du compteur, sinon du seuil global, sinon SENSIBILITE_DEFAUT.
+"""
+import statistics
+from array import array
+from datetime import timedelta
+from itertools import groupby
+
+from django.utils import timezone
+
+from consumption.models import AgregatCompteur
+from .index_seuils import index_seuils
+from .models import Alerte
+from .services import alertes_enregistrees
+
+SENSIBILITE_DEFAUT = 3.0
+HISTORIQUE_MINIMAL = 48  # heures de débit nécessaires pour juger un compteur
+PREFIXE_DESCRIPTION = "Consommation anormale"
+
+
+def debits_horaires(lignes):
+    """
+    Débit horaire d'un compteur à partir de ses agrégats horaires (debut_periode, maximum)
+    triés : différence entre les index maximaux de deux heures consécutives, répartie
+    sur les heures sans relevé. Les reculs d'index (remise à zéro, correction) sont ignorés.
+    Retourne (heures, débits) en colonnes.
+    """
+    heures, debits = [], array('d')
+    precedente = None
+    for debut, maximum in lignes:
+        if precedente is not None:
+            ecart_heures = (debut - precedente[0]).total_seconds() / 3600
+            delta = maximum - precedente[1]
+            if delta >= 0 and ecart_heures > 0:
+                heures.append(debut)
+                debits.append(delta / ecart_heures)
+        precedente = (debut, maximum)
+    return heures, debits
+
+
+def evaluer_compteur(heures, debits, debut, sensibilite):
+    """
+    Applique les trois tests aux heures >= debut, l'historique étant les heures antérieures.
+    Retourne la liste des (heure, débit, référence du créneau, z-score) rejetées.
+    """
+    separation = next((i for i, heure in enumerate(heures) if heure >= debut), len(heures))
+    historique = debits[:separation]
+    if len(historique) < HISTORIQUE_MINIMAL or separation == len(heures):
+        return []
+
+    # Statistiques globales de l'historique
+    moyenne = statistics.fmean(historique)
+    ecart_type = statistics.pstdev(historique, moyenne)
+    q1, _, q3 = statistics.quantiles(historique, n=4)
+    iqr = q3 - q1
+    facteur_iqr = sensibilite / 2  # 3 écarts-types ~ barrières de Tukey à 1,5 IQR
+    plancher = 1e-6 * max(abs(moyenne), 1.0)
+
+    # Profil saisonnier : médiane par (jour de semaine, heure), puis dispersion robuste des résidus
+    creneaux = [(locale.weekday(), locale.hour) for locale in map(timezone.localtime, heures)]
+    valeurs_creneau = {}
+    for creneau, debit in zip(creneaux, historique):
+        valeurs_creneau.setdefault(creneau, []).append(debit)
+    medianes = {creneau: statistics.median(valeurs) for creneau, valeurs in valeurs_creneau.items()}
+    mediane_globale = statistics.median(historique)
+    residus = [debit - medianes[creneau] for creneau, debit in zip(creneaux, historique)]
+    echelle = max(1.4826 * statistics.median(map(abs, residus)), plancher)
+
+    rejets = []
+    for heure, creneau, debit in zip(heures[separation:], creneaux[separation:], debits[separation:]):
+        reference = medianes.get(creneau, mediane_globale)
+        z = (debit - moyenne) / max(ecart_type, plancher)
+        score_saisonnier = abs(debit - reference) / echelle
+        votes = (
+            abs(z) > sensibilite,
+            debit < q1 - facteur_iqr * iqr or debit > q3 + facteur_iqr * iqr,
+            score_saisonnier > sensibilite,
+            # Un écart très marqué au créneau habituel (compteur bloqué en pleine journée) suffit
+            score_saisonnier > 2 * sensibilite,
+        )
+        if sum(votes) >= 2:
+            rejets.append((heure, debit, reference, z))
+    return rejets
+
+
+def detecter_anomalies(debut=None, fin=None, historique_jours=28, compteur_ids=None):
+    """
+    Analyse les heures complètes de [debut, fin] (dernières 24 h par défaut) de tous les compteurs
+    (ou `compteur_ids`) et crée en bulk une Alerte par heure anormale. L'heure en cours est laissée
+    à l'exécution suivante : son débit change encore à chaque relevé.
+    Idempotent : une heure déjà signalée (Alerte.heure_anomalie) ne l'est pas deux fois.
+    Retourne un dict (compteurs, heures analysées, alertes créées).
+    """
+    fin = fin or timezone.now()
+    debut = debut or fin - timedelta(days=1)
+
+    agregats = AgregatCompteur.objects.filter(
+        granularite='HEURE',
+        debut_periode__gte=debut - timedelta(days=historique_jours),
+        debut_periode__lte=fin - timedelta(hours=1),
+    )
+    if compteur_ids is not None:
+        agregats = agregats.filter(compteur_id__in=compteur_ids)
+    lignes = agregats.order_by('compteur_id', 'debut_periode').values_list(
+        'compteur_id', 'debut_periode', 'maximum'
+    ).iterator(chunk_size=10000)
+
+    deja_signalees = set(
+        Alerte.objects.filter(heure_anomalie__gte=debut, heure_anomalie__lte=fin).values_list('compteur_id', 'heure_anomalie')
+    )
+
+    bilan = {'compteurs': 0, 'heures': 0, 'alertes': 0}
+    alertes = []
+    for compteur_id, groupe in groupby(lignes, key=lambda ligne: ligne[0]):
+        heures, debits = debits_horaires((debut_periode, maximum) for _, debut_periode, maximum in groupe)
+        seuil_config = index_seuils.regle('ANOMALIE_RELEVE', compteur_id)
+        sensibilite = seuil_config.valeur_seuil if seuil_config else SENSIBILITE_DEFAUT
+        bilan['compteurs'] += 1
+        bilan['heures'] += len(debits)
+
+        for heure, debit, reference, z in evaluer_compteur(heures, debits, debut, sensibilite):
+            if (compteur_id, heure) in deja_signalees:
+                continue
+            description = (
+                f"{PREFIXE_DESCRIPTION} : {debit:.2f}/h le {timezone.localtime(heure):%d/%m/%Y à %Hh} "
+                f"(référence du créneau : {reference:.2f}/h, z = {z:.1f})."
+            )
+            alertes.append(Alerte(
+                seuil=seuil_config, compteur_id=compteur_id, description=description, est_traitee=False,
+                heure_anomalie=heure,
+            ))
+
+    # Une exécution concurrente (cron superposé, reevaluer_historique) peut avoir signalé les mêmes
+    # heures depuis la lecture de deja_signalees : la contrainte unique les écarte sans faire échouer le lot.
+    # ignore_conflicts ne renvoie pas les id : les alertes enregistrées sont relues pour n'annoncer
+    # (et ne compter) que celles réellement en base avec ce contenu.
+    Alerte.objects.bulk_create(alertes, batch_size=1000, ignore_conflicts=True)
+    if alertes:
+        creees = {(alerte.compteur_id, alerte.heure_anomalie): alerte.description for alerte in alertes}
+        alertes = [
+            alerte for alerte in Alerte.objects.filter(
+                heure_anomalie__gte=debut, heure_anomalie__lte=fin, compteur_id__in={compteur_id for compteur_id, _ in creees},
+            )
+            if creees.get((alerte.compteur_id, alerte.heure_anomalie)) == alerte.description
+        ]
+        if alertes:
+            alertes_enregistrees.send(sender=Alerte, alertes=alertes)
+    bilan['alertes'] = len(alertes)
+    return bilan
@@ -0,0 +1,158 @@
+# src/alerts/diffusion.py
+"""
+Diffusion en temps réel des nouvelles alertes et des changements de réclamations (SSE).
+
+Chaque processus ASGI a un seul relais : tant qu'au moins un tableau de bord est abonné,
+il lit toutes les INTERVALLE secondes les alertes créées et les réclamations modifiées
+depuis son dernier passage (deux requêtes indexées, quel que soit le nombre d'abonnés),
+puis distribue les événements en mémoire aux abonnés concernés.
+La base sert ainsi de broker local : les alertes créées par le worker (traiter_alertes)
+ou par un autre processus sont vues comme les autres. Un abonné inactif n'est qu'une
+coroutine en attente sur sa file.
+
+Une alerte peut devenir visible après d'autres plus récentes (id et date_detection sont
+attribués avant le commit d'un long lot de saisie ou du worker) : le curseur des alertes
+relit donc les MARGE_ALERTES dernières minutes et écarte les id déjà diffusés dans cette fenêtre.
+"""
+import asyncio
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db.models import Max, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TYPE_ALERTE = 'alerte'
+TYPE_RECLAMATION = 'reclamation'
+TYPE_RESYNCHRONISER = 'resynchroniser'
+
+# Durée maximale d'une transaction qui crée des alertes (lot de saisie, lot du worker)
+MARGE_ALERTES = timedelta(minutes=5)
+
+
+class Abonne:
+    """
+    Un tableau de bord connecté et ce qu'il a le droit de voir
+    (mêmes règles que AlerteConsultationViewSet et les vues de réclamations).
+    """
+    TAILLE_FILE = 100
+
+    def __init__(self, toutes_alertes=False, zone_id=None, toutes_reclamations=False, resident_id=None):
+        self.toutes_alertes = toutes_alertes
+        self.zone_id = zone_id
+        self.toutes_reclamations = toutes_reclamations
+        self.resident_id = resident_id
+        self.file = asyncio.Queue(maxsize=self.TAILLE_FILE)
+        self.en_retard = False
+
+    def accepte(self, evenement):
+        if evenement['type'] == TYPE_ALERTE:
+            return self.toutes_alertes or (self.zone_id is not None and evenement['zone_id'] == self.zone_id)
+        return self.toutes_reclamations or (self.resident_id is not None and evenement['resident_id'] == self.resident_id)
+
+    def pousser(self, evenement):
+        try:
+            self.file.put_nowait(evenement)
+        except asyncio.QueueFull:
+            # Client trop lent : on jette et on lui demandera de recharger ses listes
+            self.en_retard = True
+
+
+def _curseurs_initiaux():
+    from claims.models import Reclamation
+    from .models import Alerte
+
+    derniere_modification = Reclamation.objects.aggregate(date=Max('date_modification'))['date']
+    # Alertes : (date la plus récente vue, {id: date_detection} des alertes déjà vues dans la marge)
+    maintenant = timezone.now()
+    deja_vues = dict(Alerte.objects.filter(date_detection__gte=maintenant - MARGE_ALERTES).values_list('id', 'date_detection'))
+    return {
+        TYPE_ALERTE: (max([maintenant, *deja_vues.values()]), deja_vues),
+        TYPE_RECLAMATION: (derniere_modification, 0),
+    }
+
+
+def _lire_evenements(curseurs, limite=500):
+    """ Événements apparus depuis `curseurs`, et les curseurs avancés. """
+    from claims.models import Reclamation
+    from claims.serializers import ReclamationTraitementSerializer
+    from .models import Alerte
+    from .serializers import AlerteSerializer
+
+    evenements = []
+    date, deja_vues = curseurs[TYPE_ALERTE]
+    alertes = list(
+        Alerte.objects.filter(date_detection__gte=date - MARGE_ALERTES).exclude(id__in=list(deja_vues))
+        .select_related('compteur', 'seuil').order_by('date_detection', 'id')[:limite]
+    )
+    for alerte in alertes:
+        evenements.append({
+            'type': TYPE_ALERTE,
+            'id': alerte.id,
+            'zone_id': alerte.compteur.partie_commune_id,
+            'donnees': AlerteSerializer(alerte).data,
+        })
+    if alertes:
+        date = max(date, alertes[-1].date_detection)
+        deja_vues = {
+            alerte_id: detection
+            for alerte_id, detection in [*deja_vues.items(), *((alerte.id, alerte.date_detection) for alerte in alertes)]
+            if detection >= date - MARGE_ALERTES
+        }
+        curseurs = {**curseurs, TYPE_ALERTE: (date, deja_vues)}
+
+    date, reclamation_id = curseurs[TYPE_RECLAMATION]
+    reclamations = Reclamation.objects.select_related('resident')
+    if date is not None:
+        reclamations = reclamations.filter(
+            Q(date_modification__gt=date) | Q(date_modification=date, id__gt=reclamation_id)
+        )
+    reclamations = list(reclamations.order_by('date_modification', 'id')[:limite])
+    for reclamation in reclamations:
+        evenements.append({
+            'type': TYPE_RECLAMATION,
+            'id': reclamation.id,
+            'resident_id': reclamation.resident_id,
+            'donnees': ReclamationTraitementSerializer(reclamation).data,
+        })
+    if reclamations:
+        curseurs = {**curseurs, TYPE_RECLAMATION: (reclamations[-1].date_modification, reclamations[-1].id)}
+    return evenements, curseurs
+
+
+class Diffuseur:
+    INTERVALLE = 1.0
+
+    def __init__(self):
+        self.abonnes = set()
+        self._relais = None
+
+    def abonner(self, abonne):
+        self.abonnes.add(abonne)
+        if self._relais is None or self._relais.done():
+            self._relais = asyncio.get_running_loop().create_task(self._relayer())
+
+    def desabonner(self, abonne):
+        self.abonnes.discard(abonne)
+
+    def publier(self, evenement):
+        for abonne in list(self.abonnes):
+            if abonne.accepte(evenement):
+                abonne.pousser(evenement)
+
+    async def _relayer(self):
+        curseurs = await sync_to_async(_curseurs_initiaux)()
+        while self.abonnes:
+            await asyncio.sleep(self.INTERVALLE)
+            try:
+                evenements, curseurs = await sync_to_async(_lire_evenements)(curseurs)
+            except Exception:
+                logger.exception("Lecture des événements impossible, nouvel essai au prochain passage")
+                continue
+            for evenement in evenements:
+                self.publier(evenement)
+
+
+diffuseur = Diffuseur()
@@ -0,0 +1,130 @@
+# src/alerts/file_attente.py
+"""
+File d'attente locale (table TacheEvaluation) pour évaluer les alertes hors requête.
+
+- mettre_en_file() : appelé à la saisie, une insertion en bulk par lot de relevés ;
+- reserver()       : un worker pose un bail (reservee_le, reservee_par) sur les plus anciennes
+                     tâches libres ou dont le bail a expiré ;
+- traiter_lot()    : évaluation de tout le lot réservé avec les seuils à jour (VersionSeuils),
+                     puis création des alertes et suppression des tâches dans la même transaction. Un lot en échec est coupé en deux jusqu'à
+                     isoler les tâches fautives. Un worker arrêté en cours de route
+                     laisse ses tâches, reprises à l'expiration du bail (au moins une fois) ;
+- etat_file()      : profondeur et retard de la file.
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from consumption.models import Releve
+from .index_seuils import index_seuils
+from .models import TacheEvaluation
+from .services import evaluer_regles, evaluer_seuils, verifier_coherence, precedents
+
+logger = logging.getLogger(__name__)
+
+DUREE_BAIL = timedelta(minutes=5)
+TENTATIVES_MAX = 5
+
+
+def mettre_en_file(releves, derniers):
+    """ Enregistre les relevés à évaluer avec leur relevé précédent (cf. services.precedents). """
+    TacheEvaluation.objects.bulk_create(
+        (
+            TacheEvaluation(
+                compteur_id=releve.compteur_id,
+                releve_id=releve.id,
+                valeur=releve.valeur,
+                date_releve=releve.date_releve,
+                valeur_precedente=precedente,
+                date_precedente=date_precedente,
+            )
+            for releve, (precedente, date_precedente) in zip(releves, precedents(releves, derniers))
+        ),
+        batch_size=1000,
+    )
+
+
+def _disponibles(maintenant):
+    return TacheEvaluation.objects.filter(
+        Q(reservee_le__isnull=True) | Q(reservee_le__lt=maintenant - DUREE_BAIL),
+        tentatives__lt=TENTATIVES_MAX,
+    )
+
+
+def reserver(taille, jeton=None):
+    """
+    Réserve jusqu'à `taille` tâches pour ce worker et les retourne (ordre d'arrivée).
+    La mise à jour reprend la condition de disponibilité : deux workers ne peuvent pas réserver la même tâche.
+    """
+    jeton = jeton or uuid.uuid4().hex
+    maintenant = timezone.now()
+    ids = list(_disponibles(maintenant).order_by('id').values_list('id', flat=True)[:taille])
+    if not ids:
+        return []
+    _disponibles(maintenant).filter(id__in=ids).update(reservee_le=maintenant, reservee_par=jeton)
+    return list(TacheEvaluation.objects.filter(reservee_par=jeton, id__in=ids).order_by('id'))
+
+
+def _evaluer(taches):
+    """ Évalue des tâches réservées, crée leurs alertes et les supprime (une transaction). Retourne les alertes créées. """
+    releves = [
+        Releve(id=tache.releve_id, compteur_id=tache.compteur_id, valeur=tache.valeur, date_releve=tache.date_releve)
+        for tache in taches
+    ]
+    with transaction.atomic():
+        alertes = [seuil or regle for seuil, regle in zip(evaluer_seuils(releves), evaluer_regles(releves))]
+        anomalies = verifier_coherence(
+            releves, precedents_releves=[(tache.valeur_precedente, tache.date_precedente) for tache in taches]
+        )
+        TacheEvaluation.objects.filter(id__in=[tache.id for tache in taches]).delete()
+    return sum(1 for alerte in alertes if alerte) + sum(1 for alerte in anomalies if alerte)
+
+
+def _evaluer_isole(taches):
+    """
+    Évalue les tâches ; si le lot échoue, il est coupé en deux et chaque moitié réessayée,
+    jusqu'à isoler les tâches fautives : seules celles-ci sont comptées en échec (tentatives + 1,
+    bail levé pour une nouvelle tentative ; au-delà de TENTATIVES_MAX la tâche reste pour analyse).
+    """
+    try:
+        return _evaluer(taches)
+    except Exception:
+        if len(taches) > 1:
+            milieu = len(taches) // 2
+            return _evaluer_isole(taches[:milieu]) + _evaluer_isole(taches[milieu:])
+        tache = taches[0]
+        logger.exception("Échec de l'évaluation du relevé %s (tentative %s)", tache.releve_id, tache.tentatives + 1)
+        TacheEvaluation.objects.filter(id=tache.id).update(
+            tentatives=tache.tentatives + 1, reservee_le=None, reservee_par=''
+        )
+        return 0
+
+
+def traiter_lot(taille=5000):
+    """
+    Réserve et évalue un lot. Retourne (tâches traitées, alertes créées).
+    Un relevé qui fait échouer l'évaluation n'arrête pas le worker et ne pénalise pas le reste du lot.
+    """
+    taches = reserver(taille)
+    if not taches:
+        return 0, 0
+    # Seuils modifiés par l'API (autre processus) : pris en compte dès ce lot
+    index_seuils.synchroniser()
+    return len(taches), _evaluer_isole(taches)
+
+
+def etat_file():
+    """ Profondeur (en attente, réservées, en échec) et retard (âge de la plus ancienne tâche) de la file. """
+    maintenant = timezone.now()
+    taches = TacheEvaluation.objects.all()
+    plus_ancienne = taches.filter(tentatives__lt=TENTATIVES_MAX).aggregate(date=Min('date_creation'))['date']
+    return {
+        'profondeur': taches.filter(tentatives__lt=TENTATIVES_MAX).count(),
+        'reservees': taches.filter(reservee_le__gte=maintenant - DUREE_BAIL).count(),
+        'en_echec': taches.filter(tentatives__gte=TENTATIVES_MAX).count(),
+        'retard_secondes': (maintenant - plus_ancienne).total_seconds() if plus_ancienne else 0.0,
+    }
@@ -0,0 +1,123 @@
+# src/alerts/index_seuils.py
+"""
+Index des seuils en mémoire (un par processus).
+
+Toutes les règles SeuilAlerte et les seuil_alerte des compteurs sont chargés en
+deux requêtes, puis la résolution se fait sans accès à la base :
+
+1. règle propre au compteur (SeuilAlerte.compteur = ce compteur, la plus ancienne) ;
+2. Compteur.seuil_alerte (surconsommation uniquement ; vide, nul ou négatif vaut « non défini ») ;
+3. règle globale (SeuilAlerte sans compteur).
+
+L'index est invalidé par les signaux (alerts/signals.py) à chaque écriture de
+SeuilAlerte ou de Compteur dans ce processus, qui incrémentent aussi VersionSeuils.
+Les autres processus le rechargent au plus tard après DUREE_VIE secondes, dès qu'un
+compteur inconnu est demandé, ou à l'appel de synchroniser() quand la version en base
+a changé (une requête ; le worker traiter_alertes l'appelle avant chaque lot).
+
+Les règles déclaratives (type REGLE) y sont analysées et compilées une fois par
+chargement (alerts/regles.py) ; toutes celles d'un compteur et les globales s'appliquent.
+"""
+import logging
+import threading
+import time
+
+from .regles import RegleCompilee, RegleInvalide
+
+logger = logging.getLogger(__name__)
+
+
+def _version():
+    from .models import VersionSeuils
+
+    return VersionSeuils.objects.filter(id=1).values_list('version', flat=True).first() or 0
+
+
+class _Etat:
+    def __init__(self, version, regles, globales, seuils_compteur, compilees):
+        self.version = version              # VersionSeuils lue avant le chargement
+        self.regles = regles                # {(type_alerte, compteur_id): SeuilAlerte}
+        self.globales = globales            # {type_alerte: SeuilAlerte}
+        self.seuils_compteur = seuils_compteur  # {compteur_id: seuil_alerte}
+        self.compilees = compilees          # {compteur_id ou None: [(SeuilAlerte, RegleCompilee)]}
+        self.charge_le = time.monotonic()
+
+
+class IndexSeuils:
+    DUREE_VIE = 300
+
+    def __init__(self):
+        self._etat = None
+        self._verrou = threading.Lock()
+
+    def invalider(self):
+        self._etat = None
+
+    def synchroniser(self):
+        """ Invalide l'index si un autre processus a modifié les seuils depuis son chargement. """
+        etat = self._etat
+        if etat is not None and _version() != etat.version:
+            self.invalider()
+
+    def _charger(self):
+        from consumption.models import Compteur
+        from .models import SeuilAlerte
+
+        # Lue avant les règles : une écriture concurrente du chargement sera revue au prochain synchroniser()
+        version = _version()
+        regles, globales, compilees = {}, {}, {}
+        for seuil in SeuilAlerte.objects.order_by('id'):
+            if seuil.type_alerte == 'REGLE':
+                try:
+                    regle = RegleCompilee(seuil.expression, seuil.valeur_seuil)
+                except RegleInvalide as erreur:
+                    logger.warning("Règle %s ignorée : %s", seuil.id, erreur)
+                    continue
+                compilees.setdefault(seuil.compteur_id, []).append((seuil, regle))
+            elif seuil.compteur_id is None:
+                globales.setdefault(seuil.type_alerte, seuil)
+            else:
+                regles.setdefault((seuil.type_alerte, seuil.compteur_id), seuil)
+        seuils_compteur = dict(Compteur.objects.values_list('id', 'seuil_alerte'))
+        return _Etat(version, regles, globales, seuils_compteur, compilees)
+
+    def _index(self, compteur_id=None):
+        etat = self._etat
+        if (
+            etat is None
+            or time.monotonic() - etat.charge_le > self.DUREE_VIE
+            or (compteur_id is not None and compteur_id not in etat.seuils_compteur)
+        ):
+            with self._verrou:
+                # Un seul rechargement si plusieurs threads arrivent ensemble ; l'état est remplacé d'un bloc
+                if self._etat is etat:
+                    self._etat = self._charger()
+                etat = self._etat
+        return etat
+
+    def regle(self, type_alerte, compteur_id):
+        """ SeuilAlerte applicable (propre au compteur, sinon globale), ou None. """
+        etat = self._index(compteur_id)
+        return etat.regles.get((type_alerte, compteur_id)) or etat.globales.get(type_alerte)
+
+    def surconsommation(self, compteur_id):
+        """ (valeur du seuil, SeuilAlerte ou None si seuil_alerte du compteur) ou None. """
+        etat = self._index(compteur_id)
+        seuil = etat.regles.get(('SURCONS', compteur_id))
+        if seuil is not None:
+            return seuil.valeur_seuil, seuil
+        seuil_compteur = etat.seuils_compteur.get(compteur_id)
+        if seuil_compteur is not None and seuil_compteur > 0:
+            return seuil_compteur, None
+        seuil = etat.globales.get('SURCONS')
+        if seuil is not None:
+            return seuil.valeur_seuil, seuil
+        return None
+
+    def regles_compilees(self, compteur_id):
+        """ Règles REGLE applicables au compteur (les siennes puis les globales) : [(SeuilAlerte, RegleCompilee)]. """
+        etat = self._index(compteur_id)
+        return etat.compilees.get(compteur_id, []) + etat.compilees.get(None, [])
+
+
+index_seuils = IndexSeuils()
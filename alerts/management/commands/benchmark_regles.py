@@ -0,0 +1,78 @@
+# src/alerts/management/commands/benchmark_regles.py
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from alerts.regles import RegleCompilee, colonnes_serie
+
+REGLES_TYPES = [
+    "debit > seuil",
+    "debit > seuil pendant 2h",
+    "variation > 200",
+    "ecart_moyenne(24h) > 50",
+    "ecart_moyenne(7j) > 30 et debit > 1",
+    "par_m2 > 0.05 pendant 3h",
+    "consommation > 10 et variation > 100",
+    "valeur >= seuil",
+]
+
+
+class Command(BaseCommand):
+    """
+    Mesure du moteur de règles (alerts/regles.py) sur des séries synthétiques, sans base de données :
+    compilation, calcul des mesures par compteur puis évaluation de toutes les règles sur chaque relevé.
+    """
+    help = "Mesure le nombre d'évaluations de règles par seconde du moteur de règles d'alerte."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compteurs', type=int, default=100)
+        parser.add_argument('--releves', type=int, default=2000, help="Relevés par compteur (pas de 15 min).")
+        parser.add_argument('--regles', type=int, default=16, help="Règles appliquées à chaque compteur.")
+
+    def handle(self, *args, **options):
+        if min(options['compteurs'], options['releves'], options['regles']) < 1:
+            raise CommandError("Les paramètres doivent être positifs.")
+        aleatoire = random.Random(42)
+
+        depart = time.perf_counter()
+        regles = [
+            RegleCompilee(REGLES_TYPES[i % len(REGLES_TYPES)], valeur_seuil=5.0 + i)
+            for i in range(options['regles'])
+        ]
+        duree_compilation = time.perf_counter() - depart
+        noms = set().union(*(regle.colonnes for regle in regles))
+
+        series = []
+        for _ in range(options['compteurs']):
+            instants, valeurs, index = [], [], 0.0
+            for i in range(options['releves']):
+                index += max(aleatoire.gauss(1.0, 0.5), 0.0) * (20 if aleatoire.random() < 0.01 else 1)
+                instants.append(i * 900.0)
+                valeurs.append(index)
+            series.append((instants, valeurs, aleatoire.uniform(20, 500)))
+
+        duree_mesures = duree_evaluation = 0.0
+        declenchements = 0
+        for instants, valeurs, surface in series:
+            depart = time.perf_counter()
+            colonnes = colonnes_serie(instants, valeurs, surface, noms)
+            duree_mesures += time.perf_counter() - depart
+            depart = time.perf_counter()
+            for regle in regles:
+                declenchements += sum(regle.evaluer(colonnes))
+            duree_evaluation += time.perf_counter() - depart
+
+        evaluations = options['compteurs'] * options['releves'] * options['regles']
+        total = duree_mesures + duree_evaluation
+        self.stdout.write(
+            f"{options['regles']} règles compilées en {duree_compilation * 1000:.1f} ms ; "
+            f"{options['compteurs'] * options['releves']} relevés, {evaluations} évaluations, {declenchements} déclenchements."
+        )
+        self.stdout.write(
+            f"Mesures : {duree_mesures:.2f}s, règles : {duree_evaluation:.2f}s."
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{evaluations / total:,.0f} évaluations de règle par seconde "
+            f"({evaluations / duree_evaluation:,.0f}/s hors calcul des mesures)."
+        ))
@@ -0,0 +1,34 @@
+# src/alerts/management/commands/detecter_anomalies.py
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from alerts.detection import detecter_anomalies
+
+
+class Command(BaseCommand):
+    """
+    Détection planifiée des consommations anormales (ANOMALIE_RELEVE) sur tout le parc :
+    z-score, IQR et profil saisonnier (jour de semaine, heure) sur les agrégats horaires.
+    À lancer par cron (par exemple toutes les heures avec --heures 24 : les heures déjà signalées sont ignorées).
+    """
+    help = "Analyse les dernières heures de consommation de tous les compteurs et crée les alertes d'anomalie."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--heures', type=int, default=24, help="Fenêtre analysée (heures écoulées).")
+        parser.add_argument('--historique-jours', type=int, default=28, help="Historique servant de référence.")
+
+    def handle(self, *args, **options):
+        if options['heures'] < 1 or options['historique_jours'] < 1:
+            raise CommandError("--heures et --historique-jours doivent être positifs.")
+        fin = timezone.now()
+        debut = fin - timedelta(hours=options['heures'])
+
+        depart = time.monotonic()
+        bilan = detecter_anomalies(debut, fin, historique_jours=options['historique_jours'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{bilan['compteurs']} compteurs, {bilan['heures']} heures analysées en "
+            f"{time.monotonic() - depart:.1f}s : {bilan['alertes']} alerte(s) d'anomalie créée(s)."
+        ))
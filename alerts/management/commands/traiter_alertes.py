@@ -0,0 +1,62 @@
+# src/alerts/management/commands/traiter_alertes.py
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from alerts.file_attente import traiter_lot, etat_file
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Worker d'évaluation des alertes : vide la file TacheEvaluation par lots
+    (seuils et cohérence des relevés), sans broker externe.
+    Plusieurs workers peuvent tourner en parallèle : chaque lot est réservé par un bail.
+    """
+    help = "Évalue en continu les relevés en attente (ou une seule fois avec --vider)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-lot', type=int, default=5000, help="Tâches réservées et évaluées par lot.")
+        parser.add_argument('--pause', type=float, default=1.0, help="Attente (s) quand la file est vide.")
+        parser.add_argument('--vider', action='store_true', help="Traite la file jusqu'à ce qu'elle soit vide, puis s'arrête.")
+        parser.add_argument('--etat', action='store_true', help="Affiche la profondeur et le retard de la file, sans rien traiter.")
+
+    def handle(self, *args, **options):
+        if options['taille_lot'] < 1:
+            raise CommandError("--taille-lot doit être positif.")
+        if options['etat']:
+            self.afficher_etat()
+            return
+
+        total = alertes = 0
+        debut = time.monotonic()
+        try:
+            while True:
+                try:
+                    traitees, creees = traiter_lot(options['taille_lot'])
+                except Exception:
+                    # Base indisponible par exemple : le worker attend et réessaie au lieu de s'arrêter
+                    logger.exception("Échec du traitement d'un lot d'alertes")
+                    time.sleep(options['pause'])
+                    continue
+                total, alertes = total + traitees, alertes + creees
+                if traitees:
+                    duree = time.monotonic() - debut
+                    self.stdout.write(f"{total} relevés évalués ({total / duree:.0f}/s), {alertes} alerte(s).")
+                    continue
+                if options['vider']:
+                    break
+                time.sleep(options['pause'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Arrêt : {total} relevés évalués, {alertes} alerte(s) créée(s)."))
+        self.afficher_etat()
+
+    def afficher_etat(self):
+        etat = etat_file()
+        self.stdout.write(
+            f"File : {etat['profondeur']} en attente ({etat['reservees']} réservées, {etat['en_echec']} en échec), "
+            f"retard {etat['retard_secondes']:.1f}s."
+        )
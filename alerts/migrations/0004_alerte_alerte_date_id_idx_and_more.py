@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0003_alter_alerte_seuil'),
+        ('consumption', '0006_releve_releve_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alerte',
+            index=models.Index(fields=['-date_detection', '-id'], name='alerte_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alerte',
+            index=models.Index(fields=['compteur', '-date_detection', '-id'], name='alerte_compteur_date_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 08:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0004_alerte_alerte_date_id_idx_and_more'),
+        ('consumption', '0007_compteur_dernier_releve'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TacheEvaluation',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('releve_id', models.IntegerField()),
+                ('valeur', models.FloatField()),
+                ('date_releve', models.DateTimeField()),
+                ('valeur_precedente', models.FloatField(blank=True, null=True)),
+                ('date_precedente', models.DateTimeField(blank=True, null=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('reservee_le', models.DateTimeField(blank=True, null=True)),
+                ('reservee_par', models.CharField(blank=True, default='', max_length=64)),
+                ('tentatives', models.PositiveSmallIntegerField(default=0)),
+                ('compteur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='consumption.compteur')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['reservee_le', 'id'], name='tache_reservation_idx'), models.Index(fields=['reservee_par'], name='tache_jeton_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0005_tache_evaluation'),
+        ('consumption', '0007_compteur_dernier_releve'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alerte',
+            name='date_dernier_releve',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='alerte',
+            name='date_premier_releve',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='alerte',
+            name='episode_ouvert',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='alerte',
+            name='nombre_depassements',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='alerte',
+            name='valeur_pic',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='alerte',
+            index=models.Index(condition=models.Q(('episode_ouvert', True), ('est_traitee', False)), fields=['compteur', 'seuil'], name='alerte_episode_ouvert_idx'),
+        ),
+    ]
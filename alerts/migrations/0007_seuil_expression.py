@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 08:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0006_alerte_episode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seuilalerte',
+            name='expression',
+            field=models.CharField(blank=True, default='', help_text='Règle REGLE, par exemple « debit > seuil pendant 2h » ou « ecart_moyenne(24h) > 50 ».', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='seuilalerte',
+            name='type_alerte',
+            field=models.CharField(choices=[('SURCONS', 'Surconsommation'), ('ANOMALIE_RELEVE', 'Incohérence de relevé'), ('REGLE', 'Règle personnalisée')], default='SURCONS', max_length=50),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0007_seuil_expression'),
+        ('consumption', '0007_compteur_dernier_releve'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alerte',
+            name='heure_anomalie',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='alerte',
+            constraint=models.UniqueConstraint(condition=models.Q(('heure_anomalie__isnull', False)), fields=('compteur', 'heure_anomalie'), name='alerte_heure_anomalie_unique'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-18 10:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0008_alerte_heure_anomalie'),
+        ('consumption', '0008_compteur_seuil_alerte_facultatif'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='seuilalerte',
+            name='compteur',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='consumption.compteur'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+def creer_version(apps, schema_editor):
+    apps.get_model('alerts', 'VersionSeuils').objects.get_or_create(id=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0009_seuil_compteur_cascade'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionSeuils',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(creer_version, migrations.RunPython.noop),
+    ]
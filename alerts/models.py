@@ -8,14 +8,23 @@ class SeuilAlerte(models.Model):
     TYPE_CHOICES = [
         ('SURCONS', 'Surconsommation'),
         ('ANOMALIE_RELEVE', 'Incohérence de relevé'),
+        ('REGLE', 'Règle personnalisée'),
     ]
+    # ANOMALIE_RELEVE : valeur_seuil est la sensibilité (nombre d'écarts tolérés),
+    # utilisée à la saisie et par la détection périodique (alerts/detection.py)
+    # REGLE : condition décrite par `expression` (voir alerts/regles.py), où « seuil » vaut valeur_seuil
     
     id = models.AutoField(primary_key=True)
     type_alerte = models.CharField(max_length=50, choices=TYPE_CHOICES, default='SURCONS')
     valeur_seuil = models.FloatField(help_text="Valeur absolue ou pourcentage de dépassement.")
+    expression = models.CharField(
+        max_length=255, blank=True, default='',
+        help_text="Règle REGLE, par exemple « debit > seuil pendant 2h » ou « ecart_moyenne(24h) > 50 »."
+    )
     
-    # Relation : Le seuil peut être lié à un Compteur spécifique (ou global si null)
-    compteur = models.ForeignKey(Compteur, on_delete=models.SET_NULL, null=True, blank=True)
+    # Relation : Le seuil peut être lié à un Compteur spécifique (ou global si null).
+    # Supprimé avec son compteur : une règle propre ne doit jamais devenir une règle globale
+    compteur = models.ForeignKey(Compteur, on_delete=models.CASCADE, null=True, blank=True)
     date_creation = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -30,5 +39,76 @@ class Alerte(models.Model):
     est_traitee = models.BooleanField(default=False)
     compteur = models.ForeignKey('consumption.Compteur', on_delete=models.CASCADE, related_name='alertes')
 
+    # Épisode de dépassement : les relevés suivants au-dessus du même seuil mettent à jour
+    # cette alerte tant qu'elle est ouverte (retour sous le seuil ou alerte traitée = épisode clos)
+    episode_ouvert = models.BooleanField(default=False)
+    nombre_depassements = models.PositiveIntegerField(default=1)
+    valeur_pic = models.FloatField(null=True, blank=True)
+    date_premier_releve = models.DateTimeField(null=True, blank=True)
+    date_dernier_releve = models.DateTimeField(null=True, blank=True)
+    # Détection périodique (alerts/detection.py) : heure signalée, une alerte au plus par (compteur, heure)
+    heure_anomalie = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['compteur', 'heure_anomalie'], name='alerte_heure_anomalie_unique',
+                condition=models.Q(heure_anomalie__isnull=False),
+            ),
+        ]
+        indexes = [
+            # Pagination par curseur de AlerteConsultationViewSet (globale et par compteur/zone)
+            models.Index(fields=['-date_detection', '-id'], name='alerte_date_id_idx'),
+            models.Index(fields=['compteur', '-date_detection', '-id'], name='alerte_compteur_date_idx'),
+            # Recherche de l'épisode ouvert d'un compteur à chaque évaluation (index partiel : quelques lignes)
+            models.Index(
+                fields=['compteur', 'seuil'], name='alerte_episode_ouvert_idx',
+                condition=models.Q(episode_ouvert=True, est_traitee=False),
+            ),
+        ]
+
+    def __str__(self):
+        return f"Alerte sur {self.compteur.reference} ({'Traitée' if self.est_traitee else 'Ouverte'})"
+
+class TacheEvaluation(models.Model):
+    """
+    File d'attente des relevés à évaluer (seuils, cohérence), traitée par
+    `python manage.py traiter_alertes` hors du chemin de la requête.
+    Le relevé est recopié (pas de clé étrangère : il peut être archivé entre-temps),
+    avec le dernier relevé connu du compteur au moment de la saisie.
+    Une tâche réservée dont le bail expire est reprise : traitement « au moins une fois ».
+    """
+    id = models.BigAutoField(primary_key=True)
+    compteur = models.ForeignKey('consumption.Compteur', on_delete=models.CASCADE, related_name='+')
+    releve_id = models.IntegerField()
+    valeur = models.FloatField()
+    date_releve = models.DateTimeField()
+    valeur_precedente = models.FloatField(null=True, blank=True)
+    date_precedente = models.DateTimeField(null=True, blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    reservee_le = models.DateTimeField(null=True, blank=True)
+    reservee_par = models.CharField(max_length=64, blank=True, default='')
+    tentatives = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Réservation des tâches libres (ou au bail expiré) dans l'ordre d'arrivée
+            models.Index(fields=['reservee_le', 'id'], name='tache_reservation_idx'),
+            models.Index(fields=['reservee_par'], name='tache_jeton_idx'),
+        ]
+
+    def __str__(self):
+        return f"Évaluation du relevé {self.releve_id} ({self.compteur_id})"
+
+
+class VersionSeuils(models.Model):
+    """
+    Ligne unique incrémentée à chaque écriture de SeuilAlerte ou de Compteur (alerts/signals.py) :
+    les processus de longue durée (worker traiter_alertes) la comparent à celle de leur
+    index des seuils pour le recharger sans attendre sa durée de vie (alerts/index_seuils.py).
+    """
+    id = models.AutoField(primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
     def __str__(self):
-        return f"Alerte sur {self.compteur.reference} ({'Traitée' if self.est_traitee else 'Ouverte'})"
\ No newline at end of file
+        return f"Version des seuils {self.version}"
@@ -0,0 +1,206 @@
+# src/alerts/regles.py
+"""
+Moteur de règles d'alerte déclaratives (SeuilAlerte de type REGLE, champ `expression`).
+
+Grammaire :
+
+    regle     := condition ("et" condition)* ["pendant" DUREE]
+    condition := mesure OP (NOMBRE | "seuil")
+    mesure    := "valeur" | "consommation" | "debit" | "variation" | "par_m2"
+               | "ecart_moyenne" "(" DUREE ")"
+    OP        := ">" | ">=" | "<" | "<="
+    DUREE     := NOMBRE ("min" | "h" | "j")
+
+Mesures, pour chaque relevé comparé au précédent du même compteur :
+
+- valeur        : index relevé ;
+- consommation  : écart d'index depuis le relevé précédent (un recul compte pour 0) ;
+- debit         : consommation par heure (vitesse de variation de l'index) ;
+- variation     : évolution du débit par rapport à l'intervalle précédent, en % ;
+- par_m2        : consommation rapportée à la surface de la partie commune ;
+- ecart_moyenne : % du débit au-dessus de sa moyenne glissante sur la durée donnée.
+
+"seuil" vaut la valeur_seuil de la règle. "pendant 3h" exige que la condition
+soit vraie sur tous les relevés d'au moins 3 heures consécutives.
+
+Exemples : "debit > seuil pendant 2h", "ecart_moyenne(24h) > 50 et par_m2 > 0.2".
+
+Une règle est analysée et compilée une seule fois (comparaisons du module operator liées
+à leurs seuils, gardées par l'index des seuils), puis évaluée colonne par colonne sur toute
+la série d'un compteur.
+"""
+import operator
+import re
+from datetime import timedelta
+
+MESURES = ('valeur', 'consommation', 'debit', 'variation', 'par_m2', 'ecart_moyenne')
+OPERATEURS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+UNITES = {'min': 60, 'h': 3600, 'j': 86400}
+
+_JETONS = re.compile(r'\s*(?:(\d+(?:\.\d+)?)\s*(min|h|j)\b|(\d+(?:\.\d+)?)|(>=|<=|>|<|\(|\))|([a-z_0-9]+))')
+
+
+class RegleInvalide(ValueError):
+    pass
+
+
+def _jetons(expression):
+    position, jetons = 0, []
+    texte = expression.strip().lower()
+    while position < len(texte):
+        correspondance = _JETONS.match(texte, position)
+        if not correspondance or correspondance.end() == position:
+            raise RegleInvalide(f"Caractère inattendu à la position {position} : « {texte[position:]} »")
+        nombre_duree, unite, nombre, symbole, mot = correspondance.groups()
+        if nombre_duree:
+            jetons.append(('duree', float(nombre_duree) * UNITES[unite]))
+        elif nombre:
+            jetons.append(('nombre', float(nombre)))
+        elif symbole:
+            jetons.append(('symbole', symbole))
+        else:
+            jetons.append(('mot', mot))
+        position = correspondance.end()
+    return jetons
+
+
+def analyser(expression):
+    """
+    Analyse une expression en (conditions, durée soutenue en secondes).
+    Chaque condition est (colonne, opérateur, seuil) ; seuil vaut None pour « seuil ».
+    """
+    jetons = _jetons(expression)
+    position = 0
+
+    def suivant(genre=None, valeur=None):
+        nonlocal position
+        if position >= len(jetons):
+            raise RegleInvalide("Expression incomplète.")
+        jeton = jetons[position]
+        if (genre and jeton[0] != genre) or (valeur and jeton[1] != valeur):
+            raise RegleInvalide(f"Élément inattendu : « {jeton[1]} ».")
+        position += 1
+        return jeton[1]
+
+    conditions, duree = [], 0.0
+    while True:
+        mesure = suivant('mot')
+        if mesure not in MESURES:
+            raise RegleInvalide(f"Mesure inconnue : « {mesure} » (attendu : {', '.join(MESURES)}).")
+        colonne = mesure
+        if mesure == 'ecart_moyenne':
+            suivant('symbole', '(')
+            colonne = f"ecart_moyenne_{int(suivant('duree'))}"
+            suivant('symbole', ')')
+        symbole = suivant('symbole')
+        if symbole not in OPERATEURS:
+            raise RegleInvalide(f"Opérateur attendu au lieu de « {symbole} ».")
+        genre, valeur = jetons[position] if position < len(jetons) else (None, None)
+        if genre == 'nombre':
+            seuil = suivant('nombre')
+        elif genre == 'mot' and valeur == 'seuil':
+            suivant('mot')
+            seuil = None
+        else:
+            raise RegleInvalide("Nombre ou « seuil » attendu après l'opérateur.")
+        conditions.append((colonne, symbole, seuil))
+
+        if position == len(jetons):
+            break
+        mot = suivant('mot')
+        if mot == 'pendant':
+            duree = suivant('duree')
+            if position != len(jetons):
+                raise RegleInvalide("« pendant » doit terminer la règle.")
+            break
+        if mot != 'et':
+            raise RegleInvalide(f"« et » ou « pendant » attendu au lieu de « {mot} ».")
+    return conditions, duree
+
+
+class RegleCompilee:
+    """
+    Règle prête à l'emploi : `predicat(colonnes)` renvoie la liste des verdicts
+    de toute la série en une passe par condition.
+    """
+
+    def __init__(self, expression, valeur_seuil):
+        self.expression = expression
+        self.conditions, self.duree = analyser(expression)
+        self.colonnes = {colonne for colonne, _, _ in self.conditions}
+        # (colonne, comparaison, seuil) : « seuil » remplacé par la valeur_seuil de la règle
+        self._tests = [
+            (colonne, OPERATEURS[symbole], valeur_seuil if seuil is None else seuil)
+            for colonne, symbole, seuil in self.conditions
+        ]
+
+    def predicat(self, colonnes):
+        listes = [
+            [x is not None and comparer(x, seuil) for x in colonnes[colonne]]
+            for colonne, comparer, seuil in self._tests
+        ]
+        if len(listes) == 1:
+            return listes[0]
+        return [all(verdicts) for verdicts in zip(*listes)]
+
+    def evaluer(self, colonnes):
+        """ Verdicts alignés sur la série (condition soutenue pendant `duree` si demandé). """
+        verdicts = self.predicat(colonnes)
+        if not self.duree:
+            return verdicts
+        soutenus, debut = [], None
+        for instant, vrai in zip(colonnes['instant'], verdicts):
+            debut = (debut if debut is not None else instant) if vrai else None
+            soutenus.append(vrai and instant - debut >= self.duree)
+        return soutenus
+
+
+def colonnes_serie(instants, valeurs, surface, noms):
+    """
+    Colonnes de mesures d'une série (instants en secondes, valeurs d'index), triée par date.
+    Seules les colonnes `noms` demandées par les règles sont calculées.
+    """
+    n = len(valeurs)
+    colonnes = {'instant': instants, 'valeur': valeurs}
+    consommation = [None] + [max(valeurs[i] - valeurs[i - 1], 0.0) for i in range(1, n)]
+    debit = [None] + [
+        consommation[i] * 3600 / (instants[i] - instants[i - 1]) if instants[i] > instants[i - 1] else None
+        for i in range(1, n)
+    ]
+    colonnes['consommation'] = consommation
+    colonnes['debit'] = debit
+    if 'variation' in noms:
+        colonnes['variation'] = [None] + [
+            100 * (debit[i] - debit[i - 1]) / debit[i - 1] if debit[i] is not None and debit[i - 1] else None
+            for i in range(1, n)
+        ]
+    if 'par_m2' in noms:
+        colonnes['par_m2'] = [x / surface if x is not None and surface else None for x in consommation]
+
+    for nom in noms:
+        if not nom.startswith('ecart_moyenne_'):
+            continue
+        # Moyenne glissante du débit sur la fenêtre (fenêtre coulissante : somme mise à jour en O(1))
+        fenetre = int(nom.rsplit('_', 1)[1])
+        ecarts, somme, nombre, gauche = [], 0.0, 0, 1
+        for i in range(n):
+            while gauche < i and instants[gauche] < instants[i] - fenetre:
+                if debit[gauche] is not None:
+                    somme, nombre = somme - debit[gauche], nombre - 1
+                gauche += 1
+            moyenne = somme / nombre if nombre else None
+            ecarts.append(100 * (debit[i] - moyenne) / moyenne if moyenne and debit[i] is not None else None)
+            if i >= 1 and debit[i] is not None:
+                somme, nombre = somme + debit[i], nombre + 1
+        colonnes[nom] = ecarts
+    return colonnes
+
+
+def historique_necessaire(regles):
+    """ Recul à charger avant les relevés évalués (plus longue fenêtre + un intervalle). """
+    secondes = 0.0
+    for regle in regles:
+        secondes = max(secondes, regle.duree, *(
+            float(colonne.rsplit('_', 1)[1]) for colonne in regle.colonnes if colonne.startswith('ecart_moyenne_')
+        ))
+    return timedelta(seconds=secondes) + timedelta(days=1)
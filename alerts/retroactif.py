@@ -0,0 +1,202 @@
+# src/alerts/retroactif.py
+"""
+Réévaluation rétroactive de l'historique après la création ou la modification d'un seuil.
+
+Le seuil est rejoué sur [debut, fin] pour les compteurs auxquels il s'applique
+(son compteur, ou pour un seuil global ceux qui n'ont pas de règle propre) :
+
+- SURCONS : une requête avec fonction de fenêtre (LAG) ne renvoie que les relevés au-dessus
+  du seuil, chacun avec l'état de son prédécesseur ; un prédécesseur sous le seuil ouvre un épisode ;
+- REGLE   : séries lues en flux ordonné, règle compilée évaluée colonne par colonne (alerts/regles.py) ;
+- ANOMALIE_RELEVE : détection sur les agrégats horaires (alerts/detection.py).
+
+Chaque compteur est relu depuis son dernier relevé antérieur à `debut` : un épisode commencé avant
+la fenêtre est reconnu comme tel (suite), quelle que soit la fenêtre choisie.
+Les épisodes reconstitués sont écrits en bulk. Un épisode est rapproché des alertes du même seuil
+et du même compteur qui le recoupent dans le temps (épisode déjà rejoué, ou ouvert en direct par
+services.evaluer_seuils) : il les met à jour, sans jamais les dupliquer.
+Seule la table chaude est rejouée (l'archive froide ne contient que des relevés anciens).
+"""
+from datetime import datetime, timezone as dt_timezone
+from itertools import groupby
+
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, RowRange, Value, When, Window
+from django.db.models.functions import FirstValue, Lag
+from django.utils import timezone
+
+from consumption.models import Compteur, Releve
+from consumption.utils import avec_releve_precedent
+from .detection import detecter_anomalies
+from .index_seuils import index_seuils
+from .models import Alerte
+from .regles import RegleCompilee, colonnes_serie, historique_necessaire
+from .services import CHAMPS_EPISODE, _description_episode, _description_regle, alertes_enregistrees
+
+
+def compteurs_concernes(seuil):
+    """ Compteurs dont le seuil applicable (résolu par l'index) est `seuil`. """
+    if seuil.compteur_id is not None:
+        compteur_ids = [seuil.compteur_id]
+    else:
+        compteur_ids = list(Compteur.objects.values_list('id', flat=True))
+    if seuil.type_alerte == 'SURCONS':
+        return [cid for cid in compteur_ids if (index_seuils.surconsommation(cid) or (None, None))[1] == seuil]
+    if seuil.type_alerte == 'ANOMALIE_RELEVE':
+        return [cid for cid in compteur_ids if index_seuils.regle('ANOMALIE_RELEVE', cid) == seuil]
+    return compteur_ids
+
+
+def _episodes_surconsommation(seuil, compteur_ids, debut, fin):
+    """
+    [(compteur_id, [(date, valeur), ...], depuis)] : suites de relevés consécutifs au-dessus du seuil.
+    `depuis` est le premier relevé de l'épisode, ou pour la suite d'un épisode commencé avant `debut`,
+    le dernier relevé (au-dessus du seuil) qui précède la fenêtre.
+    """
+    depasse = Case(When(valeur__gt=seuil.valeur_seuil, then=Value(1)), default=Value(0), output_field=IntegerField())
+    lignes = (
+        avec_releve_precedent(Releve.objects.filter(compteur_id__in=compteur_ids, date_releve__lte=fin), debut)
+        .annotate(
+            precedent=Window(Lag(depasse), partition_by='compteur_id', order_by='date_releve'),
+            # Valeur de la ligne courante exprimée en fenêtre : le filtre s'applique après le calcul
+            # de LAG (un filtre ordinaire retirerait les relevés sous le seuil avant)
+            depasse=Window(FirstValue(depasse), partition_by='compteur_id', order_by='date_releve', frame=RowRange(0, 0)),
+        )
+        .filter(depasse=1)
+        .order_by('compteur_id', 'date_releve')
+        .values_list('compteur_id', 'date_releve', 'valeur', 'precedent')
+    )
+    episodes = []
+    anterieur = None  # (compteur, date) du dernier relevé au-dessus du seuil avant la fenêtre
+    for compteur_id, date_releve, valeur, precedent in lignes.iterator(chunk_size=10000):
+        if date_releve < debut:
+            anterieur = (compteur_id, date_releve)
+            continue
+        if precedent != 1 or not episodes or episodes[-1][0] != compteur_id:
+            suite = precedent == 1 and anterieur is not None and anterieur[0] == compteur_id
+            episodes.append((compteur_id, [], anterieur[1] if suite else date_releve))
+        episodes[-1][1].append((date_releve, valeur))
+    return episodes
+
+
+def _instant(valeur):
+    # Lecture brute : SQLite renvoie le texte stocké (UTC), PostgreSQL un datetime
+    if isinstance(valeur, str):
+        valeur = datetime.fromisoformat(valeur).replace(tzinfo=dt_timezone.utc)
+    return valeur.timestamp()
+
+
+def _episodes_regle(seuil, compteur_ids, debut, fin):
+    """ Même format que _episodes_surconsommation, pour une règle déclarative. """
+    regle = RegleCompilee(seuil.expression, seuil.valeur_seuil)
+    # Historique demandé par la règle, et au moins le dernier relevé de chaque compteur avant la fenêtre
+    lecture = debut - historique_necessaire([regle])
+    lignes = (
+        avec_releve_precedent(Releve.objects.filter(compteur_id__in=compteur_ids, date_releve__lte=fin), lecture)
+        .order_by('compteur_id', 'date_releve')
+        .values_list('compteur_id', 'date_releve', 'valeur')
+    )
+    surfaces = dict(Compteur.objects.filter(id__in=compteur_ids).values_list('id', 'partie_commune__surface'))
+
+    # Curseur direct sur la requête compilée (comme consumption.utils) : les dates restent des
+    # instants numériques, seuls les relevés retenus redeviennent des datetime
+    sql, params = lignes.query.sql_with_params()
+    borne = debut.timestamp()
+    episodes = []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        resultats = iter(lambda: cursor.fetchmany(10000), [])
+        lignes_brutes = (ligne for paquet in resultats for ligne in paquet)
+        for compteur_id, groupe in groupby(lignes_brutes, key=lambda ligne: ligne[0]):
+            _, dates, valeurs = zip(*groupe)
+            instants = [_instant(date) for date in dates]
+            colonnes = colonnes_serie(instants, list(valeurs), surfaces.get(compteur_id), regle.colonnes)
+            en_cours = None
+            anterieur = None  # dernier relevé avant la fenêtre, s'il vérifie la règle
+            for instant, valeur, vrai in zip(instants, valeurs, regle.evaluer(colonnes)):
+                if instant < borne:
+                    anterieur = instant if vrai else None
+                    continue
+                if not vrai:
+                    en_cours = anterieur = None
+                    continue
+                date_releve = datetime.fromtimestamp(instant, dt_timezone.utc)
+                if en_cours is None:
+                    depuis = datetime.fromtimestamp(anterieur, dt_timezone.utc) if anterieur is not None else date_releve
+                    en_cours = (compteur_id, [], depuis)
+                    episodes.append(en_cours)
+                en_cours[1].append((date_releve, valeur))
+    return episodes, regle
+
+
+def reevaluer_historique(seuil, debut, fin=None):
+    """
+    Rejoue `seuil` sur [debut, fin] (fin : maintenant par défaut).
+    Retourne un dict (compteurs, épisodes, alertes créées, alertes mises à jour ; les autres épisodes étaient déjà à jour).
+    """
+    fin = fin or timezone.now()
+    compteur_ids = compteurs_concernes(seuil)
+    bilan = {'compteurs': len(compteur_ids), 'episodes': 0, 'alertes_creees': 0, 'alertes_mises_a_jour': 0}
+    if not compteur_ids:
+        return bilan
+
+    if seuil.type_alerte == 'ANOMALIE_RELEVE':
+        # Détection déjà idempotente (heures signalées ignorées) ; l'historique de référence précède `debut`
+        resultat = detecter_anomalies(debut, fin, compteur_ids=compteur_ids)
+        bilan['episodes'] = bilan['alertes_creees'] = resultat['alertes']
+        return bilan
+
+    if seuil.type_alerte == 'REGLE':
+        episodes, regle = _episodes_regle(seuil, compteur_ids, debut, fin)
+        decrire = lambda alerte: _description_regle(alerte, regle)
+    else:
+        episodes = _episodes_surconsommation(seuil, compteur_ids, debut, fin)
+        decrire = lambda alerte: _description_episode(alerte, seuil.valeur_seuil)
+    bilan['episodes'] = len(episodes)
+
+    with transaction.atomic():
+        # Alertes qui peuvent recouper un épisode de la fenêtre (suites comprises)
+        existantes = {}
+        for alerte in Alerte.objects.select_for_update().filter(
+            seuil=seuil, compteur_id__in=compteur_ids,
+            date_dernier_releve__gte=min((depuis for _, _, depuis in episodes), default=debut),
+            date_premier_releve__lte=fin,
+        ).order_by('date_premier_releve', 'id'):
+            existantes.setdefault(alerte.compteur_id, []).append(alerte)
+        a_creer, a_modifier = [], []
+        for compteur_id, releves, depuis in episodes:
+            premier, dernier = releves[0][0], releves[-1][0]
+            alerte = next((
+                alerte for alerte in existantes.get(compteur_id, ())
+                if alerte.date_premier_releve <= dernier and alerte.date_dernier_releve >= depuis
+            ), None)
+            if alerte is None:
+                # Épisode passé : clos d'emblée (les nouveaux relevés ouvrent le leur)
+                alerte = Alerte(seuil=seuil, compteur_id=compteur_id, est_traitee=False, episode_ouvert=False)
+                a_creer.append(alerte)
+                avant = None
+            else:
+                existantes[compteur_id].remove(alerte)
+                avant = tuple(getattr(alerte, champ) for champ in CHAMPS_EPISODE)
+            if depuis < premier and avant is not None:
+                # Suite d'un épisode commencé avant la fenêtre : ses relevés antérieurs ne sont pas relus
+                alerte.nombre_depassements = max(alerte.nombre_depassements, len(releves))
+                alerte.valeur_pic = max(alerte.valeur_pic or 0.0, *(valeur for _, valeur in releves))
+                alerte.date_premier_releve = min(alerte.date_premier_releve, premier)
+            else:
+                alerte.nombre_depassements = len(releves)
+                alerte.valeur_pic = max(valeur for _, valeur in releves)
+                alerte.date_premier_releve = premier
+            alerte.date_dernier_releve = max(dernier, alerte.date_dernier_releve or dernier)
+            alerte.description = decrire(alerte)
+            # Relance sur la même fenêtre : seuls les épisodes qui ont changé sont réécrits
+            if avant is not None and avant != tuple(getattr(alerte, champ) for champ in CHAMPS_EPISODE):
+                a_modifier.append(alerte)
+
+        Alerte.objects.bulk_create(a_creer, batch_size=1000)
+        Alerte.objects.bulk_update(a_modifier, CHAMPS_EPISODE, batch_size=500)
+        if a_creer:
+            alertes_enregistrees.send(sender=Alerte, alertes=a_creer)
+    bilan['alertes_creees'] = len(a_creer)
+    bilan['alertes_mises_a_jour'] = len(a_modifier)
+    return bilan
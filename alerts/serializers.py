@@ -1,6 +1,9 @@
 # src/alerts/serializers.py
+import math
+
 from rest_framework import serializers
 from .models import Alerte, SeuilAlerte , Compteur
+from .regles import RegleCompilee, RegleInvalide
 
 class AlerteSerializer(serializers.ModelSerializer):
     """
@@ -18,24 +21,62 @@ class AlerteSerializer(serializers.ModelSerializer):
             'type_seuil',
             'description', 
             'date_detection', 
-            'est_traitee'
+            'est_traitee',
+            # Épisode de dépassement (alertes regroupées par compteur et seuil)
+            'episode_ouvert',
+            'nombre_depassements',
+            'valeur_pic',
+            'date_premier_releve',
+            'date_dernier_releve'
         )
+        read_only_fields = fields
 class SeuilAlerteSerializer(serializers.ModelSerializer):
     # On utilise 'source' pour mapper le champ vers l'attribut du modèle lié
-    compteur_reference = serializers.CharField(source='compteur.reference', required=True)
+    # Sans compteur_reference, le seuil est global (appliqué aux compteurs sans règle propre)
+    compteur_reference = serializers.CharField(source='compteur.reference', required=False, allow_null=True)
 
     class Meta:
         model = SeuilAlerte
-        fields = ['id', 'type_alerte', 'valeur_seuil', 'compteur_reference']
+        fields = ['id', 'type_alerte', 'valeur_seuil', 'compteur_reference', 'expression']
+
+    def validate(self, data):
+        # Une règle personnalisée est compilée dès l'enregistrement pour signaler les erreurs de syntaxe.
+        # Modification partielle (PATCH) : les champs absents gardent la valeur du seuil enregistré
+        def valeur(champ, defaut):
+            if champ in data:
+                return data[champ]
+            return getattr(self.instance, champ) if self.instance is not None else defaut
+
+        if 'valeur_seuil' in data and not math.isfinite(data['valeur_seuil']):
+            raise serializers.ValidationError({"valeur_seuil": "Le seuil doit être un nombre fini."})
+        if valeur('type_alerte', None) == 'REGLE':
+            try:
+                RegleCompilee(valeur('expression', ''), valeur('valeur_seuil', 0.0))
+            except RegleInvalide as erreur:
+                raise serializers.ValidationError({"expression": str(erreur)})
+        return data
 
     def create(self, validated_data):
         # On récupère la structure imbriquée créée par 'source'
-        compteur_data = validated_data.pop('compteur')
-        ref = compteur_data['reference']
+        compteur_data = validated_data.pop('compteur', None) or {}
+        ref = compteur_data.get('reference')
+        if not ref:
+            return SeuilAlerte.objects.create(compteur=None, **validated_data)
         
         try:
             compteur = Compteur.objects.get(reference=ref)
         except Compteur.DoesNotExist:
             raise serializers.ValidationError({"compteur_reference": "Ce compteur n'existe pas."})
             
-        return SeuilAlerte.objects.create(compteur=compteur, **validated_data)
\ No newline at end of file
+        return SeuilAlerte.objects.create(compteur=compteur, **validated_data)
+
+
+class ReevaluationSerializer(serializers.Serializer):
+    """ Fenêtre rejouée par la réévaluation rétroactive d'un seuil (fin : maintenant par défaut). """
+    date_debut = serializers.DateTimeField(input_formats=['iso-8601', '%Y-%m-%d'])
+    date_fin = serializers.DateTimeField(required=False, input_formats=['iso-8601', '%Y-%m-%d'])
+
+    def validate(self, data):
+        if data.get('date_fin') and data['date_fin'] <= data['date_debut']:
+            raise serializers.ValidationError({"date_fin": "La fin doit suivre le début."})
+        return data
@@ -0,0 +1,314 @@
+# src/alerts/services.py
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min
+from django.dispatch import Signal
+from django.utils import timezone
+
+from consumption.models import AgregatCompteur, Compteur, Releve
+from .index_seuils import index_seuils
+from .models import Alerte, SeuilAlerte
+from .regles import colonnes_serie, historique_necessaire
+
+# Alertes créées ou modifiées en bulk (sans post_save) : alertes_enregistrees(alertes) permet aux autres
+# applications de suivre ces écritures (ex. reports.tableau_de_bord)
+alertes_enregistrees = Signal()
+
+
+def _description_episode(alerte, valeur_seuil):
+    if alerte.nombre_depassements == 1:
+        return f"Dépassement détecté : {alerte.valeur_pic} enregistré. Le seuil autorisé est de {valeur_seuil}."
+    return (
+        f"Dépassement persistant : {alerte.nombre_depassements} relevés au-dessus du seuil de {valeur_seuil} "
+        f"depuis le {alerte.date_premier_releve:%d/%m/%Y %H:%M} (pic : {alerte.valeur_pic})."
+    )
+
+
+CHAMPS_EPISODE = ['episode_ouvert', 'nombre_depassements', 'valeur_pic', 'date_premier_releve', 'date_dernier_releve', 'description']
+
+
+def _nouvel_episode(releve, seuil_config):
+    return Alerte(
+        seuil=seuil_config,
+        compteur_id=releve.compteur_id,
+        est_traitee=False,
+        episode_ouvert=True,
+        nombre_depassements=1,
+        valeur_pic=releve.valeur,
+        date_premier_releve=releve.date_releve,
+        date_dernier_releve=releve.date_releve,
+    )
+
+
+def _prolonger_episode(episode, releve, recent):
+    episode.nombre_depassements += 1
+    episode.valeur_pic = max(episode.valeur_pic or releve.valeur, releve.valeur)
+    if recent:
+        episode.date_dernier_releve = releve.date_releve
+    if episode.date_premier_releve is None or releve.date_releve < episode.date_premier_releve:
+        episode.date_premier_releve = releve.date_releve
+
+
+def evaluer_seuils(releves):
+    """
+    Compare un lot de relevés aux seuils de surconsommation, résolus par l'index
+    en mémoire (règle du compteur, puis Compteur.seuil_alerte, puis règle globale).
+
+    Les dépassements sont regroupés en épisodes par (compteur, seuil) : le premier crée
+    une Alerte ouverte, les suivants mettent à jour son nombre de dépassements, son pic
+    et son dernier relevé. Un relevé revenu sous le seuil (ou l'alerte marquée traitée)
+    clôt l'épisode. Une requête indexée lit les épisodes ouverts du lot, puis les
+    alertes sont créées et mises à jour en bulk.
+
+    Retourne une liste alignée sur `releves` : l'Alerte (créée ou prolongée) ou None.
+    """
+    compteur_ids = {releve.compteur_id for releve in releves}
+    if not compteur_ids:
+        return []
+
+    with transaction.atomic():
+        # Au plus un épisode ouvert par compteur (le plus récent si un seuil a changé entre-temps) ;
+        # les épisodes des règles personnalisées sont suivis par evaluer_regles
+        ouverts = {}
+        for alerte in Alerte.objects.select_for_update().filter(
+            compteur_id__in=compteur_ids, episode_ouvert=True, est_traitee=False
+        ).exclude(seuil__in=SeuilAlerte.objects.filter(type_alerte='REGLE')).order_by('id'):
+            if alerte.compteur_id in ouverts:
+                ouverts[alerte.compteur_id].episode_ouvert = False
+            ouverts[alerte.compteur_id] = alerte
+        modifiees = {alerte.id: alerte for alerte in ouverts.values() if not alerte.episode_ouvert}
+        a_creer = []
+        resultats = [None] * len(releves)
+
+        for index in sorted(range(len(releves)), key=lambda i: (releves[i].compteur_id, releves[i].date_releve)):
+            releve = releves[index]
+            seuil_effectif = index_seuils.surconsommation(releve.compteur_id)
+            episode = ouverts.get(releve.compteur_id)
+            recent = episode is None or episode.date_dernier_releve is None or releve.date_releve >= episode.date_dernier_releve
+
+            if not seuil_effectif or releve.valeur <= seuil_effectif[0]:
+                # Retour sous le seuil : l'épisode est clos (un relevé tardif ne clôt rien)
+                if episode is not None and recent:
+                    episode.episode_ouvert = False
+                    ouverts.pop(releve.compteur_id)
+                    if episode.id:
+                        modifiees[episode.id] = episode
+                continue
+
+            valeur_seuil, seuil_config = seuil_effectif
+            if episode is not None and episode.seuil_id != (seuil_config.id if seuil_config else None):
+                # Le seuil applicable a changé : nouvel épisode
+                episode.episode_ouvert = False
+                if episode.id:
+                    modifiees[episode.id] = episode
+                episode = None
+
+            if episode is None:
+                episode = _nouvel_episode(releve, seuil_config)
+                ouverts[releve.compteur_id] = episode
+                a_creer.append(episode)
+            else:
+                _prolonger_episode(episode, releve, recent)
+                if episode.id:
+                    modifiees[episode.id] = episode
+            episode.description = _description_episode(episode, valeur_seuil)
+            resultats[index] = episode
+
+        Alerte.objects.bulk_create(a_creer)
+        Alerte.objects.bulk_update(list(modifiees.values()), CHAMPS_EPISODE, batch_size=500)
+        if a_creer:
+            alertes_enregistrees.send(sender=Alerte, alertes=a_creer)
+    return resultats
+
+
+def _description_regle(alerte, regle):
+    if alerte.nombre_depassements == 1:
+        return f"Règle « {regle.expression} » vérifiée au relevé du {alerte.date_premier_releve:%d/%m/%Y %H:%M} ({alerte.valeur_pic})."
+    return (
+        f"Règle « {regle.expression} » vérifiée sur {alerte.nombre_depassements} relevés "
+        f"depuis le {alerte.date_premier_releve:%d/%m/%Y %H:%M}."
+    )
+
+
+def evaluer_regles(releves):
+    """
+    Applique les règles déclaratives (SeuilAlerte de type REGLE, cf. alerts/regles.py) à un lot.
+
+    Les séries des compteurs concernés sont lues en une requête (relevés du lot et historique
+    nécessaire aux fenêtres des règles), les mesures calculées une fois par compteur, puis
+    chaque règle compilée est évaluée d'un bloc sur toute la série. Les relevés du lot qui
+    vérifient une règle forment des épisodes par (compteur, règle), comme evaluer_seuils.
+
+    Retourne une liste alignée sur `releves` : l'Alerte (créée ou prolongée) ou None.
+    """
+    resultats = [None] * len(releves)
+    regles = {}
+    for compteur_id in {releve.compteur_id for releve in releves}:
+        applicables = index_seuils.regles_compilees(compteur_id)
+        if applicables:
+            regles[compteur_id] = applicables
+    if not regles:
+        return resultats
+
+    a_evaluer = [index for index, releve in enumerate(releves) if releve.compteur_id in regles]
+    recul = historique_necessaire(regle for applicables in regles.values() for _, regle in applicables)
+    series = {compteur_id: {} for compteur_id in regles}
+    for compteur_id, date_releve, valeur in Releve.objects.filter(
+        compteur_id__in=regles,
+        date_releve__gte=min(releves[index].date_releve for index in a_evaluer) - recul,
+        date_releve__lte=max(releves[index].date_releve for index in a_evaluer),
+    ).values_list('compteur_id', 'date_releve', 'valeur'):
+        series[compteur_id][date_releve] = valeur
+    for index in a_evaluer:
+        # Le lot fait foi (tâches recopiées : le relevé a pu être archivé ou corrigé depuis)
+        series[releves[index].compteur_id][releves[index].date_releve] = releves[index].valeur
+    surfaces = dict(Compteur.objects.filter(id__in=regles).values_list('id', 'partie_commune__surface'))
+
+    # Verdicts des relevés du lot : {(compteur_id, seuil_id): [(releve index, vrai)]} par date croissante
+    verdicts = {}
+    par_compteur = {}
+    for index in a_evaluer:
+        par_compteur.setdefault(releves[index].compteur_id, []).append(index)
+    for compteur_id, indices in par_compteur.items():
+        dates = sorted(series[compteur_id])
+        position = {date: rang for rang, date in enumerate(dates)}
+        colonnes = colonnes_serie(
+            [date.timestamp() for date in dates],
+            [series[compteur_id][date] for date in dates],
+            surfaces.get(compteur_id),
+            set().union(*(regle.colonnes for _, regle in regles[compteur_id])),
+        )
+        indices.sort(key=lambda i: releves[i].date_releve)
+        for seuil_config, regle in regles[compteur_id]:
+            serie = regle.evaluer(colonnes)
+            verdicts[(compteur_id, seuil_config.id)] = (
+                seuil_config, regle, [(index, serie[position[releves[index].date_releve]]) for index in indices]
+            )
+
+    with transaction.atomic():
+        ouverts = {}
+        for alerte in Alerte.objects.select_for_update().filter(
+            compteur_id__in=par_compteur,
+            seuil_id__in={cle[1] for cle in verdicts},
+            episode_ouvert=True,
+            est_traitee=False,
+        ).order_by('id'):
+            ouverts[(alerte.compteur_id, alerte.seuil_id)] = alerte
+        a_creer, modifiees = [], {}
+
+        for cle, (seuil_config, regle, lignes) in verdicts.items():
+            episode = ouverts.get(cle)
+            for index, vrai in lignes:
+                releve = releves[index]
+                recent = episode is None or episode.date_dernier_releve is None or releve.date_releve >= episode.date_dernier_releve
+                if not vrai:
+                    if episode is not None and recent:
+                        episode.episode_ouvert = False
+                        if episode.id:
+                            modifiees[episode.id] = episode
+                        episode = None
+                    continue
+                if episode is None:
+                    episode = _nouvel_episode(releve, seuil_config)
+                    a_creer.append(episode)
+                else:
+                    _prolonger_episode(episode, releve, recent)
+                    if episode.id:
+                        modifiees[episode.id] = episode
+                episode.description = _description_regle(episode, regle)
+                if resultats[index] is None:
+                    resultats[index] = episode
+
+        Alerte.objects.bulk_create(a_creer)
+        Alerte.objects.bulk_update(list(modifiees.values()), CHAMPS_EPISODE, batch_size=500)
+        if a_creer:
+            alertes_enregistrees.send(sender=Alerte, alertes=a_creer)
+    return resultats
+
+
+def debits_moyens(compteur_ids, jours=30):
+    """
+    Débit moyen par heure de chaque compteur sur les `jours` derniers jours, lu dans
+    les agrégats journaliers (index le plus haut - index le plus bas) : une requête pour le lot.
+    """
+    depuis = timezone.now() - timedelta(days=jours)
+    debits = {}
+    for ligne in (
+        AgregatCompteur.objects.filter(compteur_id__in=compteur_ids, granularite='JOUR', debut_periode__gte=depuis)
+        .values('compteur_id')
+        .annotate(premier=Min('debut_periode'), dernier=Max('debut_periode'), bas=Min('minimum'), haut=Max('maximum'))
+    ):
+        heures = (ligne['dernier'] - ligne['premier']).total_seconds() / 3600 + 24
+        debits[ligne['compteur_id']] = (ligne['haut'] - ligne['bas']) / heures
+    return debits
+
+
+def precedents(releves, derniers):
+    """
+    Relevé précédent (valeur, date) de chaque relevé, aligné sur `releves` : le dernier
+    connu du compteur (`derniers` : {compteur_id: (valeur, date_releve)}, cf. Compteur.derniere_valeur),
+    puis, dans un même lot, le relevé plus récent qui le précède. Un relevé tardif ne fait pas avancer la chaîne.
+    """
+    resultats = [(None, None)] * len(releves)
+    etats = dict(derniers)
+    for index in sorted(range(len(releves)), key=lambda i: (releves[i].compteur_id, releves[i].date_releve)):
+        releve = releves[index]
+        precedent = etats.get(releve.compteur_id, (None, None))
+        resultats[index] = precedent
+        if precedent[1] is None or releve.date_releve > precedent[1]:
+            etats[releve.compteur_id] = (releve.valeur, releve.date_releve)
+    return resultats
+
+
+def verifier_coherence(releves, derniers=None, precedents_releves=None):
+    """
+    Contrôles de cohérence à la saisie (ANOMALIE_RELEVE), sans relire l'historique :
+    chaque relevé est comparé à son relevé précédent, donné directement
+    (`precedents_releves`, aligné sur `releves`) ou déduit de `derniers` (voir precedents()).
+
+    - recul de l'index par rapport au relevé précédent ;
+    - saut impossible : consommation depuis le relevé précédent supérieure à
+      `sensibilité` fois le débit moyen du compteur sur la même durée
+      (sensibilité = seuil ANOMALIE_RELEVE du compteur ou global, cf. alerts/detection.py).
+
+    Un horodatage déjà enregistré est refusé à la saisie, avant ces contrôles.
+    Un relevé antérieur au précédent connu (arrivée tardive) n'est pas contrôlé.
+    Retourne une liste alignée sur `releves` : l'Alerte créée ou None.
+    """
+    compteur_ids = {releve.compteur_id for releve in releves}
+    if not compteur_ids:
+        return []
+    if precedents_releves is None:
+        precedents_releves = precedents(releves, derniers or {})
+
+    # Seuil propre au compteur en priorité, sinon seuil global (index en mémoire)
+    seuils = {compteur_id: index_seuils.regle('ANOMALIE_RELEVE', compteur_id) for compteur_id in compteur_ids}
+    avec_seuil = [compteur_id for compteur_id, seuil in seuils.items() if seuil is not None]
+    debits = debits_moyens(avec_seuil) if avec_seuil else {}
+
+    resultats = []
+    for releve, (precedente, date_precedente) in zip(releves, precedents_releves):
+        seuil_config = seuils[releve.compteur_id]
+        description = None
+        if date_precedente is not None and releve.date_releve > date_precedente:
+            ecart = releve.valeur - precedente
+            heures = max((releve.date_releve - date_precedente).total_seconds() / 3600, 1.0)
+            attendu = debits.get(releve.compteur_id, 0.0) * heures
+            if ecart < 0:
+                description = f"Recul d'index détecté : {releve.valeur} enregistré après {precedente} (relevé du {date_precedente:%d/%m/%Y %H:%M})."
+            elif seuil_config and attendu > 0 and ecart > seuil_config.valeur_seuil * attendu:
+                description = f"Saut impossible : +{ecart} depuis le dernier relevé ({precedente}), pour {attendu:.2f} attendus sur {heures:.0f} h."
+
+        resultats.append(Alerte(
+            seuil=seuil_config,
+            compteur_id=releve.compteur_id,
+            description=description,
+            est_traitee=False
+        ) if description else None)
+
+    alertes = [alerte for alerte in resultats if alerte is not None]
+    if alertes:
+        Alerte.objects.bulk_create(alertes)
+        alertes_enregistrees.send(sender=Alerte, alertes=alertes)
+    return resultats
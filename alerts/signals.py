@@ -0,0 +1,31 @@
+# src/alerts/signals.py
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from consumption.models import Compteur
+from .index_seuils import index_seuils
+from .models import SeuilAlerte, VersionSeuils
+
+
+def _invalider_index(**kwargs):
+    # Tout de suite pour ce thread, puis au commit pour les lectures faites entre-temps par d'autres threads
+    index_seuils.invalider()
+    transaction.on_commit(index_seuils.invalider)
+    # Autres processus : nouvelle version visible au commit, dans la même transaction que l'écriture
+    if not VersionSeuils.objects.filter(id=1).update(version=F('version') + 1):
+        VersionSeuils.objects.get_or_create(id=1, defaults={'version': 1})
+
+
+@receiver(post_save, sender=SeuilAlerte)
+@receiver(post_delete, sender=SeuilAlerte)
+def invalider_apres_seuil(sender, **kwargs):
+    _invalider_index()
+
+
+@receiver(post_save, sender=Compteur)
+@receiver(post_delete, sender=Compteur)
+def invalider_apres_compteur(sender, **kwargs):
+    # seuil_alerte modifié, compteur créé ou supprimé (ses règles sont supprimées avec lui)
+    _invalider_index()
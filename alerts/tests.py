@@ -1,3 +1,399 @@
-from django.test import TestCase
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.db.models import F
+from django.test import AsyncRequestFactory, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import force_authenticate
+
+from consumption.models import AgregatCompteur, Compteur, Releve
+from consumption.tests import CompteurFabrique, RequetesConstantesMixin, creer_syndic
+from . import detection, diffusion, file_attente
+from .detection import detecter_anomalies
+from .index_seuils import index_seuils
+from .models import Alerte, SeuilAlerte, TacheEvaluation, VersionSeuils
+from .regles import RegleCompilee, RegleInvalide, analyser, colonnes_serie
+from .retroactif import reevaluer_historique
+from .services import evaluer_seuils
+from .views import JETON_FLUX_DUREE, JetonFluxAPIView, _utilisateur_du_jeton
+
+
+class RequetesAlertesTests(RequetesConstantesMixin, TestCase):
+
+    def setUp(self):
+        self.syndic, self.client_api = creer_syndic()
+
+    def test_liste_alertes(self):
+        def creer(n):
+            for compteur in CompteurFabrique.compteurs(n):
+                seuil = SeuilAlerte.objects.create(compteur=compteur, valeur_seuil=100)
+                Alerte.objects.create(compteur=compteur, seuil=seuil, description="Dépassement")
+        self.assertRequetesConstantes(self.client_api, '/api/alerts/liste/', creer)
+
+    def test_liste_seuils(self):
+        def creer(n):
+            for compteur in CompteurFabrique.compteurs(n):
+                SeuilAlerte.objects.create(compteur=compteur, valeur_seuil=100)
+        self.assertRequetesConstantes(self.client_api, '/api/alerts/seuils/', creer)
+
+
+class FluxEvenementsTests(TestCase):
+
+    def setUp(self):
+        self.syndic, self.client_api = creer_syndic()
+
+    def test_flux_refuse_hors_asgi(self):
+        # Sous WSGI le flux bloquerait un thread sans rien envoyer : le client se rabat sur le polling
+        self.assertEqual(self.client_api.get('/api/alerts/flux/').status_code, 503)
+        self.assertEqual(self.client_api.post('/api/alerts/flux/jeton/').status_code, 503)
+
+    def test_jeton_flux(self):
+        requete = AsyncRequestFactory().post('/api/alerts/flux/jeton/')
+        force_authenticate(requete, self.syndic)
+        reponse = JetonFluxAPIView.as_view()(requete)
+        self.assertEqual(reponse.status_code, 200)
+        jeton = reponse.data['jeton']
+
+        usine = RequestFactory()
+        self.assertEqual(_utilisateur_du_jeton(usine.get('/', {'jeton': jeton})).pk, self.syndic.pk)
+        self.assertIsNone(_utilisateur_du_jeton(usine.get('/', {'jeton': jeton + 'x'})))
+        # Le jeton DRF n'est plus accepté dans l'URL
+        cle = Token.objects.create(user=self.syndic).key
+        self.assertIsNone(_utilisateur_du_jeton(usine.get('/', {'token': cle})))
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + JETON_FLUX_DUREE + 1):
+            self.assertIsNone(_utilisateur_du_jeton(usine.get('/', {'jeton': jeton})))
+
+
+class DiffusionTests(TestCase):
+
+    def test_alerte_validee_en_retard(self):
+        compteur, = CompteurFabrique.compteurs(1)
+        deja_la = Alerte.objects.create(compteur=compteur, description="Avant l'abonnement")
+        curseurs = diffusion._curseurs_initiaux()
+        recente = Alerte.objects.create(id=deja_la.id + 10, compteur=compteur, description="Récente")
+        evenements, curseurs = diffusion._lire_evenements(curseurs)
+        self.assertEqual([evenement['id'] for evenement in evenements], [recente.id])
+
+        # Transaction longue : id et date attribués avant `recente`, alerte visible seulement maintenant
+        tardive = Alerte.objects.create(id=deja_la.id + 5, compteur=compteur, description="Tardive")
+        Alerte.objects.filter(id=tardive.id).update(date_detection=recente.date_detection - timedelta(seconds=30))
+        evenements, curseurs = diffusion._lire_evenements(curseurs)
+        self.assertEqual([evenement['id'] for evenement in evenements], [tardive.id])
+        self.assertEqual(diffusion._lire_evenements(curseurs)[0], [])
+
+
+class FileAttenteTests(TestCase):
+
+    def setUp(self):
+        self.compteur = CompteurFabrique.compteurs(1)[0]
+        SeuilAlerte.objects.create(compteur=self.compteur, valeur_seuil=100)
+        maintenant = timezone.now()
+        for i in range(20):
+            TacheEvaluation.objects.create(
+                compteur=self.compteur, releve_id=i + 1, valeur=500 if i == 3 else 10,
+                date_releve=maintenant - timedelta(minutes=20 - i),
+            )
+
+    def test_tache_fautive_isolee(self):
+        evaluer = file_attente.evaluer_seuils
+
+        def evaluer_seuils(releves):
+            if any(releve.id == 8 for releve in releves):
+                raise ValueError("relevé illisible")
+            return evaluer(releves)
+
+        with mock.patch.object(file_attente, 'evaluer_seuils', evaluer_seuils), \
+                self.assertLogs('alerts.file_attente', 'ERROR'):
+            traitees, creees = file_attente.traiter_lot()
+        self.assertEqual((traitees, creees), (20, 1))
+        # Seule la tâche fautive reste, libérée pour une nouvelle tentative
+        restante = TacheEvaluation.objects.get()
+        self.assertEqual((restante.releve_id, restante.tentatives, restante.reservee_le), (8, 1, None))
+        self.assertEqual(Alerte.objects.filter(compteur=self.compteur).count(), 1)
+
+    def test_echec_definitif_apres_tentatives_max(self):
+        with mock.patch.object(file_attente, 'evaluer_seuils', side_effect=ValueError), \
+                self.assertLogs('alerts.file_attente', 'ERROR'):
+            for _ in range(file_attente.TENTATIVES_MAX):
+                self.assertEqual(file_attente.traiter_lot()[0], 20)
+            self.assertEqual(file_attente.traiter_lot(), (0, 0))
+        self.assertEqual(file_attente.etat_file()['en_echec'], 20)
+
+
+class DetectionAnomaliesTests(TestCase):
+
+    def setUp(self):
+        self.compteur, = CompteurFabrique.compteurs(1)
+        # 10 jours de débit régulier (10/h, 20/h de 8h à 20h), puis une heure à 200/h
+        self.origine = datetime(2026, 3, 1, tzinfo=dt_timezone.utc)
+        self.anormale = self.origine + timedelta(days=10, hours=3)
+        index, agregats = 0.0, []
+        for i in range(10 * 24 + 6):
+            heure = self.origine + timedelta(hours=i)
+            index += 200 if heure == self.anormale else (20 if 8 <= heure.hour < 20 else 10)
+            agregats.append(AgregatCompteur(
+                compteur=self.compteur, granularite='HEURE', debut_periode=heure, nombre=1, somme=index, minimum=index, maximum=index,
+            ))
+        AgregatCompteur.objects.bulk_create(agregats)
+
+    def test_heure_signalee_une_seule_fois(self):
+        fin = self.origine + timedelta(days=10, hours=6)
+        self.assertEqual(detecter_anomalies(fin - timedelta(hours=12), fin)['alertes'], 1)
+        alerte = Alerte.objects.get()
+        self.assertEqual(alerte.heure_anomalie, self.anormale)
+
+        # Relance sur une autre fenêtre, puis après une correction qui change le débit de l'heure
+        self.assertEqual(detecter_anomalies(fin - timedelta(hours=5), fin + timedelta(hours=1))['alertes'], 0)
+        AgregatCompteur.objects.filter(debut_periode__gte=self.anormale).update(maximum=F('maximum') + 30)
+        self.assertEqual(detecter_anomalies(fin - timedelta(hours=12), fin)['alertes'], 0)
+        self.assertEqual(Alerte.objects.count(), 1)
+
+    def test_execution_concurrente(self):
+        fin = self.origine + timedelta(days=10, hours=6)
+        evaluer = detection.evaluer_compteur
+
+        def evaluer_compteur(*args):
+            # Une autre exécution signale la même heure entre la lecture des heures connues et l'insertion
+            Alerte.objects.create(compteur=self.compteur, description="Autre exécution", heure_anomalie=self.anormale)
+            return evaluer(*args)
+
+        with mock.patch.object(detection, 'evaluer_compteur', evaluer_compteur), \
+                mock.patch.object(detection.alertes_enregistrees, 'send') as envoi:
+            self.assertEqual(detecter_anomalies(fin - timedelta(hours=12), fin)['alertes'], 0)
+        envoi.assert_not_called()
+        self.assertEqual(Alerte.objects.get().description, "Autre exécution")
+
+        Alerte.objects.all().delete()
+        with mock.patch.object(detection.alertes_enregistrees, 'send') as envoi:
+            self.assertEqual(detecter_anomalies(fin - timedelta(hours=12), fin)['alertes'], 1)
+        self.assertEqual([alerte.id for alerte in envoi.call_args.kwargs['alertes']], [Alerte.objects.get().id])
+
+    def test_heure_en_cours_ignoree(self):
+        # L'heure anormale n'est pas terminée à `fin` : elle sera jugée à l'exécution suivante
+        fin = self.anormale + timedelta(minutes=30)
+        self.assertEqual(detecter_anomalies(fin - timedelta(hours=12), fin)['alertes'], 0)
+        self.assertEqual(detecter_anomalies(fin - timedelta(hours=12), fin + timedelta(minutes=30))['alertes'], 1)
+
+
+class ReevaluationHistoriqueTests(TestCase):
+
+    def setUp(self):
+        self.compteur, = CompteurFabrique.compteurs(1)
+        self.seuil = SeuilAlerte.objects.create(compteur=self.compteur, valeur_seuil=100)
+        self.origine = datetime(2026, 2, 1, tzinfo=dt_timezone.utc)
+        # Épisode de 4 relevés au-dessus du seuil (heures 1 à 4), entouré de relevés normaux
+        for i, valeur in enumerate((50, 150, 180, 160, 150, 50, 40)):
+            Releve.objects.create(compteur=self.compteur, valeur=valeur, date_releve=self.heure(i), methode_releve='Manuelle')
+
+    def heure(self, i):
+        return self.origine + timedelta(hours=i)
+
+    def test_relance_sur_d_autres_fenetres(self):
+        bilan = reevaluer_historique(self.seuil, self.heure(0), self.heure(8))
+        self.assertEqual((bilan['episodes'], bilan['alertes_creees']), (1, 1))
+        alerte = Alerte.objects.get()
+        self.assertEqual((alerte.date_premier_releve, alerte.nombre_depassements, alerte.valeur_pic), (self.heure(1), 4, 180))
+
+        # Fenêtre qui commence au milieu de l'épisode : même épisode, rien de nouveau
+        for debut in (self.heure(3), self.heure(2) + timedelta(minutes=30), self.heure(0)):
+            bilan = reevaluer_historique(self.seuil, debut, self.heure(8))
+            self.assertEqual((bilan['alertes_creees'], bilan['alertes_mises_a_jour']), (0, 0))
+        self.assertEqual(Alerte.objects.get().date_premier_releve, self.heure(1))
+
+    def test_fenetre_tardive_puis_complete(self):
+        # Première relance au milieu de l'épisode, puis sur tout l'historique : une seule alerte, complétée
+        reevaluer_historique(self.seuil, self.heure(3), self.heure(8))
+        bilan = reevaluer_historique(self.seuil, self.heure(0), self.heure(8))
+        self.assertEqual((bilan['alertes_creees'], bilan['alertes_mises_a_jour']), (0, 1))
+        alerte = Alerte.objects.get()
+        self.assertEqual((alerte.date_premier_releve, alerte.nombre_depassements), (self.heure(1), 4))
+
+    def test_episode_ouvert_en_direct(self):
+        # Épisode ouvert à la saisie (services.evaluer_seuils) depuis le relevé de l'heure 2
+        Alerte.objects.create(
+            compteur=self.compteur, seuil=self.seuil, description="Dépassement", episode_ouvert=True,
+            nombre_depassements=3, valeur_pic=180, date_premier_releve=self.heure(2), date_dernier_releve=self.heure(4),
+        )
+        bilan = reevaluer_historique(self.seuil, self.heure(3), self.heure(8))
+        self.assertEqual(bilan['alertes_creees'], 0)
+        self.assertEqual(Alerte.objects.count(), 1)
+
+    def test_compteur_muet(self):
+        # Compteur sans relevé depuis 2020, resté au-dessus du seuil : sa relance de 2026 est la suite de l'épisode de 2020
+        muet, = CompteurFabrique.compteurs(1)
+        juin_2020 = datetime(2020, 6, 1, tzinfo=dt_timezone.utc)
+        for date, valeur in ((datetime(2019, 6, 1, tzinfo=dt_timezone.utc), 50), (juin_2020, 150), (self.heure(2), 170)):
+            Releve.objects.create(compteur=muet, valeur=valeur, date_releve=date, methode_releve='Manuelle')
+        for seuil in (
+            SeuilAlerte.objects.create(compteur=muet, valeur_seuil=100),
+            SeuilAlerte.objects.create(compteur=muet, type_alerte='REGLE', expression='valeur > seuil', valeur_seuil=100),
+        ):
+            reevaluer_historique(seuil, datetime(2020, 1, 1, tzinfo=dt_timezone.utc), datetime(2021, 1, 1, tzinfo=dt_timezone.utc))
+            bilan = reevaluer_historique(seuil, self.heure(0), self.heure(8))
+            self.assertEqual((bilan['alertes_creees'], bilan['alertes_mises_a_jour']), (0, 1))
+            alerte = Alerte.objects.get(seuil=seuil)
+            self.assertEqual((alerte.date_premier_releve, alerte.date_dernier_releve), (juin_2020, self.heure(2)))
+
+
+class ReglesTests(TestCase):
+
+    def setUp(self):
+        self.syndic, self.client_api = creer_syndic()
+
+    def test_analyse(self):
+        self.assertEqual(analyser("debit > seuil pendant 2h"), ([('debit', '>', None)], 7200.0))
+        self.assertEqual(
+            analyser("ecart_moyenne(24h) > 50 et par_m2 >= 0.2")[0],
+            [('ecart_moyenne_86400', '>', 50.0), ('par_m2', '>=', 0.2)],
+        )
+        for expression in ("", "debit >", "debit = 3", "pression > 2", "debit > 2 pendant", "debit > 2 pendant 1h et valeur > 1",
+                           "debit > 2 ou valeur > 1", "debit > __import__('os')", "ecart_moyenne > 5"):
+            with self.subTest(expression=expression), self.assertRaises(RegleInvalide):
+                RegleCompilee(expression, 10.0)
+
+    def test_evaluation_par_colonnes(self):
+        # Index relevé toutes les heures : débit 10/h, puis 50/h pendant 3 heures
+        instants = [3600.0 * i for i in range(7)]
+        valeurs = [0.0, 10.0, 20.0, 70.0, 120.0, 170.0, 180.0]
+        regle = RegleCompilee("debit > seuil", 30.0)
+        colonnes = colonnes_serie(instants, valeurs, None, regle.colonnes)
+        self.assertEqual(regle.evaluer(colonnes), [False, False, False, True, True, True, False])
+        soutenue = RegleCompilee("debit > seuil pendant 2h", 30.0)
+        self.assertEqual(soutenue.evaluer(colonnes), [False, False, False, False, False, True, False])
+        double = RegleCompilee("debit >= seuil et valeur < 150", 50.0)
+        self.assertEqual(double.evaluer(colonnes_serie(instants, valeurs, None, double.colonnes)), [False, False, False, True, True, False, False])
+        # Seuil non fini (enregistré hors API) : aucune alerte, jamais d'erreur à l'évaluation
+        self.assertEqual(RegleCompilee("debit > seuil", float('nan')).evaluer(colonnes), [False] * 7)
+
+    def test_validation_a_l_enregistrement(self):
+        url = '/api/alerts/seuils/'
+        refus = self.client_api.post(url, {'type_alerte': 'REGLE', 'valeur_seuil': 5, 'expression': 'debit >> 3'}, format='json')
+        self.assertEqual(refus.status_code, 400)
+        self.assertIn('expression', refus.data)
+        cree = self.client_api.post(url, {'type_alerte': 'REGLE', 'valeur_seuil': 5, 'expression': 'debit > seuil'}, format='json')
+        self.assertEqual(cree.status_code, 201)
+
+        # Modification partielle de la seule expression : la règle existante reste validée
+        refus = self.client_api.patch(f"{url}{cree.data['id']}/", {'expression': 'debit > '}, format='json')
+        self.assertEqual(refus.status_code, 400)
+        self.assertEqual(SeuilAlerte.objects.get(pk=cree.data['id']).expression, 'debit > seuil')
+        accepte = self.client_api.patch(f"{url}{cree.data['id']}/", {'valeur_seuil': 8}, format='json')
+        self.assertEqual(accepte.status_code, 200)
+        for seuil in ('nan', 'inf', '-inf'):
+            refus = self.client_api.patch(f"{url}{cree.data['id']}/", {'valeur_seuil': seuil})
+            self.assertEqual(refus.status_code, 400, seuil)
+            self.assertIn('valeur_seuil', refus.data)
+
+    def test_regle_enregistree_invalide(self):
+        compteur, = CompteurFabrique.compteurs(1)
+        seuil = SeuilAlerte.objects.create(compteur=compteur, type_alerte='REGLE', valeur_seuil=5, expression='debit ?')
+        reponse = self.client_api.post(f'/api/alerts/seuils/{seuil.id}/reevaluer/', {'date_debut': '2026-01-01'}, format='json')
+        self.assertEqual(reponse.status_code, 400)
+
+
+class IndexSeuilsTests(TestCase):
+
+    def setUp(self):
+        self.propre, self.par_compteur, self.sans_regle = CompteurFabrique.compteurs(3)
+        Compteur.objects.filter(id=self.par_compteur.id).update(seuil_alerte=150)
+        self.regle = SeuilAlerte.objects.create(compteur=self.propre, valeur_seuil=50)
+        self.globale = SeuilAlerte.objects.create(compteur=None, valeur_seuil=120)
+        self.anomalie = SeuilAlerte.objects.create(compteur=None, type_alerte='ANOMALIE_RELEVE', valeur_seuil=3)
+
+    def test_resolution(self):
+        index_seuils.invalider()
+        index_seuils.surconsommation(self.propre.id)
+        # Index chargé : la résolution ne touche plus la base
+        with self.assertNumQueries(0):
+            self.assertEqual(index_seuils.surconsommation(self.propre.id), (50, self.regle))
+            self.assertEqual(index_seuils.surconsommation(self.par_compteur.id), (150, None))
+            self.assertEqual(index_seuils.surconsommation(self.sans_regle.id), (120, self.globale))
+            self.assertEqual(index_seuils.regle('ANOMALIE_RELEVE', self.propre.id), self.anomalie)
+            self.assertIsNone(index_seuils.regle('REGLE', self.propre.id))
+
+    def test_regle_globale_appliquee(self):
+        alerte, = evaluer_seuils([Releve(compteur=self.sans_regle, valeur=130, date_releve=timezone.now())])
+        self.assertEqual(alerte.seuil, self.globale)
+        self.assertEqual(evaluer_seuils([Releve(compteur=self.par_compteur, valeur=130, date_releve=timezone.now())]), [None])
+
+    def test_invalidation(self):
+        self.assertEqual(index_seuils.surconsommation(self.sans_regle.id), (120, self.globale))
+        # Compteur créé après le chargement (sans seuil propre) : l'index se recharge à la première demande
+        nouveau, = CompteurFabrique.compteurs(1)
+        self.assertEqual(index_seuils.surconsommation(nouveau.id), (120, self.globale))
+        self.globale.delete()
+        self.assertIsNone(index_seuils.surconsommation(self.sans_regle.id))
+
+    def test_suppression_du_compteur(self):
+        # Les règles propres partent avec leur compteur : aucune ne devient globale
+        self.propre.delete()
+        self.assertFalse(SeuilAlerte.objects.filter(id=self.regle.id).exists())
+        self.assertEqual(index_seuils.surconsommation(self.sans_regle.id), (120, self.globale))
+
+    def test_modification_par_un_autre_processus(self):
+        version = VersionSeuils.objects.get().version
+        SeuilAlerte.objects.create(compteur=None, type_alerte='ANOMALIE_RELEVE', valeur_seuil=5)
+        self.assertEqual(VersionSeuils.objects.get().version, version + 1)
+
+        self.assertEqual(index_seuils.surconsommation(self.sans_regle.id), (120, self.globale))
+        with self.assertNumQueries(1):
+            index_seuils.synchroniser()
+        # Écriture faite par l'API dans un autre processus : pas de signal ici, seule la version change
+        SeuilAlerte.objects.filter(id=self.globale.id).update(valeur_seuil=90)
+        self.assertEqual(index_seuils.surconsommation(self.sans_regle.id)[0], 120)
+        VersionSeuils.objects.update(version=F('version') + 1)
+        index_seuils.synchroniser()
+        self.assertEqual(index_seuils.surconsommation(self.sans_regle.id)[0], 90)
+
+
+class EpisodesAlertesTests(TestCase):
+
+    def setUp(self):
+        self.compteur, self.autre = CompteurFabrique.compteurs(2)
+        self.seuil = SeuilAlerte.objects.create(compteur=self.compteur, valeur_seuil=100)
+        self.origine = timezone.now() - timedelta(days=1)
+
+    def releves(self, *valeurs, compteur=None, depuis=0):
+        return [
+            Releve(compteur=compteur or self.compteur, valeur=valeur, date_releve=self.origine + timedelta(hours=depuis + i))
+            for i, valeur in enumerate(valeurs)
+        ]
+
+    def test_depassements_regroupes(self):
+        resultats = evaluer_seuils(self.releves(150, 180, 160))
+        self.assertEqual(len({alerte.id for alerte in resultats}), 1)
+        # Lot suivant : même épisode prolongé, puis clos par le retour sous le seuil
+        evaluer_seuils(self.releves(170, 50, depuis=3))
+        alerte = Alerte.objects.get()
+        self.assertEqual(
+            (alerte.episode_ouvert, alerte.nombre_depassements, alerte.valeur_pic, alerte.date_dernier_releve),
+            (False, 4, 180, self.origine + timedelta(hours=3)),
+        )
+        self.assertIn('4 relevés', alerte.description)
+
+        # Nouveau dépassement : nouvel épisode ; un relevé tardif sous le seuil ne le clôt pas
+        evaluer_seuils(self.releves(130, depuis=6))
+        evaluer_seuils(self.releves(20, depuis=5.5))
+        self.assertEqual(Alerte.objects.filter(episode_ouvert=True).count(), 1)
+        self.assertEqual(Alerte.objects.count(), 2)
+
+    def test_episode_traite_puis_nouveau(self):
+        evaluer_seuils(self.releves(150))
+        Alerte.objects.update(est_traitee=True)
+        resultats = evaluer_seuils(self.releves(150, 40, depuis=1) + self.releves(10, compteur=self.autre))
+        self.assertIsNotNone(resultats[0])
+        self.assertEqual(resultats[1:], [None, None])
+        self.assertEqual(Alerte.objects.count(), 2)
+
+    def test_lot_en_requetes_constantes(self):
+        evaluer_seuils(self.releves(150))
+        with CaptureQueriesContext(connection) as petit:
+            evaluer_seuils(self.releves(150, 160, depuis=1))
+        with CaptureQueriesContext(connection) as grand:
+            evaluer_seuils(self.releves(*range(150, 190), depuis=3))
+        self.assertEqual(len(petit), len(grand))
+        self.assertEqual(Alerte.objects.get().nombre_depassements, 43)
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AlerteConsultationViewSet, SeuilAlerteViewSet
+from .views import AlerteConsultationViewSet, SeuilAlerteViewSet, EtatFileAlertesAPIView, JetonFluxAPIView, flux_evenements
 
 router = DefaultRouter()
 
@@ -13,5 +13,10 @@ router.register('seuils', SeuilAlerteViewSet, basename='seuil-alerte')
 router.register('liste', AlerteConsultationViewSet, basename='alerte-liste')
 
 urlpatterns = [
+    # 3. Supervision de la file d'évaluation (profondeur, retard)
+    path('file/', EtatFileAlertesAPIView.as_view(), name='alerte-file'),
+    # 4. Flux temps réel (SSE) des alertes et réclamations, à la place du polling
+    path('flux/', flux_evenements, name='alerte-flux'),
+    path('flux/jeton/', JetonFluxAPIView.as_view(), name='alerte-flux-jeton'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,14 +1,37 @@
-from rest_framework import viewsets
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import viewsets, status
+from rest_framework.authtoken.models import Token
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .serializers import AlerteSerializer , SeuilAlerteSerializer
+from .serializers import AlerteSerializer , SeuilAlerteSerializer, ReevaluationSerializer
 from .models import Alerte , SeuilAlerte
-from users.models import Syndic, ConseilSyndical 
+from users.models import Syndic, ConseilSyndical, Utilisateur
 from claims.views import IsSyndicPermission
+from consumption.pagination import CurseurPagination
+from .file_attente import etat_file
+from .regles import RegleInvalide
+from .retroactif import reevaluer_historique
+from .diffusion import Abonne, diffuseur, TYPE_RESYNCHRONISER
+
+
+class AlerteCurseurPagination(CurseurPagination):
+    ordering = ('-date_detection', '-id')
+
 
 class AlerteConsultationViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = AlerteSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = AlerteCurseurPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -23,7 +46,17 @@ class AlerteConsultationViewSet(viewsets.ReadOnlyModelViewSet):
         else:
             return Alerte.objects.none()
 
-        return queryset.order_by('-date_detection') # Ne retourne rien
+        # compteur.reference et seuil.type_alerte sont lus par AlerteSerializer : une seule requête jointe
+        return queryset.select_related('compteur', 'seuil').order_by('-date_detection', '-id') # Ne retourne rien
+
+    @action(detail=True, methods=['post'], permission_classes=[IsSyndicPermission])
+    def traiter(self, request, pk=None):
+        # Le syndic marque l'alerte traitée : l'épisode est clos, un nouveau dépassement en ouvrira un autre
+        alerte = self.get_object()
+        alerte.est_traitee = True
+        alerte.episode_ouvert = False
+        alerte.save(update_fields=['est_traitee', 'episode_ouvert'])
+        return Response(self.get_serializer(alerte).data, status=status.HTTP_200_OK)
     
 
 
@@ -31,6 +64,156 @@ class SeuilAlerteViewSet(viewsets.ModelViewSet):
     """
     Permet au Syndic de configurer les limites (Phase A/B).
     """
-    queryset = SeuilAlerte.objects.all()
+    queryset = SeuilAlerte.objects.select_related('compteur')
     serializer_class = SeuilAlerteSerializer
-    permission_classes = [IsSyndicPermission]
\ No newline at end of file
+    permission_classes = [IsSyndicPermission]
+
+    # Option : ?reevaluer_depuis=<date> à la création ou à la modification rejoue aussi l'historique
+    def _avec_reevaluation(self, enregistrer):
+        depuis = self.request.query_params.get('reevaluer_depuis')
+        if depuis:
+            fenetre = ReevaluationSerializer(data={'date_debut': depuis})
+            fenetre.is_valid(raise_exception=True)
+        response = enregistrer()
+        if depuis and response.status_code < 300:
+            seuil = SeuilAlerte.objects.get(pk=response.data['id'])
+            response.data['reevaluation'] = reevaluer_historique(seuil, fenetre.validated_data['date_debut'])
+        return response
+
+    def create(self, request, *args, **kwargs):
+        return self._avec_reevaluation(lambda: super(SeuilAlerteViewSet, self).create(request, *args, **kwargs))
+
+    def update(self, request, *args, **kwargs):
+        return self._avec_reevaluation(lambda: super(SeuilAlerteViewSet, self).update(request, *args, **kwargs))
+
+    @action(detail=True, methods=['post'])
+    def reevaluer(self, request, pk=None):
+        """
+        Rejoue le seuil sur l'historique {date_debut, date_fin} des compteurs concernés.
+        Idempotent : relancer la même fenêtre met à jour les alertes déjà créées.
+        """
+        fenetre = ReevaluationSerializer(data=request.data)
+        fenetre.is_valid(raise_exception=True)
+        try:
+            bilan = reevaluer_historique(
+                self.get_object(), fenetre.validated_data['date_debut'], fenetre.validated_data.get('date_fin')
+            )
+        except RegleInvalide as erreur:
+            # Règle enregistrée avant la validation à la modification : à corriger avant de la rejouer
+            return Response({"expression": str(erreur)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(bilan, status=status.HTTP_200_OK)
+
+
+class EtatFileAlertesAPIView(APIView):
+    """
+    Supervision du worker d'alertes : profondeur de la file et retard (secondes).
+    """
+    permission_classes = [IsSyndicPermission]
+
+    def get(self, request):
+        return Response(etat_file())
+
+
+
+def _abonne_pour(utilisateur, zone_id):
+    # Mêmes règles que AlerteConsultationViewSet et les vues de réclamations
+    syndic = utilisateur.is_superuser or hasattr(utilisateur, 'syndic')
+    if syndic or hasattr(utilisateur, 'conseilsyndical'):
+        return Abonne(toutes_alertes=True, toutes_reclamations=syndic)
+    if hasattr(utilisateur, 'resident'):
+        return Abonne(zone_id=int(zone_id) if zone_id and zone_id.isdigit() else None, resident_id=utilisateur.resident.id)
+    return None
+
+
+# Jeton de flux : signé, propre au flux SSE (sel) et valable JETON_FLUX_DUREE secondes.
+# Il remplace le jeton DRF dans l'URL, qui finirait dans les journaux d'accès.
+JETON_FLUX_DUREE = 60
+_signataire_flux = signing.TimestampSigner(salt='alerts.flux')
+
+
+def _flux_disponible(request):
+    # Sous WSGI, StreamingHttpResponse consomme un générateur asynchrone en entier avant d'envoyer
+    # quoi que ce soit : un flux sans fin bloquerait un thread pour rien. Le client se rabat sur le polling.
+    return isinstance(request, ASGIRequest)
+
+
+def _reponse_flux_indisponible():
+    return JsonResponse(
+        {"detail": "Flux temps réel disponible uniquement derrière un serveur ASGI (ex. uvicorn config.asgi:application).",
+         "repli": "polling"},
+        status=503,
+    )
+
+
+class JetonFluxAPIView(APIView):
+    """
+    Jeton court (JETON_FLUX_DUREE secondes) pour ouvrir GET /api/alerts/flux/?jeton=... :
+    EventSource ne sait pas envoyer l'en-tête Authorization. 503 si le flux n'est pas servi (hors ASGI).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if not _flux_disponible(request._request):
+            return _reponse_flux_indisponible()
+        if _abonne_pour(request.user, None) is None:
+            return Response({"detail": "Accès refusé."}, status=status.HTTP_403_FORBIDDEN)
+        return Response({"jeton": _signataire_flux.sign(str(request.user.pk)), "expire_dans": JETON_FLUX_DUREE})
+
+
+def _utilisateur_du_jeton(request):
+    # En-tête DRF (clients non navigateur) ou jeton de flux signé en paramètre (EventSource)
+    entete = request.headers.get('Authorization', '')
+    if entete.startswith('Token '):
+        jeton = Token.objects.select_related('user').filter(key=entete[6:]).first()
+        return jeton.user if jeton and jeton.user.is_active else None
+    jeton = request.GET.get('jeton')
+    if not jeton:
+        return None
+    try:
+        utilisateur_id = _signataire_flux.unsign(jeton, max_age=JETON_FLUX_DUREE)
+    except signing.BadSignature:
+        return None
+    return Utilisateur.objects.filter(pk=utilisateur_id, is_active=True).first()
+
+
+async def flux_evenements(request):
+    """
+    Flux Server-Sent Events des nouvelles alertes et des changements de réclamations
+    (événements `alerte`, `reclamation`, et `resynchroniser` si le client a pris du retard).
+    Nécessite le serveur ASGI (config/asgi.py) : une connexion ouverte ne coûte qu'une coroutine.
+    Hors ASGI (runserver, gunicorn WSGI) : 503, le tableau de bord recharge périodiquement.
+    """
+    if not _flux_disponible(request):
+        return _reponse_flux_indisponible()
+    utilisateur = await sync_to_async(_utilisateur_du_jeton)(request)
+    if utilisateur is None:
+        utilisateur = await request.auser()
+    if not utilisateur.is_authenticated:
+        return JsonResponse({"detail": "Authentification requise."}, status=401)
+    abonne = await sync_to_async(_abonne_pour)(utilisateur, request.GET.get('zone_id'))
+    if abonne is None:
+        return JsonResponse({"detail": "Accès refusé."}, status=403)
+
+    async def evenements():
+        diffuseur.abonner(abonne)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                if abonne.en_retard:
+                    abonne.en_retard = False
+                    yield f"event: {TYPE_RESYNCHRONISER}\ndata: {{}}\n\n"
+                try:
+                    evenement = await asyncio.wait_for(abonne.file.get(), timeout=25)
+                except asyncio.TimeoutError:
+                    # Commentaire SSE : garde la connexion ouverte à travers les proxys
+                    yield ": ping\n\n"
+                    continue
+                donnees = json.dumps(evenement['donnees'], cls=DjangoJSONEncoder)
+                yield f"id: {evenement['type']}-{evenement['id']}\nevent: {evenement['type']}\ndata: {donnees}\n\n"
+        finally:
+            diffuseur.desabonner(abonne)
+
+    reponse = StreamingHttpResponse(evenements(), content_type='text/event-stream')
+    reponse['Cache-Control'] = 'no-cache'
+    reponse['X-Accel-Buffering'] = 'no'
+    return reponse
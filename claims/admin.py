@@ -11,4 +11,6 @@ class ReclamationAdmin(admin.ModelAdmin):
 @admin.register(Intervention)
 class InterventionAdmin(admin.ModelAdmin):
     list_display = ('reclamation', 'technicien', 'date_intervention')
+    # Reclamation.__str__ lit l'email du résident
+    list_select_related = ('reclamation__resident', 'technicien')
     list_filter = ('technicien',)
\ No newline at end of file
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0003_alter_intervention_rapport'),
+        ('consumption', '0006_releve_releve_date_id_idx'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reclamation',
+            index=models.Index(fields=['-date_soumission', '-id'], name='reclamation_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reclamation',
+            index=models.Index(fields=['resident', '-date_soumission', '-id'], name='reclamation_resident_date_idx'),
+        ),
+    ]
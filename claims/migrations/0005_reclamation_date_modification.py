@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0004_reclamation_reclamation_date_id_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reclamation',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -27,6 +27,8 @@ class Reclamation(models.Model):
     # Attributs principaux
     description = models.TextField() 
     date_soumission = models.DateTimeField(auto_now_add=True)
+    # Dernière modification (changement de statut...) : curseur du flux temps réel (alerts/diffusion.py)
+    date_modification = models.DateTimeField(auto_now=True, db_index=True)
     
     # --- CHAMP CORRIGÉ PRÉCÉDEMMENT AJOUTÉ ---
     type_reclamation = models.CharField(max_length=50, default='Électricité')
@@ -52,6 +54,13 @@ class Reclamation(models.Model):
     # Le Compteur/Equipement concerné 
     compteur_concerne = models.ForeignKey(Compteur, on_delete=models.SET_NULL, null=True, blank=True) 
 
+    class Meta:
+        indexes = [
+            # Pagination par curseur (-date_soumission, -id), globale et par résident
+            models.Index(fields=['-date_soumission', '-id'], name='reclamation_date_id_idx'),
+            models.Index(fields=['resident', '-date_soumission', '-id'], name='reclamation_resident_date_idx'),
+        ]
+
     def __str__(self):
         return f"Réclamation {self.id} par {self.resident.email} - Statut: {self.statut}"
 
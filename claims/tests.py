@@ -1,3 +1,49 @@
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from consumption.tests import RequetesConstantesMixin, creer_syndic
+from users.models import Resident, TechnicienMaintenance
+from .models import Intervention, Reclamation
+
+
+class RequetesReclamationsTests(RequetesConstantesMixin, TestCase):
+
+    def setUp(self):
+        self.syndic, self.client_api = creer_syndic()
+        self.technicien = TechnicienMaintenance.objects.create_user('tech@copro.fr', None, nom='Tech', prenom='T')
+        self.numero = 0
+
+    def creer_reclamations(self, n, intervention=False):
+        # Un résident par réclamation : chaque ligne suit une relation différente
+        for _ in range(n):
+            self.numero += 1
+            resident = Resident.objects.create_user(f"resident{self.numero}@copro.fr", None, nom='Nom', prenom='P', telephone='0600000000')
+            reclamation = Reclamation.objects.create(resident=resident, description="Fuite")
+            if intervention:
+                Intervention.objects.create(reclamation=reclamation, technicien=self.technicien, date_intervention=timezone.now())
+
+    def test_liste_reclamations_syndic(self):
+        self.assertRequetesConstantes(self.client_api, '/api/claims/reclamations/', self.creer_reclamations)
+
+    def test_liste_traitement(self):
+        self.assertRequetesConstantes(self.client_api, '/api/claims/traitement/reclamations/', self.creer_reclamations)
+
+    def test_liste_interventions(self):
+        self.assertRequetesConstantes(
+            self.client_api, '/api/claims/interventions/', lambda n: self.creer_reclamations(n, intervention=True)
+        )
+
+    def test_planning_technicien(self):
+        client = APIClient()
+        client.force_authenticate(self.technicien)
+        self.assertRequetesConstantes(client, '/api/claims/mon-planning/', lambda n: self.creer_reclamations(n, intervention=True))
+
+    def test_reclamations_resident(self):
+        resident = Resident.objects.create_user('moi@copro.fr', None, nom='Moi', prenom='M')
+        client = APIClient()
+        client.force_authenticate(resident)
+
+        def creer(n):
+            Reclamation.objects.bulk_create(Reclamation(resident=resident, description="Bruit") for _ in range(n))
+        self.assertRequetesConstantes(client, '/api/claims/reclamations/', creer)
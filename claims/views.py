@@ -8,6 +8,11 @@ from rest_framework import permissions
 from .serializers import ReclamationSoumissionSerializer , ReclamationTraitementSerializer , InterventionTechnicienSerializer , InterventionAssignationSerializer
 from .models import Reclamation, StatutReclamation , Intervention
 from users.models import Resident, Syndic
+from consumption.pagination import CurseurPagination
+
+
+class ReclamationCurseurPagination(CurseurPagination):
+    ordering = ('-date_soumission', '-id')
 
 # Mixin pour permettre seulement la création et la lecture de la liste/détail (sans update/delete)
 class ReclamationSoumissionViewSet(mixins.CreateModelMixin,
@@ -31,11 +36,11 @@ class ReclamationSoumissionViewSet(mixins.CreateModelMixin,
         
         # S'assurer que l'utilisateur est bien un Résident (ou un Syndic/Admin pour la supervision)
         if hasattr(user, 'resident'):
-                return Reclamation.objects.filter(resident=user.resident).order_by('-date_soumission')
+                return Reclamation.objects.filter(resident=user.resident).select_related('resident').order_by('-date_soumission')
         
         # Le Syndic/Admin doit voir toutes les réclamations pour le traitement
         if hasattr(user, 'syndic'):
-                return Reclamation.objects.all().order_by('-date_soumission')
+                return Reclamation.objects.select_related('resident').order_by('-date_soumission')
             
         return Reclamation.objects.none()
 
@@ -81,9 +86,10 @@ class ReclamationTraitementViewSet(mixins.RetrieveModelMixin,
     """
     serializer_class = ReclamationTraitementSerializer
     permission_classes = [IsAuthenticated, IsSyndicPermission ] # Seul le Syndic
+    pagination_class = ReclamationCurseurPagination
 
-    # Le Syndic voit toutes les réclamations
-    queryset = Reclamation.objects.all().order_by('-date_soumission') 
+    # Le Syndic voit toutes les réclamations (résident joint : héritage multi-table, nom/téléphone sur Utilisateur)
+    queryset = Reclamation.objects.select_related('resident').order_by('-date_soumission', '-id')
 
     def perform_update(self, serializer):
         """
@@ -112,7 +118,9 @@ class EspaceTechnicienViewSet(viewsets.ModelViewSet):
         user = self.request.user
         # Filtrage strict : Seul le technicien assigné voit ses tâches
         if hasattr(user, 'technicienmaintenance'):
-             return Intervention.objects.filter(technicien=user.technicienmaintenance).order_by('date_intervention')
+             return Intervention.objects.filter(technicien=user.technicienmaintenance).select_related(
+                 'reclamation__resident'
+             ).order_by('date_intervention')
         return Intervention.objects.none()
 
     def perform_update(self, serializer):
@@ -132,7 +140,7 @@ class InterventionViewSet(viewsets.ModelViewSet):
     """
     CRUD complet pour le Syndic : créer, assigner et supprimer des interventions.
     """
-    queryset = Intervention.objects.all()
+    queryset = Intervention.objects.select_related('technicien')
     # On utilise un serializer standard qui permet de choisir la réclamation et le tech
     serializer_class = InterventionAssignationSerializer 
     permission_classes = [IsAuthenticated, IsSyndicPermission] # 🔒 Seul le Syndic décide !
@@ -1,6 +1,6 @@
 # src/consumption/admin.py
 from django.contrib import admin
-from .models import Compteur, Releve, Consommation, Historique, PartieCommune
+from .models import Compteur, Releve, Consommation, Historique, PartieCommune, AgregatCompteur, AgregatPartieCommune, ArchiveReleve
 
 # Enregistrement de PartieCommune
 @admin.register(PartieCommune)
@@ -34,4 +34,23 @@ class ConsommationAdmin(admin.ModelAdmin):
 class HistoriqueAdmin(admin.ModelAdmin):
     list_display = ('action', 'date_action', 'utilisateur')
     readonly_fields = ('action', 'date_action', 'utilisateur')
-    list_filter = ('date_action',)
\ No newline at end of file
+    list_filter = ('date_action',)
+
+# Agrégats matérialisés (lecture seule, maintenus automatiquement)
+@admin.register(AgregatCompteur)
+class AgregatCompteurAdmin(admin.ModelAdmin):
+    list_display = ('compteur', 'granularite', 'debut_periode', 'nombre', 'somme', 'minimum', 'maximum')
+    list_filter = ('granularite',)
+
+@admin.register(AgregatPartieCommune)
+class AgregatPartieCommuneAdmin(admin.ModelAdmin):
+    list_display = ('partie_commune', 'granularite', 'debut_periode', 'nombre', 'somme', 'minimum', 'maximum')
+    list_filter = ('granularite', 'partie_commune')
+
+# Archive froide (blocs compressés, contenu non éditable)
+@admin.register(ArchiveReleve)
+class ArchiveReleveAdmin(admin.ModelAdmin):
+    list_display = ('compteur', 'mois', 'nombre', 'date_min', 'date_max')
+    list_filter = ('compteur__partie_commune',)
+    exclude = ('donnees',)
+    readonly_fields = ('compteur', 'mois', 'nombre', 'date_min', 'date_max')
@@ -0,0 +1,192 @@
+# src/consumption/agregats.py
+"""
+Maintenance des agrégats horaires / journaliers / mensuels (AgregatCompteur, AgregatPartieCommune).
+
+- ajouter_releves() : fusion incrémentale des nouveaux relevés (insertion).
+- recalculer()      : recalcul exact depuis les relevés bruts d'une fenêtre
+                      (correction, suppression, reconstruction complète).
+
+Les deux fonctions émettent un signal une fois leurs agrégats écrits (dans la même transaction) :
+d'autres résumés peuvent suivre les mêmes chemins d'écriture (ex. reports.statistiques).
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.dispatch import Signal
+from django.db.models import Count, Sum, Min, Max
+from django.db.models.functions import TruncHour, TruncDay, TruncMonth
+from django.utils import timezone
+
+from .models import Compteur, Releve, AgregatCompteur, AgregatPartieCommune
+
+TRONCATURES = {
+    'HEURE': TruncHour,
+    'JOUR': TruncDay,
+    'MOIS': TruncMonth,
+}
+
+# (modèle d'agrégat, champ clé sur l'agrégat, chemin depuis Releve)
+NIVEAUX = (
+    (AgregatCompteur, 'compteur_id', 'compteur_id'),
+    (AgregatPartieCommune, 'partie_commune_id', 'compteur__partie_commune_id'),
+)
+
+# releves_ajoutes(releves, parties={compteur_id: partie_commune_id})
+releves_ajoutes = Signal()
+# periodes_recalculees(partie_ids, debut, fin) ; partie_ids / bornes à None : tout
+periodes_recalculees = Signal()
+
+
+def debut_periode(date, granularite):
+    """ Début de la période contenant `date` (même découpage que Trunc* côté base). """
+    locale = timezone.localtime(date)
+    if granularite == 'HEURE':
+        return locale.replace(minute=0, second=0, microsecond=0)
+    if granularite == 'JOUR':
+        return locale.replace(hour=0, minute=0, second=0, microsecond=0)
+    return locale.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def fin_periode(debut, granularite):
+    """ Début de la période suivante (borne exclusive). """
+    if granularite == 'HEURE':
+        return debut + timedelta(hours=1)
+    if granularite == 'JOUR':
+        return debut + timedelta(days=1)
+    if debut.month == 12:
+        return debut.replace(year=debut.year + 1, month=1)
+    return debut.replace(month=debut.month + 1)
+
+
+def _fusionner(stats, valeur):
+    stats[0] += 1
+    stats[1] += valeur
+    stats[2] = valeur if stats[2] is None else min(stats[2], valeur)
+    stats[3] = valeur if stats[3] is None else max(stats[3], valeur)
+
+
+def ajouter_releves(releves):
+    """
+    Fusionne de nouveaux relevés dans les agrégats existants :
+    une requête pour les parties communes, puis une lecture et une écriture
+    en bulk par (niveau, granularité), quelle que soit la taille du lot.
+    """
+    if not releves:
+        return
+    parties = dict(
+        Compteur.objects.filter(id__in={releve.compteur_id for releve in releves})
+        .values_list('id', 'partie_commune_id')
+    )
+
+    # 1. Deltas calculés en mémoire : {(niveau, granularite): {(cle, debut): [nombre, somme, min, max]}}
+    deltas = {}
+    for releve in releves:
+        cles = (releve.compteur_id, parties[releve.compteur_id])
+        for granularite in TRONCATURES:
+            debut = debut_periode(releve.date_releve, granularite)
+            for (modele, _, _), cle in zip(NIVEAUX, cles):
+                groupe = deltas.setdefault((modele, granularite), {})
+                _fusionner(groupe.setdefault((cle, debut), [0, 0.0, None, None]), releve.valeur)
+
+    # 2. Application des deltas sur les lignes existantes (ou création)
+    champs = {modele: champ for modele, champ, _ in NIVEAUX}
+    with transaction.atomic():
+        for (modele, granularite), groupe in deltas.items():
+            champ = champs[modele]
+            debuts = [debut for _, debut in groupe]
+            existants = {
+                (getattr(agregat, champ), agregat.debut_periode): agregat
+                for agregat in modele.objects.select_for_update().filter(
+                    granularite=granularite,
+                    debut_periode__range=(min(debuts), max(debuts)),
+                    **{f'{champ}__in': {cle for cle, _ in groupe}}
+                )
+            }
+            a_creer, a_modifier = [], []
+            for (cle, debut), (nombre, somme, minimum, maximum) in groupe.items():
+                agregat = existants.get((cle, debut))
+                if agregat is None:
+                    a_creer.append(modele(
+                        granularite=granularite, debut_periode=debut,
+                        nombre=nombre, somme=somme, minimum=minimum, maximum=maximum,
+                        **{champ: cle}
+                    ))
+                    continue
+                agregat.nombre += nombre
+                agregat.somme += somme
+                agregat.minimum = minimum if agregat.minimum is None else min(agregat.minimum, minimum)
+                agregat.maximum = maximum if agregat.maximum is None else max(agregat.maximum, maximum)
+                a_modifier.append(agregat)
+            modele.objects.bulk_create(a_creer, batch_size=1000)
+            modele.objects.bulk_update(a_modifier, ['nombre', 'somme', 'minimum', 'maximum'], batch_size=1000)
+        releves_ajoutes.send(sender=Releve, releves=releves, parties=parties)
+
+
+def recalculer(compteur_ids=None, debut=None, fin=None, partie_ids=None, taille_lot=2000):
+    """
+    Recalcule depuis les relevés bruts (table chaude + archive) toutes les périodes
+    qui recoupent [debut, fin] pour les compteurs donnés (et leurs parties communes).
+    Sans argument : reconstruction complète.
+    Utilisé pour les corrections et suppressions, où une fusion incrémentale ne suffit pas (min/max).
+    """
+    from .archive import blocs, lire_archives
+
+    if compteur_ids is not None and partie_ids is None:
+        partie_ids = set(Compteur.objects.filter(id__in=compteur_ids).values_list('partie_commune_id', flat=True))
+    parties = dict(Compteur.objects.values_list('id', 'partie_commune_id'))
+
+    with transaction.atomic():
+        for granularite, troncature in TRONCATURES.items():
+            borne_debut = debut_periode(debut, granularite) if debut is not None else None
+            borne_fin = fin_periode(debut_periode(fin, granularite), granularite) if fin is not None else None
+
+            for (modele, champ, chemin), ids in zip(NIVEAUX, (compteur_ids, partie_ids)):
+                releves = Releve.objects.all()
+                agregats = modele.objects.filter(granularite=granularite)
+                if ids is not None:
+                    releves = releves.filter(**{f'{chemin}__in': ids})
+                    agregats = agregats.filter(**{f'{champ}__in': ids})
+                if borne_debut is not None:
+                    releves = releves.filter(date_releve__gte=borne_debut)
+                    agregats = agregats.filter(debut_periode__gte=borne_debut)
+                if borne_fin is not None:
+                    releves = releves.filter(date_releve__lt=borne_fin)
+                    agregats = agregats.filter(debut_periode__lt=borne_fin)
+
+                agregats.delete()
+                lignes = (
+                    releves.annotate(periode=troncature('date_releve'))
+                    .values(chemin, 'periode')
+                    .annotate(nombre=Count('id'), somme=Sum('valeur'), minimum=Min('valeur'), maximum=Max('valeur'))
+                    .order_by()
+                )
+                stats = {
+                    (ligne[chemin], ligne['periode']): [ligne['nombre'], ligne['somme'], ligne['minimum'], ligne['maximum']]
+                    for ligne in lignes.iterator(chunk_size=taille_lot)
+                }
+
+                # Relevés déjà passés en archive froide sur la même fenêtre
+                archives = blocs(
+                    compteur_ids=ids if champ == 'compteur_id' else None,
+                    partie_ids=ids if champ == 'partie_commune_id' else None,
+                    debut=borne_debut,
+                    fin=borne_fin,
+                )
+                for releve in lire_archives(archives, borne_debut, borne_fin, decroissant=False):
+                    if borne_fin is not None and releve.date_releve >= borne_fin:
+                        continue
+                    cle = releve.compteur_id if champ == 'compteur_id' else parties[releve.compteur_id]
+                    _fusionner(stats.setdefault((cle, debut_periode(releve.date_releve, granularite)), [0, 0.0, None, None]), releve.valeur)
+
+                modele.objects.bulk_create(
+                    (
+                        modele(
+                            granularite=granularite, debut_periode=periode,
+                            nombre=nombre, somme=somme, minimum=minimum, maximum=maximum,
+                            **{champ: cle}
+                        )
+                        for (cle, periode), (nombre, somme, minimum, maximum) in stats.items()
+                    ),
+                    batch_size=taille_lot,
+                )
+        periodes_recalculees.send(sender=Releve, partie_ids=partie_ids, debut=debut, fin=fin)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ConsumptionConfig(AppConfig):
     name = 'consumption'
+
+    def ready(self):
+        from . import signals  # noqa: F401 (enregistrement des receivers)
@@ -0,0 +1,232 @@
+# src/consumption/archive.py
+"""
+Archive froide des relevés anciens (ArchiveReleve).
+
+Les relevés d'un compteur pour un mois sont rangés dans un bloc unique,
+par colonnes : identifiants et horodatages encodés en deltas (array 'q'),
+valeurs (array 'd'), indicateurs de correction, méthodes en dictionnaire
+et commentaires (rares) en JSON, le tout compressé avec zlib.
+
+Le dernier relevé de chaque compteur avant la limite reste dans la table
+chaude : le calcul des consommations (LAG) garde ainsi son point de départ.
+"""
+import heapq
+import json
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .agregats import debut_periode, fin_periode
+from .models import Compteur, Releve, ArchiveReleve
+
+ENTETE = struct.Struct('<4sBI')
+MAGIC = b'RLV1'
+EPOQUE = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _octets(colonne):
+    # Format disque en petit-boutiste, quelle que soit la machine
+    if sys.byteorder == 'big':
+        colonne = array(colonne.typecode, colonne)
+        colonne.byteswap()
+    return colonne.tobytes()
+
+
+def _colonne(typecode, donnees):
+    colonne = array(typecode)
+    colonne.frombytes(donnees)
+    if sys.byteorder == 'big':
+        colonne.byteswap()
+    return colonne
+
+
+def _deltas(valeurs):
+    precedent = 0
+    for valeur in valeurs:
+        yield valeur - precedent
+        precedent = valeur
+
+
+def _cumuls(deltas):
+    total = 0
+    for delta in deltas:
+        total += delta
+        yield total
+
+
+def encoder_bloc(releves):
+    """ Encode une liste de Releve (triée ou non) en bloc compressé. """
+    releves = sorted(releves, key=lambda releve: releve.date_releve)
+    instants = [(releve.date_releve - EPOQUE) // timedelta(microseconds=1) for releve in releves]
+    methodes = sorted({releve.methode_releve for releve in releves})
+    index_methode = {methode: index for index, methode in enumerate(methodes)}
+    meta = json.dumps({
+        'methodes': methodes,
+        'commentaires': {index: releve.commentaire for index, releve in enumerate(releves) if releve.commentaire},
+    }).encode('utf-8')
+
+    corps = b''.join((
+        ENTETE.pack(MAGIC, 1, len(releves)),
+        _octets(array('q', _deltas(releve.id for releve in releves))),
+        _octets(array('q', _deltas(instants))),
+        _octets(array('d', (releve.valeur for releve in releves))),
+        bytes(releve.est_corrige for releve in releves),
+        _octets(array('H', (index_methode[releve.methode_releve] for releve in releves))),
+        meta,
+    ))
+    return zlib.compress(corps, 9)
+
+
+def decoder_bloc(donnees, compteur_id):
+    """ Reconstruit les Releve (non enregistrés, triés par date croissante) d'un bloc. """
+    corps = zlib.decompress(bytes(donnees))
+    magic, _, nombre = ENTETE.unpack_from(corps)
+    if magic != MAGIC:
+        raise ValueError("Bloc d'archive invalide.")
+
+    position = ENTETE.size
+    def tranche(taille):
+        nonlocal position
+        morceau = corps[position:position + taille]
+        position += taille
+        return morceau
+
+    ids = _cumuls(_colonne('q', tranche(8 * nombre)))
+    instants = _cumuls(_colonne('q', tranche(8 * nombre)))
+    valeurs = _colonne('d', tranche(8 * nombre))
+    corriges = tranche(nombre)
+    codes = _colonne('H', tranche(2 * nombre))
+    meta = json.loads(corps[position:].decode('utf-8'))
+    methodes, commentaires = meta['methodes'], meta['commentaires']
+
+    return [
+        Releve(
+            id=releve_id,
+            compteur_id=compteur_id,
+            valeur=valeur,
+            date_releve=EPOQUE + timedelta(microseconds=instant),
+            methode_releve=methodes[code],
+            commentaire=commentaires.get(str(index)),
+            est_corrige=bool(corrige),
+        )
+        for index, (releve_id, instant, valeur, corrige, code)
+        in enumerate(zip(ids, instants, valeurs, corriges, codes))
+    ]
+
+
+def blocs(compteur_ids=None, partie_ids=None, debut=None, fin=None):
+    """ Blocs d'archive qui recoupent [debut, fin], filtrés par compteur ou partie commune. """
+    archives = ArchiveReleve.objects.all()
+    if compteur_ids is not None:
+        archives = archives.filter(compteur_id__in=compteur_ids)
+    if partie_ids is not None:
+        archives = archives.filter(compteur__partie_commune_id__in=partie_ids)
+    if debut is not None:
+        archives = archives.filter(date_max__gte=debut)
+    if fin is not None:
+        archives = archives.filter(date_min__lte=fin)
+    return archives
+
+
+def lire_archives(archives, debut=None, fin=None, decroissant=True):
+    """
+    Relevés archivés des blocs donnés, dans l'ordre de date_releve.
+    Les blocs sont chargés et décodés à la demande (un bloc par compteur en mémoire).
+    """
+    par_compteur = {}
+    for bloc_id, compteur_id in archives.order_by('-mois' if decroissant else 'mois').values_list('id', 'compteur_id'):
+        par_compteur.setdefault(compteur_id, []).append(bloc_id)
+    compteurs = Compteur.objects.in_bulk(list(par_compteur))
+
+    flux = [
+        _releves_compteur(bloc_ids, compteur_id, debut, fin, decroissant)
+        for compteur_id, bloc_ids in par_compteur.items()
+    ]
+    for releve in heapq.merge(*flux, key=lambda releve: releve.date_releve, reverse=decroissant):
+        releve.compteur = compteurs[releve.compteur_id]
+        yield releve
+
+
+def _releves_compteur(bloc_ids, compteur_id, debut, fin, decroissant):
+    for bloc_id in bloc_ids:
+        donnees = ArchiveReleve.objects.filter(id=bloc_id).values_list('donnees', flat=True).first()
+        releves = decoder_bloc(donnees, compteur_id) if donnees is not None else []
+        if decroissant:
+            releves.reverse()
+        for releve in releves:
+            if (debut is None or releve.date_releve >= debut) and (fin is None or releve.date_releve <= fin):
+                yield releve
+
+
+def horizon_archive():
+    """ Premier instant non archivé (début du mois qui suit le dernier mois archivé), ou None. """
+    dernier = ArchiveReleve.objects.aggregate(dernier=Max('mois'))['dernier']
+    if dernier is None:
+        return None
+    return fin_periode(timezone.make_aware(datetime(dernier.year, dernier.month, 1)), 'MOIS')
+
+
+def archiver(limite):
+    """
+    Déplace vers l'archive les relevés antérieurs au mois de `limite`,
+    sauf le dernier de chaque compteur. Retourne (relevés archivés, blocs écrits, octets).
+    """
+    from .utils import calculer_consommations
+
+    limite = debut_periode(limite, 'MOIS')
+    derniers = dict(
+        Releve.objects.filter(date_releve__lt=limite)
+        .values('compteur_id').annotate(derniere=Max('date_releve'))
+        .values_list('compteur_id', 'derniere')
+    )
+    # Les consommations des mois archivés sont figées : on les calcule une dernière fois
+    calculer_consommations(debut=horizon_archive(), fin=limite - timedelta(microseconds=1))
+
+    total_releves = total_blocs = total_octets = 0
+    for compteur_id, derniere in derniers.items():
+        releves = Releve.objects.filter(compteur_id=compteur_id, date_releve__lt=derniere)
+        # Un mois à la fois : mémoire bornée à un bloc, et aucun curseur ouvert pendant les suppressions
+        for mois in releves.dates('date_releve', 'month'):
+            debut_mois = timezone.make_aware(datetime(mois.year, mois.month, 1))
+            lot = list(releves.filter(date_releve__gte=debut_mois, date_releve__lt=fin_periode(debut_mois, 'MOIS')))
+            if lot:
+                total_octets += _ecrire_bloc(compteur_id, mois, lot)
+                total_releves, total_blocs = total_releves + len(lot), total_blocs + 1
+    return total_releves, total_blocs, total_octets
+
+
+def _ecrire_bloc(compteur_id, mois, releves):
+    with transaction.atomic():
+        existant = ArchiveReleve.objects.select_for_update().filter(compteur_id=compteur_id, mois=mois).first()
+        tous = releves + (decoder_bloc(existant.donnees, compteur_id) if existant else [])
+        donnees = encoder_bloc(tous)
+        ArchiveReleve.objects.update_or_create(
+            compteur_id=compteur_id, mois=mois,
+            defaults={
+                'nombre': len(tous),
+                'date_min': min(releve.date_releve for releve in tous),
+                'date_max': max(releve.date_releve for releve in tous),
+                'donnees': donnees,
+            },
+        )
+        _supprimer_archives([releve.id for releve in releves])
+    return len(donnees)
+
+
+def _supprimer_archives(ids, taille_lot=500):
+    """
+    DELETE SQL explicite, par lots : les signaux de suppression sont volontairement ignorés.
+    Un relevé archivé n'est pas un relevé supprimé : ses agrégats (consumption/agregats.py) et
+    les statistiques de consommation restent acquis, et Releve n'a aucune dépendance en cascade.
+    """
+    table = connection.ops.quote_name(Releve._meta.db_table)
+    with connection.cursor() as curseur:
+        for position in range(0, len(ids), taille_lot):
+            lot = ids[position:position + taille_lot]
+            curseur.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(lot))})", lot)
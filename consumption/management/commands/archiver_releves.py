@@ -0,0 +1,33 @@
+# src/consumption/management/commands/archiver_releves.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from consumption.archive import archiver
+
+
+class Command(BaseCommand):
+    """
+    Déplace les relevés anciens vers l'archive froide (blocs compressés par compteur et par mois).
+    Les listes de relevés, les agrégats et les rapports continuent de les voir.
+    """
+    help = "Archive les relevés plus anciens que N mois (18 par défaut)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mois', type=int, default=18, help="Nombre de mois conservés dans la table chaude.")
+
+    def handle(self, *args, **options):
+        if options['mois'] < 1:
+            raise CommandError("--mois doit être positif.")
+        maintenant = timezone.localtime()
+        annee, mois = divmod(maintenant.year * 12 + maintenant.month - 1 - options['mois'], 12)
+        limite = maintenant.replace(year=annee, month=mois + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+        depart = time.monotonic()
+        releves, blocs, octets = archiver(limite)
+        self.stdout.write(self.style.SUCCESS(
+            f"{releves} relevés antérieurs au {limite:%Y-%m-%d} archivés en {blocs} blocs "
+            f"({octets / 1024:.0f} Kio, {octets / releves if releves else 0:.1f} octets/relevé) "
+            f"en {time.monotonic() - depart:.1f}s."
+        ))
@@ -0,0 +1,31 @@
+# src/consumption/management/commands/calculer_consommations.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from consumption.management.commands.reconstruire_agregats import _parse_borne
+from consumption.utils import calculer_consommations
+
+
+class Command(BaseCommand):
+    """
+    Matérialise les Consommation de toutes les parties communes à partir des index relevés.
+    Prévu pour le batch de nuit ; sans --depuis, tout l'historique est recalculé.
+    """
+    help = "Calcule les consommations par partie commune et par période (fonctions de fenêtrage SQL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depuis', help="Date de début (AAAA-MM-JJ ou ISO 8601).")
+        parser.add_argument('--jusqua', help="Date de fin incluse (AAAA-MM-JJ ou ISO 8601).")
+        parser.add_argument('--granularite', choices=['MOIS', 'JOUR'], default='MOIS')
+        parser.add_argument('--partie-commune', type=int, action='append', dest='parties', help="ID de partie commune (répétable).")
+
+    def handle(self, *args, **options):
+        debut = _parse_borne(options['depuis']) if options['depuis'] else None
+        fin = _parse_borne(options['jusqua'], fin_de_journee=True) if options['jusqua'] else None
+
+        depart = time.monotonic()
+        total = calculer_consommations(debut, fin, options['granularite'], options['parties'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} consommations ({options['granularite']}) calculées en {time.monotonic() - depart:.1f}s."
+        ))
@@ -0,0 +1,159 @@
+# src/consumption/management/commands/importer_releves.py
+import csv
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from consumption.services import ingerer_releves, STATUT_CREE, STATUT_DOUBLON
+
+
+class Command(BaseCommand):
+    """
+    Import historique de relevés depuis des fichiers CSV ou NDJSON.
+    Les fichiers sont lus en flux, validés et insérés par lots (mémoire constante),
+    et un point de reprise est écrit après chaque lot validé : une commande
+    interrompue reprend là où elle s'était arrêtée.
+
+    Colonnes / clés attendues : compteur_reference, valeur, date_releve, commentaire (optionnel).
+    """
+    help = "Importe en flux des relevés historiques (CSV ou NDJSON) avec reprise sur interruption."
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichiers', nargs='+', help="Fichiers .csv, .ndjson ou .jsonl à importer.")
+        parser.add_argument('--format', choices=['auto', 'csv', 'ndjson'], default='auto')
+        parser.add_argument('--taille-lot', type=int, default=5000, help="Nombre de lignes validées et insérées par lot.")
+        parser.add_argument('--delimiteur', default=',', help="Délimiteur CSV (',' par défaut, ';' pour les exports Excel FR).")
+        parser.add_argument('--avec-alertes', action='store_true', help="Vérifie aussi les seuils (désactivé par défaut pour l'historique).")
+        parser.add_argument('--recommencer', action='store_true', help="Ignore le point de reprise existant.")
+        parser.add_argument('--rejets', help="Fichier NDJSON où écrire les lignes rejetées et leurs erreurs.")
+
+    def handle(self, *args, **options):
+        if options['taille_lot'] < 1:
+            raise CommandError("--taille-lot doit être positif.")
+
+        rejets = open(options['rejets'], 'a', encoding='utf-8') if options['rejets'] else None
+        try:
+            for chemin in options['fichiers']:
+                if not os.path.exists(chemin):
+                    raise CommandError(f"Fichier introuvable : {chemin}")
+                self.importer_fichier(chemin, options, rejets)
+        finally:
+            if rejets:
+                rejets.close()
+
+    def importer_fichier(self, chemin, options, rejets):
+        format_fichier = options['format']
+        if format_fichier == 'auto':
+            format_fichier = 'csv' if chemin.lower().endswith('.csv') else 'ndjson'
+
+        # 1. Point de reprise (position en octets + compteurs cumulés)
+        chemin_reprise = f"{chemin}.reprise.json"
+        reprise = {'position': 0, 'ligne': 0, 'crees': 0, 'doublons': 0, 'rejets': 0}
+        if os.path.exists(chemin_reprise) and not options['recommencer']:
+            with open(chemin_reprise, encoding='utf-8') as f:
+                reprise.update(json.load(f))
+            self.stdout.write(f"{chemin} : reprise à la ligne {reprise['ligne']}.")
+
+        debut = time.monotonic()
+        lignes_traitees = 0
+        with open(chemin, 'rb') as fichier:
+            if format_fichier == 'csv':
+                lignes = self.lire_csv(fichier, reprise, options['delimiteur'])
+            else:
+                lignes = self.lire_ndjson(fichier, reprise)
+
+            # 2. Lots de taille fixe : seul le lot courant est en mémoire
+            lot = []
+            for numero, position, donnees in lignes:
+                lot.append((numero, donnees))
+                if len(lot) >= options['taille_lot']:
+                    lignes_traitees += self.traiter_lot(lot, reprise, options, rejets)
+                    reprise['position'], reprise['ligne'] = position, numero
+                    self.ecrire_reprise(chemin_reprise, reprise)
+                    lot = []
+            if lot:
+                lignes_traitees += self.traiter_lot(lot, reprise, options, rejets)
+
+        # 3. Import terminé : le point de reprise n'a plus lieu d'être
+        if os.path.exists(chemin_reprise):
+            os.remove(chemin_reprise)
+
+        duree = time.monotonic() - debut
+        debit = lignes_traitees / duree if duree > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{chemin} : {lignes_traitees} lignes en {duree:.1f}s ({debit:.0f} lignes/s) - "
+            f"créés : {reprise['crees']}, doublons : {reprise['doublons']}, rejets : {reprise['rejets']}"
+        ))
+
+    def traiter_lot(self, lot, reprise, options, rejets):
+        lignes = [donnees for _, donnees in lot]
+        resultats = ingerer_releves(lignes, methode_releve='Import', verifier_alertes=options['avec_alertes'])
+        for (numero, donnees), resultat in zip(lot, resultats):
+            if resultat['statut'] == STATUT_CREE:
+                reprise['crees'] += 1
+            elif resultat['statut'] == STATUT_DOUBLON:
+                reprise['doublons'] += 1
+            else:
+                reprise['rejets'] += 1
+                if rejets:
+                    rejets.write(json.dumps({
+                        'ligne': numero,
+                        'statut': resultat['statut'],
+                        'erreurs': resultat.get('erreurs'),
+                        'donnees': donnees,
+                    }, default=str) + '\n')
+        return len(lot)
+
+    def ecrire_reprise(self, chemin_reprise, reprise):
+        # Écriture atomique : un arrêt brutal ne laisse jamais un fichier tronqué
+        temporaire = f"{chemin_reprise}.tmp"
+        with open(temporaire, 'w', encoding='utf-8') as f:
+            json.dump(reprise, f)
+        os.replace(temporaire, chemin_reprise)
+
+    def lire_csv(self, fichier, reprise, delimiteur):
+        """
+        Génère (numero_ligne, position_fin, donnees). La position en octets
+        est suivie ligne par ligne pour pouvoir reprendre avec seek().
+        """
+        entete = fichier.readline().decode('utf-8-sig')
+        colonnes = next(csv.reader([entete], delimiter=delimiteur))
+        if 'compteur_reference' not in colonnes:
+            raise CommandError(f"En-tête CSV invalide : {colonnes}")
+        if reprise['position']:
+            fichier.seek(reprise['position'])
+
+        etat = {'position': fichier.tell(), 'ligne': reprise['ligne']}
+
+        def lignes_texte():
+            for brut in iter(fichier.readline, b''):
+                etat['position'] = fichier.tell()
+                etat['ligne'] += 1
+                yield brut.decode('utf-8')
+
+        for valeurs in csv.reader(lignes_texte(), delimiter=delimiteur):
+            if not valeurs:
+                continue
+            donnees = dict(zip(colonnes, valeurs))
+            if not donnees.get('commentaire'):
+                donnees.pop('commentaire', None)
+            yield etat['ligne'], etat['position'], donnees
+
+    def lire_ndjson(self, fichier, reprise):
+        if reprise['position']:
+            fichier.seek(reprise['position'])
+        numero = reprise['ligne']
+        for brut in iter(fichier.readline, b''):
+            numero += 1
+            texte = brut.strip()
+            if not texte:
+                continue
+            try:
+                donnees = json.loads(texte)
+            except ValueError:
+                donnees = {'brut': texte.decode('utf-8', errors='replace')}
+            if not isinstance(donnees, dict):
+                donnees = {'brut': donnees}
+            yield numero, fichier.tell(), donnees
@@ -0,0 +1,69 @@
+# src/consumption/management/commands/reconstruire_agregats.py
+import time as chrono
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min, Max
+from django.utils.dateparse import parse_datetime, parse_date
+from django.utils import timezone
+
+from consumption.agregats import recalculer, debut_periode, fin_periode
+from consumption.models import Compteur, Releve, ArchiveReleve, AgregatCompteur, AgregatPartieCommune
+
+
+def _parse_borne(valeur, fin_de_journee=False):
+    # Une date seule couvre toute la journée (parse_datetime accepterait aussi 'AAAA-MM-JJ')
+    jour = parse_date(valeur)
+    if jour is not None:
+        date = datetime.combine(jour, time.max if fin_de_journee else time.min)
+    else:
+        date = parse_datetime(valeur)
+        if date is None:
+            raise CommandError(f"Date invalide : {valeur}")
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+class Command(BaseCommand):
+    """
+    Reconstruit les agrégats (heure/jour/mois) depuis les relevés bruts.
+    À lancer après la migration pour initialiser les tables, ou après un import massif.
+    """
+    help = "Reconstruit les agrégats AgregatCompteur / AgregatPartieCommune depuis les relevés."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compteur', action='append', dest='compteurs', help="Référence du compteur (répétable).")
+        parser.add_argument('--depuis', help="Date de début (AAAA-MM-JJ ou ISO 8601).")
+        parser.add_argument('--jusqua', help="Date de fin incluse (AAAA-MM-JJ ou ISO 8601).")
+
+    def handle(self, *args, **options):
+        compteur_ids = None
+        if options['compteurs']:
+            compteur_ids = list(Compteur.objects.filter(reference__in=options['compteurs']).values_list('id', flat=True))
+            if len(compteur_ids) != len(set(options['compteurs'])):
+                raise CommandError("Compteur introuvable parmi : " + ", ".join(options['compteurs']))
+
+        debut = _parse_borne(options['depuis']) if options['depuis'] else None
+        fin = _parse_borne(options['jusqua'], fin_de_journee=True) if options['jusqua'] else None
+
+        # Mois par mois : la mémoire reste bornée aux périodes d'un mois, même sur des années d'historique
+        bornes = [
+            Releve.objects.aggregate(debut=Min('date_releve'), fin=Max('date_releve')),
+            ArchiveReleve.objects.aggregate(debut=Min('date_min'), fin=Max('date_max')),
+        ]
+        premier = min((borne['debut'] for borne in bornes if borne['debut']), default=None)
+        dernier = max((borne['fin'] for borne in bornes if borne['fin']), default=None)
+        debut = max(debut, premier) if debut and premier else debut or premier
+        fin = min(fin, dernier) if fin and dernier else fin or dernier
+
+        depart = chrono.monotonic()
+        mois = debut_periode(debut, 'MOIS') if debut else None
+        while mois is not None and mois <= fin:
+            suivant = fin_periode(mois, 'MOIS')
+            recalculer(compteur_ids, max(mois, debut), min(suivant - timedelta(microseconds=1), fin))
+            mois = suivant
+        self.stdout.write(self.style.SUCCESS(
+            f"Agrégats reconstruits en {chrono.monotonic() - depart:.1f}s "
+            f"({AgregatCompteur.objects.count()} par compteur, {AgregatPartieCommune.objects.count()} par partie commune)."
+        ))
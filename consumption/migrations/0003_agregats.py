@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-18 08:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumption', '0002_compteur_seuil_alerte'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgregatCompteur',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('granularite', models.CharField(choices=[('HEURE', 'Heure'), ('JOUR', 'Jour'), ('MOIS', 'Mois')], max_length=5)),
+                ('debut_periode', models.DateTimeField()),
+                ('nombre', models.IntegerField(default=0)),
+                ('somme', models.FloatField(default=0.0)),
+                ('minimum', models.FloatField(null=True)),
+                ('maximum', models.FloatField(null=True)),
+                ('compteur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agregats', to='consumption.compteur')),
+            ],
+            options={
+                'unique_together': {('compteur', 'granularite', 'debut_periode')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AgregatPartieCommune',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('granularite', models.CharField(choices=[('HEURE', 'Heure'), ('JOUR', 'Jour'), ('MOIS', 'Mois')], max_length=5)),
+                ('debut_periode', models.DateTimeField()),
+                ('nombre', models.IntegerField(default=0)),
+                ('somme', models.FloatField(default=0.0)),
+                ('minimum', models.FloatField(null=True)),
+                ('maximum', models.FloatField(null=True)),
+                ('partie_commune', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agregats', to='consumption.partiecommune')),
+            ],
+            options={
+                'unique_together': {('partie_commune', 'granularite', 'debut_periode')},
+            },
+        ),
+    ]
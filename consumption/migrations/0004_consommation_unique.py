@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 08:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumption', '0003_agregats'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='consommation',
+            unique_together={('periode', 'partie_commune')},
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 08:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumption', '0004_consommation_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveReleve',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('mois', models.DateField()),
+                ('nombre', models.IntegerField()),
+                ('date_min', models.DateTimeField()),
+                ('date_max', models.DateTimeField()),
+                ('donnees', models.BinaryField()),
+                ('compteur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archives', to='consumption.compteur')),
+            ],
+            options={
+                'unique_together': {('compteur', 'mois')},
+            },
+        ),
+    ]
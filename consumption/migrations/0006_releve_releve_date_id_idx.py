@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumption', '0005_archive_releve'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='releve',
+            index=models.Index(fields=['-date_releve', '-id'], name='releve_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 08:39
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def initialiser_derniers_releves(apps, schema_editor):
+    Compteur = apps.get_model('consumption', 'Compteur')
+    Releve = apps.get_model('consumption', 'Releve')
+    dernier = Releve.objects.filter(compteur=OuterRef('pk')).order_by('-date_releve')
+    Compteur.objects.update(
+        derniere_valeur=Subquery(dernier.values('valeur')[:1]),
+        date_derniere_valeur=Subquery(dernier.values('date_releve')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumption', '0006_releve_releve_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compteur',
+            name='date_derniere_valeur',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='compteur',
+            name='derniere_valeur',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(initialiser_derniers_releves, migrations.RunPython.noop),
+    ]
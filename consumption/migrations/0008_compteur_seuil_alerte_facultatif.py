@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumption', '0007_compteur_dernier_releve'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='compteur',
+            name='seuil_alerte',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
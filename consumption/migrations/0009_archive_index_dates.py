@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumption', '0008_compteur_seuil_alerte_facultatif'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivereleve',
+            index=models.Index(fields=['-date_max', 'id'], name='archive_date_max_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivereleve',
+            index=models.Index(fields=['date_min', 'id'], name='archive_date_min_idx'),
+        ),
+    ]
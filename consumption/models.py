@@ -29,12 +29,23 @@ class Compteur(models.Model):
     date_installation = models.DateField() # Attribut 'dateInstallation:date' [cite: 107]
     type_compteur = models.CharField(max_length=50) # Attribut 'typeCompteur:string' [cite: 108]
     etat_compteur = models.CharField(max_length=50) # Attribut 'etatCompteur:string' [cite: 109]
-    seuil_alerte = models.FloatField(default=200.0)
+    # Seuil de surconsommation propre au compteur ; vide : la règle SeuilAlerte globale s'applique (alerts/index_seuils.py)
+    seuil_alerte = models.FloatField(null=True, blank=True)
+
+    # Dernier relevé connu, dénormalisé (tenu à jour par consumption/services.py) :
+    # contrôles de cohérence à la saisie et listes de compteurs sans sous-requête
+    derniere_valeur = models.FloatField(null=True, blank=True, editable=False)
+    date_derniere_valeur = models.DateTimeField(null=True, blank=True, editable=False)
     
     # Relation (Compteur concerne une PartieCommune)
     partie_commune = models.ForeignKey(PartieCommune, on_delete=models.CASCADE, related_name='compteurs')
     
     # Méthodes (obtenirDerniereValeur(), calculerConsommation(), verifierEtat() seront implémentées ou gérées par l'API/services)
+    # calculerConsommation() : voir consumption/utils.py
+
+    def obtenir_derniere_valeur(self):
+        # obtenirDerniereValeur() : lecture du cache, aucune requête sur les relevés
+        return self.derniere_valeur
     
     def __str__(self):
         return self.reference
@@ -56,6 +67,10 @@ class Releve(models.Model):
     class Meta:
         ordering = ['-date_releve']
         unique_together = ('compteur', 'date_releve') 
+        indexes = [
+            # Pagination par curseur (-date_releve, -id) ; le filtre par compteur utilise l'index unique
+            models.Index(fields=['-date_releve', '-id'], name='releve_date_id_idx'),
+        ]
     
     def __str__(self):
         return f"Relevé {self.valeur} de {self.compteur.reference}"
@@ -76,6 +91,10 @@ class Consommation(models.Model):
     partie_commune = models.ForeignKey(PartieCommune, on_delete=models.CASCADE, related_name='consommations')
     
     # Méthodes (calculerMoyenne(), comparerPeriode(), calculerCout() seront implémentées dans le manager ou des services)
+    # Alimenté par consumption.utils.calculer_consommations() (commande calculer_consommations)
+
+    class Meta:
+        unique_together = ('periode', 'partie_commune')
     
     def __str__(self):
         return f"Consommation {self.valeur_consommee} ({self.periode})"
@@ -93,4 +112,86 @@ class Historique(models.Model):
     utilisateur = models.ForeignKey(Utilisateur, on_delete=models.SET_NULL, null=True)
     
     def __str__(self):
-        return f"{self.action} le {self.date_action.strftime('%Y-%m-%d')}"
\ No newline at end of file
+        return f"{self.action} le {self.date_action.strftime('%Y-%m-%d')}"
+
+# --- 3. Agrégats matérialisés (évite de relire les relevés bruts) ---
+
+GRANULARITE_CHOICES = [
+    ('HEURE', 'Heure'),
+    ('JOUR', 'Jour'),
+    ('MOIS', 'Mois'),
+]
+
+class AgregatCompteur(models.Model):
+    """
+    Agrégat des relevés d'un compteur sur une période (heure, jour ou mois).
+    Maintenu incrémentalement à chaque insertion/correction (voir consumption/agregats.py).
+    """
+    id = models.AutoField(primary_key=True)
+    compteur = models.ForeignKey(Compteur, on_delete=models.CASCADE, related_name='agregats')
+    granularite = models.CharField(max_length=5, choices=GRANULARITE_CHOICES)
+    debut_periode = models.DateTimeField()
+    nombre = models.IntegerField(default=0)
+    somme = models.FloatField(default=0.0)
+    minimum = models.FloatField(null=True)
+    maximum = models.FloatField(null=True)
+
+    class Meta:
+        unique_together = ('compteur', 'granularite', 'debut_periode')
+
+    @property
+    def moyenne(self):
+        return self.somme / self.nombre if self.nombre else None
+
+    def __str__(self):
+        return f"{self.compteur_id} {self.granularite} {self.debut_periode:%Y-%m-%d %H:%M}"
+
+class AgregatPartieCommune(models.Model):
+    """
+    Agrégat des relevés de tous les compteurs d'une partie commune sur une période.
+    """
+    id = models.AutoField(primary_key=True)
+    partie_commune = models.ForeignKey(PartieCommune, on_delete=models.CASCADE, related_name='agregats')
+    granularite = models.CharField(max_length=5, choices=GRANULARITE_CHOICES)
+    debut_periode = models.DateTimeField()
+    nombre = models.IntegerField(default=0)
+    somme = models.FloatField(default=0.0)
+    minimum = models.FloatField(null=True)
+    maximum = models.FloatField(null=True)
+
+    class Meta:
+        unique_together = ('partie_commune', 'granularite', 'debut_periode')
+
+    @property
+    def moyenne(self):
+        return self.somme / self.nombre if self.nombre else None
+
+    def __str__(self):
+        return f"{self.partie_commune_id} {self.granularite} {self.debut_periode:%Y-%m-%d %H:%M}"
+
+
+# --- 4. Archive froide des relevés anciens ---
+
+class ArchiveReleve(models.Model):
+    """
+    Bloc d'archive : tous les relevés d'un compteur pour un mois, stockés en colonnes
+    (identifiants, horodatages, valeurs...) compressées. Voir consumption/archive.py.
+    """
+    id = models.AutoField(primary_key=True)
+    compteur = models.ForeignKey(Compteur, on_delete=models.CASCADE, related_name='archives')
+    mois = models.DateField() # Premier jour du mois archivé
+    nombre = models.IntegerField()
+    date_min = models.DateTimeField()
+    date_max = models.DateTimeField()
+    donnees = models.BinaryField()
+
+    class Meta:
+        unique_together = ('compteur', 'mois')
+        indexes = [
+            # Parcours des blocs par la pagination des relevés (consumption/pagination.py), dans les deux sens
+            models.Index(fields=['-date_max', 'id'], name='archive_date_max_idx'),
+            models.Index(fields=['date_min', 'id'], name='archive_date_min_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archive {self.compteur_id} {self.mois:%Y-%m} ({self.nombre} relevés)"
@@ -0,0 +1,130 @@
+# src/consumption/pagination.py
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+
+from .archive import decoder_bloc
+from .models import Compteur
+
+
+class CurseurPagination(CursorPagination):
+    """
+    Pagination par curseur (clé d'ordre) : le coût d'une page ne dépend pas
+    de sa profondeur, et les liens next/previous restent stables quand des
+    lignes sont insérées. Chaque vue précise `ordering` (colonnes indexées).
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class ReleveCurseurPagination(CurseurPagination):
+    """
+    Curseur (date_releve, id) commun à la table chaude et à l'archive froide :
+    seuls les blocs d'archive dont les dates peuvent encore entrer dans la page sont lus
+    (LOT_BLOCS par requête) et décodés.
+    """
+    ordering = ('-date_releve', '-id')
+    LOT_BLOCS = 20
+
+    def paginate_releves(self, queryset, archives, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        inverse = self.cursor.reverse if self.cursor else False
+        limite = self.page_size + 1
+
+        # 1. Table chaude : (date, id) strictement après le curseur
+        if self.cursor:
+            date, releve_id = self._cle(self.cursor.position)
+            if inverse:
+                queryset = queryset.filter(Q(date_releve__gt=date) | Q(date_releve=date, id__gt=releve_id))
+                archives = archives.filter(date_max__gte=date)
+            else:
+                queryset = queryset.filter(Q(date_releve__lt=date) | Q(date_releve=date, id__lt=releve_id))
+                archives = archives.filter(date_min__lte=date)
+        ordre = ('date_releve', 'id') if inverse else ('-date_releve', '-id')
+        lignes = list(queryset.order_by(*ordre)[:limite])
+
+        # 2. Archive : blocs du plus proche au plus lointain, arrêt dès qu'ils ne peuvent plus battre la page.
+        # Les données des blocs sont lues par lots de LOT_BLOCS (une requête par lot, pas par bloc).
+        def cle(releve):
+            return (releve.date_releve, releve.id)
+
+        def peut_entrer(date_min, date_max):
+            if len(lignes) < limite:
+                return True
+            pire = lignes[limite - 1].date_releve
+            return date_min <= pire if inverse else date_max >= pire
+
+        compteurs = {}
+        blocs = archives.order_by('date_min' if inverse else '-date_max').values_list('id', 'compteur_id', 'date_min', 'date_max').iterator()
+        termine = False
+        while not termine:
+            lot = []
+            for bloc in blocs:
+                if not peut_entrer(bloc[2], bloc[3]):
+                    termine = True
+                    break
+                lot.append(bloc)
+                if len(lot) == self.LOT_BLOCS:
+                    break
+            else:
+                termine = True
+            if not lot:
+                break
+            donnees = dict(archives.model.objects.filter(id__in=[bloc[0] for bloc in lot]).values_list('id', 'donnees'))
+            for bloc_id, compteur_id, date_min, date_max in lot:
+                # La page a pu se remplir avec les blocs précédents du lot
+                if not peut_entrer(date_min, date_max):
+                    termine = True
+                    break
+                for releve in decoder_bloc(donnees[bloc_id], compteur_id):
+                    if self.cursor and (cle(releve) <= (date, releve_id) if inverse else cle(releve) >= (date, releve_id)):
+                        continue
+                    lignes.append(releve)
+                    compteurs[compteur_id] = None
+                lignes.sort(key=cle, reverse=not inverse)
+                del lignes[limite:]
+
+        if compteurs:
+            compteurs.update(Compteur.objects.in_bulk(list(compteurs)))
+            for releve in lignes:
+                if releve.compteur_id in compteurs and releve._state.adding:
+                    releve.compteur = compteurs[releve.compteur_id]
+
+        # 3. Liens : en sens inverse on a lu la page "à l'envers"
+        plus = len(lignes) > self.page_size
+        page = lignes[:self.page_size]
+        if inverse:
+            page.reverse()
+            self.has_next, self.has_previous = True, plus
+        else:
+            self.has_next, self.has_previous = plus, self.cursor is not None
+        self.page = page
+        return page
+
+    def _cle(self, position):
+        date_texte, _, releve_id = (position or '').rpartition('|')
+        date = parse_datetime(date_texte)
+        if date is None or not releve_id.isdigit():
+            raise NotFound(self.invalid_cursor_message)
+        return date, int(releve_id)
+
+    def _lien(self, releve, inverse):
+        position = f"{releve.date_releve.isoformat()}|{releve.id}"
+        return self.encode_cursor(Cursor(offset=0, reverse=inverse, position=position))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._lien(self.page[-1], False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._lien(self.page[0], True)
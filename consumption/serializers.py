@@ -54,4 +54,6 @@ class CompteurSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Compteur
-        fields = ['id', 'reference', 'partie_commune', 'localisation', 'date_installation', 'seuil_alerte', 'type_compteur', 'etat_compteur', 'nom_zone']
\ No newline at end of file
+        fields = ['id', 'reference', 'partie_commune', 'localisation', 'date_installation', 'seuil_alerte', 'type_compteur', 'etat_compteur', 'nom_zone', 'derniere_valeur', 'date_derniere_valeur']
+        # Dernier relevé : colonnes dénormalisées du compteur, tenues à jour à chaque saisie
+        read_only_fields = ['derniere_valeur', 'date_derniere_valeur']
\ No newline at end of file
@@ -0,0 +1,186 @@
+# src/consumption/services.py
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DateTimeField, FloatField, OuterRef, Q, Subquery, Value, When
+from rest_framework import serializers
+
+from .models import Compteur, Releve
+from .agregats import ajouter_releves
+from .archive import blocs, horizon_archive, lire_archives
+from alerts.services import evaluer_regles, evaluer_seuils, verifier_coherence
+from alerts.file_attente import mettre_en_file
+
+# Statuts renvoyés pour chaque élément d'un lot
+STATUT_CREE = 'CREE'
+STATUT_DOUBLON = 'DOUBLON'
+STATUT_COMPTEUR_INCONNU = 'COMPTEUR_INCONNU'
+STATUT_INVALIDE = 'INVALIDE'
+
+
+class ReleveLotItemSerializer(serializers.Serializer):
+    """
+    Validation d'un relevé d'un lot (passerelle ou import de fichier).
+    """
+    compteur_reference = serializers.CharField(max_length=50)
+    valeur = serializers.FloatField()
+    date_releve = serializers.DateTimeField()
+    commentaire = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
+def maj_derniers_releves(releves, batch_size=500):
+    """
+    Avance le dernier relevé connu (Compteur.derniere_valeur) des compteurs concernés.
+    Une seule mise à jour conditionnelle (CASE par compteur) par paquet de `batch_size` compteurs :
+    un relevé tardif ne remplace jamais un plus récent.
+    """
+    plus_recents = {}
+    for releve in releves:
+        actuel = plus_recents.get(releve.compteur_id)
+        if actuel is None or releve.date_releve > actuel.date_releve:
+            plus_recents[releve.compteur_id] = releve
+    paquet = list(plus_recents.values())
+    for position in range(0, len(paquet), batch_size):
+        lot = paquet[position:position + batch_size]
+        dates = Case(
+            *(When(id=releve.compteur_id, then=Value(releve.date_releve)) for releve in lot), output_field=DateTimeField()
+        )
+        Compteur.objects.filter(
+            Q(date_derniere_valeur__isnull=True) | Q(date_derniere_valeur__lt=dates),
+            id__in=[releve.compteur_id for releve in lot],
+        ).update(
+            derniere_valeur=Case(
+                *(When(id=releve.compteur_id, then=Value(releve.valeur)) for releve in lot), output_field=FloatField()
+            ),
+            date_derniere_valeur=dates,
+        )
+
+
+def corriger_dernier_releve(releve):
+    """ Répercute la correction d'un relevé s'il est le dernier connu de son compteur. """
+    Compteur.objects.filter(id=releve.compteur_id, date_derniere_valeur=releve.date_releve).update(derniere_valeur=releve.valeur)
+
+
+def recalculer_derniers_releves(compteur_ids=None):
+    """
+    Relit le dernier relevé depuis la table chaude (après une suppression, ou pour reconstruire le cache).
+    L'archive garde toujours le dernier relevé de chaque compteur dans la table chaude.
+    """
+    compteurs = Compteur.objects.all()
+    if compteur_ids is not None:
+        compteurs = compteurs.filter(id__in=compteur_ids)
+    dernier = Releve.objects.filter(compteur=OuterRef('pk')).order_by('-date_releve')
+    compteurs.update(
+        derniere_valeur=Subquery(dernier.values('valeur')[:1]),
+        date_derniere_valeur=Subquery(dernier.values('date_releve')[:1]),
+    )
+
+
+def dates_archivees(cles):
+    """
+    Parmi les clés (compteur_id, date_releve), celles déjà présentes dans l'archive froide.
+    Une requête (horizon) tant qu'aucune date n'est antérieure à l'horizon d'archivage ;
+    sinon les blocs des compteurs et des mois concernés sont relus.
+    """
+    horizon = horizon_archive()
+    anciennes = [(compteur_id, date) for compteur_id, date in cles if horizon is not None and date < horizon]
+    if not anciennes:
+        return set()
+    debut, fin = min(date for _, date in anciennes), max(date for _, date in anciennes)
+    archives = blocs(compteur_ids={compteur_id for compteur_id, _ in anciennes}, debut=debut, fin=fin)
+    archivees = {(releve.compteur_id, releve.date_releve) for releve in lire_archives(archives, debut, fin, decroissant=False)}
+    return archivees.intersection(anciennes)
+
+
+def ingerer_releves(lignes, methode_releve='Automatique', verifier_alertes=True, batch_size=1000):
+    """
+    Enregistre un lot de relevés bruts en un nombre constant de requêtes :
+    résolution des références compteur, détection des doublons (table chaude, et archive froide
+    pour les dates antérieures à l'horizon d'archivage : une lecture par bloc concerné), insertion
+    en bulk, mise à jour du dernier relevé connu puis vérification des seuils
+    et de la cohérence (recul, saut) pour tout le lot, ou mise en file de cette
+    vérification si settings.ALERTES_ASYNCHRONES.
+
+    Retourne une liste de résultats alignée sur `lignes` (dict avec 'index', 'statut'
+    et selon le cas 'id', 'alerte_generee', 'anomalie_detectee', 'evaluation_differee', 'erreurs').
+    """
+    validateur = ReleveLotItemSerializer()
+    resultats = [None] * len(lignes)
+    valides = []
+
+    # 1. Validation de chaque élément (sans instancier un sérialiseur par ligne)
+    for index, ligne in enumerate(lignes):
+        try:
+            valides.append((index, validateur.run_validation(ligne)))
+        except serializers.ValidationError as exc:
+            resultats[index] = {'index': index, 'statut': STATUT_INVALIDE, 'erreurs': exc.detail}
+
+    # 2. Résolution de toutes les références en une seule requête (avec le dernier relevé connu)
+    references = {donnees['compteur_reference'] for _, donnees in valides}
+    compteurs, derniers = {}, {}
+    for reference, compteur_id, derniere_valeur, date_derniere_valeur in Compteur.objects.filter(
+        reference__in=references
+    ).values_list('reference', 'id', 'derniere_valeur', 'date_derniere_valeur'):
+        compteurs[reference] = compteur_id
+        derniers[compteur_id] = (derniere_valeur, date_derniere_valeur)
+
+    # 3. Doublons : déjà en base ou répétés dans le lot (unique_together compteur/date_releve)
+    candidats = []
+    for index, donnees in valides:
+        compteur_id = compteurs.get(donnees['compteur_reference'])
+        if compteur_id is None:
+            resultats[index] = {'index': index, 'statut': STATUT_COMPTEUR_INCONNU}
+        else:
+            candidats.append((index, compteur_id, donnees))
+
+    existants = set()
+    if candidats:
+        dates = [donnees['date_releve'] for _, _, donnees in candidats]
+        existants = set(
+            Releve.objects.filter(
+                compteur_id__in={compteur_id for _, compteur_id, _ in candidats},
+                date_releve__range=(min(dates), max(dates)),
+            ).values_list('compteur_id', 'date_releve')
+        )
+        # Historique renvoyé ou réimporté : les relevés déjà archivés sont aussi des doublons
+        existants |= dates_archivees({(compteur_id, donnees['date_releve']) for _, compteur_id, donnees in candidats})
+
+    a_creer = []
+    for index, compteur_id, donnees in candidats:
+        cle = (compteur_id, donnees['date_releve'])
+        if cle in existants:
+            resultats[index] = {'index': index, 'statut': STATUT_DOUBLON}
+            continue
+        existants.add(cle)
+        a_creer.append((index, Releve(
+            compteur_id=compteur_id,
+            valeur=donnees['valeur'],
+            date_releve=donnees['date_releve'],
+            commentaire=donnees.get('commentaire'),
+            methode_releve=methode_releve,
+        )))
+
+    # 4. Insertion en bulk puis vérification des seuils pour tout le lot
+    releves = [releve for _, releve in a_creer]
+    with transaction.atomic():
+        Releve.objects.bulk_create(releves, batch_size=batch_size)
+        ajouter_releves(releves)
+        maj_derniers_releves(releves)
+        differee = verifier_alertes and settings.ALERTES_ASYNCHRONES
+        if differee:
+            # Évaluation par le worker (manage.py traiter_alertes) : la saisie rend la main tout de suite
+            mettre_en_file(releves, derniers)
+            alertes = anomalies = [None] * len(releves)
+        elif verifier_alertes:
+            alertes = [seuil or regle for seuil, regle in zip(evaluer_seuils(releves), evaluer_regles(releves))]
+            anomalies = verifier_coherence(releves, derniers)
+        else:
+            alertes = anomalies = [None] * len(releves)
+
+    for (index, releve), alerte, anomalie in zip(a_creer, alertes, anomalies):
+        resultats[index] = {'index': index, 'statut': STATUT_CREE, 'id': releve.id}
+        if differee:
+            resultats[index]['evaluation_differee'] = True
+        else:
+            resultats[index]['alerte_generee'] = alerte is not None
+            resultats[index]['anomalie_detectee'] = anomalie is not None
+    return resultats
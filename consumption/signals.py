@@ -0,0 +1,33 @@
+# src/consumption/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Compteur, Releve
+from . import agregats
+from .services import maj_derniers_releves, corriger_dernier_releve, recalculer_derniers_releves
+
+# Remarque : bulk_create n'émet pas de signaux, la saisie en lot
+# (services.ingerer_releves) met donc les agrégats et le dernier relevé à jour elle-même.
+
+@receiver(post_save, sender=Releve)
+def maj_agregats_apres_enregistrement(sender, instance, created, **kwargs):
+    if created:
+        agregats.ajouter_releves([instance])
+        maj_derniers_releves([instance])
+    else:
+        # Correction : le min/max ne se défait pas incrémentalement, on recalcule les périodes touchées
+        agregats.recalculer([instance.compteur_id], instance.date_releve, instance.date_releve)
+        corriger_dernier_releve(instance)
+
+@receiver(post_delete, sender=Releve)
+def maj_agregats_apres_suppression(sender, instance, origin=None, **kwargs):
+    # Suppression en cascade d'un compteur : ses agrégats partent avec lui (voir ci-dessous)
+    if origin is not None and getattr(origin, 'model', type(origin)) is not Releve:
+        return
+    agregats.recalculer([instance.compteur_id], instance.date_releve, instance.date_releve)
+    recalculer_derniers_releves([instance.compteur_id])
+
+@receiver(post_delete, sender=Compteur)
+def maj_agregats_apres_suppression_compteur(sender, instance, **kwargs):
+    # Les agrégats de la partie commune ne doivent plus compter les relevés du compteur supprimé
+    agregats.recalculer([instance.id], partie_ids=[instance.partie_commune_id])
@@ -1,3 +1,576 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
 
+from alerts.models import Alerte, SeuilAlerte
+from users.models import Resident, Syndic
+from .agregats import ajouter_releves, recalculer
+from .archive import archiver, decoder_bloc, encoder_bloc
+from .management.commands.importer_releves import Command as ImportCommande
+from .models import AgregatCompteur, AgregatPartieCommune, ArchiveReleve, Compteur, Consommation, PartieCommune, Releve
+from .services import STATUT_CREE, STATUT_DOUBLON, ingerer_releves
+from .utils import avec_releve_precedent, calculer_consommations, lttb
+
+
+class RequetesConstantesMixin:
+    """
+    Garde-fou contre les requêtes N+1 : un endpoint doit faire le même nombre de
+    requêtes quel que soit le nombre de lignes renvoyées.
+    `creer(n)` ajoute n lignes ; on compte les requêtes avec PETIT lignes, puis avec GRAND.
+    Un premier appel à vide remplit les caches (profil de l'utilisateur, index des seuils...).
+    """
+    PETIT = 2
+    GRAND = 25
+
+    def compter_requetes(self, client, url):
+        with CaptureQueriesContext(connection) as requetes:
+            reponse = client.get(url)
+        self.assertEqual(reponse.status_code, 200, reponse.content[:500])
+        return len(requetes)
+
+    def assertRequetesConstantes(self, client, url, creer):
+        self.compter_requetes(client, url)
+        creer(self.PETIT)
+        avant = self.compter_requetes(client, url)
+        creer(self.GRAND - self.PETIT)
+        apres = self.compter_requetes(client, url)
+        self.assertEqual(
+            avant, apres,
+            f"{url} : {avant} requêtes pour {self.PETIT} lignes, {apres} pour {self.GRAND} (requêtes N+1 ?)"
+        )
+        return apres
+
+
+# Utilisateurs sans mot de passe (hachage évité : les tests créent des dizaines de comptes)
+def creer_syndic(email='syndic@copro.fr'):
+    syndic = Syndic.objects.create_user(email, None, nom='Syndic', prenom='Test')
+    client = APIClient()
+    client.force_authenticate(syndic)
+    return syndic, client
+
+
+class CompteurFabrique:
+    """ Numérotation unique des zones et compteurs créés par les tests. """
+    numero = 0
+
+    @classmethod
+    def compteurs(cls, n, partie_commune=None):
+        crees = []
+        for _ in range(n):
+            cls.numero += 1
+            zone = partie_commune or PartieCommune.objects.create(nom=f"Zone {cls.numero}", surface=100)
+            crees.append(Compteur.objects.create(
+                reference=f"CPT-{cls.numero}", localisation='Sous-sol', date_installation='2024-01-01',
+                type_compteur='Électricité', etat_compteur='Actif', partie_commune=zone,
+            ))
+        return crees
+
+
+class RequetesConsommationTests(RequetesConstantesMixin, TestCase):
+
+    def setUp(self):
+        self.syndic, self.client_api = creer_syndic()
+
+    def test_liste_compteurs(self):
+        self.assertRequetesConstantes(self.client_api, '/api/consumption/compteurs/', CompteurFabrique.compteurs)
+
+    def test_liste_parties_communes(self):
+        def creer(n):
+            PartieCommune.objects.bulk_create(PartieCommune(nom=f"Hall {i}", surface=50) for i in range(n))
+        self.assertRequetesConstantes(self.client_api, '/api/consumption/parties-communes/', creer)
+
+    def test_liste_releves(self):
+        debut = timezone.now() - timedelta(days=1)
+
+        def creer(n):
+            for compteur in CompteurFabrique.compteurs(n):
+                Releve.objects.create(compteur=compteur, valeur=10, date_releve=debut, methode_releve='Manuelle')
+        self.assertRequetesConstantes(self.client_api, '/api/consumption/releves/', creer)
+
+
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        self.compteur, = CompteurFabrique.compteurs(1)
+        self.origine = datetime(2025, 1, 10, 8, 30, 15, 123456, tzinfo=dt_timezone.utc)
+
+    def creer_historique(self):
+        for i in range(40):
+            Releve.objects.create(
+                compteur=self.compteur, valeur=1000 + 2.5 * i, date_releve=self.origine + timedelta(days=i),
+                methode_releve='Manuelle' if i % 3 else 'Automatique', est_corrige=i == 5,
+                commentaire='Relevé contrôlé' if i == 7 else None,
+            )
+
+    def test_aller_retour_bloc(self):
+        releves = [
+            Releve(id=100 - 7 * i, compteur_id=self.compteur.id, valeur=valeur, date_releve=self.origine + timedelta(minutes=17 * i, microseconds=i),
+                   methode_releve=('Manuelle', 'Import', 'Automatique')[i % 3], est_corrige=i % 4 == 0, commentaire='é' * i if i % 5 == 0 and i else None)
+            for i, valeur in enumerate((0.0, -12.5, 1e12, 3.141592653589793, 42.0, 7.0, 8.0, 9.0, 10.0, 11.0, 12.0))
+        ]
+        # Ordre d'entrée quelconque : le bloc est trié par date
+        decodes = decoder_bloc(encoder_bloc(list(reversed(releves))), self.compteur.id)
+        champs = lambda releve: (releve.id, releve.compteur_id, releve.valeur, releve.date_releve, releve.methode_releve, releve.est_corrige, releve.commentaire)
+        self.assertEqual([champs(releve) for releve in decodes], [champs(releve) for releve in releves])
+        self.assertEqual(decoder_bloc(encoder_bloc([]), self.compteur.id), [])
+        with self.assertRaises(ValueError):
+            decoder_bloc(zlib.compress(b'XXXX' + bytes(20)), self.compteur.id)
+
+    def test_archivage_et_lecture(self):
+        self.creer_historique()
+        agregats = list(AgregatCompteur.objects.order_by('id').values())
+        archives, blocs_ecrits, _ = archiver(datetime(2025, 3, 1, tzinfo=dt_timezone.utc))
+        # Tout sauf le dernier relevé avant la limite (et ceux d'après), en un bloc par mois
+        self.assertEqual((archives, blocs_ecrits), (19 + 28 - 8, 2))
+        self.assertEqual(Releve.objects.count(), 40 - archives)
+        # Suppression sans signaux : les agrégats comptent toujours les relevés archivés
+        self.assertEqual(list(AgregatCompteur.objects.order_by('id').values()), agregats)
+
+        _, client = creer_syndic()
+        reponse = client.get(f'/api/consumption/releves/?compteur={self.compteur.reference}&page_size=100')
+        self.assertEqual(reponse.status_code, 200)
+        dates = [releve['date_releve'] for releve in reponse.data['results']]
+        self.assertEqual(len(dates), 40)
+        self.assertEqual(dates, sorted(dates, reverse=True))
+
+    def test_pagination_profonde_multi_compteurs(self):
+        # 30 compteurs, un bloc d'archive chacun pour janvier : les pages profondes lisent les blocs par lots
+        compteurs = CompteurFabrique.compteurs(30)
+        Releve.objects.bulk_create(
+            Releve(compteur=compteur, valeur=i, date_releve=self.origine + timedelta(hours=i, minutes=n), methode_releve='Manuelle')
+            for n, compteur in enumerate(compteurs) for i in range(4)
+        )
+        archiver(datetime(2025, 3, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(ArchiveReleve.objects.count(), 30)
+
+        _, client = creer_syndic()
+        url, dates, requetes = '/api/consumption/releves/?page_size=10', [], []
+        while url:
+            with CaptureQueriesContext(connection) as capture:
+                reponse = client.get(url)
+            self.assertEqual(reponse.status_code, 200)
+            requetes.append(len(capture))
+            dates += [(releve['date_releve'], releve['id']) for releve in reponse.data['results']]
+            url = reponse.data['next']
+        self.assertEqual(len(dates), 120)
+        self.assertEqual(dates, sorted(dates, reverse=True))
+        self.assertLess(max(requetes), 15)
+
+        # Retour en arrière depuis la dernière page : mêmes relevés
+        precedent = client.get(reponse.data['previous']).data
+        self.assertEqual([(releve['date_releve'], releve['id']) for releve in precedent['results']], dates[-20:-10])
+
+    def test_doublons_archives_refuses(self):
+        self.creer_historique()
+        archiver(datetime(2025, 3, 1, tzinfo=dt_timezone.utc))
+        lignes = [
+            {'compteur_reference': self.compteur.reference, 'valeur': 1002.5, 'date_releve': self.origine + timedelta(days=1)},
+            {'compteur_reference': self.compteur.reference, 'valeur': 1003.0, 'date_releve': self.origine + timedelta(days=1, hours=1)},
+        ]
+        statuts = [resultat['statut'] for resultat in ingerer_releves(lignes, verifier_alertes=False)]
+        self.assertEqual(statuts, [STATUT_DOUBLON, STATUT_CREE])
+
+        _, client = creer_syndic('autre@copro.fr')
+        reponse = client.post('/api/consumption/releves/saisie/', {
+            'compteur_reference': self.compteur.reference, 'valeur': 1005.0, 'date_releve': self.origine + timedelta(days=2),
+        }, format='json')
+        self.assertEqual(reponse.status_code, 400)
+        self.assertIn('date_releve', reponse.data)
+
+
+@override_settings(ALERTES_ASYNCHRONES=False)
+class DernierReleveTests(TestCase):
+
+    def lot(self, compteurs, valeur, date):
+        return [{'compteur_reference': compteur.reference, 'valeur': valeur, 'date_releve': date} for compteur in compteurs]
+
+    def test_mise_a_jour_en_requetes_constantes(self):
+        date = timezone.now() - timedelta(hours=2)
+
+        def compter(n):
+            lignes = self.lot(CompteurFabrique.compteurs(n), 100.0, date)
+            with CaptureQueriesContext(connection) as requetes:
+                ingerer_releves(lignes, verifier_alertes=False)
+            return len(requetes)
+
+        compter(1)
+        self.assertEqual(compter(2), compter(30))
+
+    def test_releve_tardif_et_recul_d_index(self):
+        compteurs = CompteurFabrique.compteurs(2)
+        date = timezone.now() - timedelta(hours=2)
+        ingerer_releves(self.lot(compteurs, 100.0, date))
+        # Relevé tardif (plus ancien) : le dernier relevé connu ne recule pas
+        ingerer_releves(self.lot(compteurs[:1], 90.0, date - timedelta(hours=1)), verifier_alertes=False)
+        compteurs[0].refresh_from_db()
+        self.assertEqual((compteurs[0].derniere_valeur, compteurs[0].date_derniere_valeur), (100.0, date))
+
+        # Index qui recule par rapport au dernier relevé connu : anomalie signalée à la saisie
+        resultats = ingerer_releves(self.lot(compteurs, 40.0, date + timedelta(hours=1)))
+        self.assertEqual([resultat['anomalie_detectee'] for resultat in resultats], [True, True])
+        compteurs[1].refresh_from_db()
+        self.assertEqual(compteurs[1].derniere_valeur, 40.0)
+
+
+    def test_saisie_en_double_refusee_sans_alerte(self):
+        compteur, = CompteurFabrique.compteurs(1)
+        SeuilAlerte.objects.create(compteur=None, type_alerte='ANOMALIE_RELEVE', valeur_seuil=3)
+        date = timezone.now() - timedelta(hours=2)
+        ingerer_releves(self.lot([compteur], 100.0, date - timedelta(hours=1)) + self.lot([compteur], 110.0, date), verifier_alertes=False)
+        _, client = creer_syndic()
+        url = '/api/consumption/releves/saisie/'
+        # Doublon du dernier relevé, puis d'un relevé plus ancien : 400, et aucune alerte
+        for instant, valeur in ((date, 50.0), (date - timedelta(hours=1), 120.0)):
+            reponse = client.post(url, {'compteur_reference': compteur.reference, 'valeur': valeur, 'date_releve': instant}, format='json')
+            self.assertEqual(reponse.status_code, 400)
+            self.assertIn('date_releve', reponse.data)
+        self.assertFalse(Alerte.objects.exists())
+
+        # Saisie concurrente : la contrainte unique tranche, toujours 400
+        with mock.patch('django.db.models.query.QuerySet.exists', return_value=False):
+            reponse = client.post(url, {'compteur_reference': compteur.reference, 'valeur': 110.0, 'date_releve': date}, format='json')
+        self.assertEqual(reponse.status_code, 400)
+        self.assertEqual(Releve.objects.filter(compteur=compteur).count(), 2)
+
+
+class SerieTemporelleTests(TestCase):
+
+    def test_lttb(self):
+        instants = array('d', range(1000))
+        valeurs = array('d', (float(i % 10) for i in range(1000)))
+        valeurs[537] = 500.0
+        indices = lttb(instants, valeurs, 50)
+        self.assertEqual(len(indices), 50)
+        self.assertEqual((indices[0], indices[-1]), (0, 999))
+        self.assertEqual(indices, sorted(indices))
+        # Le pic isolé est conservé
+        self.assertIn(537, indices)
+        self.assertEqual(lttb(instants[:10], valeurs[:10], 50), list(range(10)))
+
+    def test_serie_compteur_et_zone(self):
+        compteur, = CompteurFabrique.compteurs(1)
+        _, client = creer_syndic()
+        fin = timezone.now().replace(microsecond=0)
+        for i in range(200):
+            Releve.objects.create(compteur=compteur, valeur=float(i), date_releve=fin - timedelta(hours=i), methode_releve='Automatique')
+
+        reponse = client.get('/api/consumption/releves/serie/', {'compteur': compteur.reference, 'points': 20})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual((reponse.data['methode'], reponse.data['nombre_source'], len(reponse.data['points'])), ('lttb', 200, 20))
+        self.assertEqual(reponse.data['points'][0]['valeur'], 199.0)
+
+        reponse = client.get('/api/consumption/releves/serie/', {'zone_id': compteur.partie_commune_id, 'points': 10})
+        self.assertEqual(reponse.data['methode'], 'seaux')
+        self.assertLessEqual(len(reponse.data['points']), 10)
+        self.assertEqual(sum(point['nombre'] for point in reponse.data['points']), 200)
+        self.assertEqual(client.get('/api/consumption/releves/serie/').status_code, 400)
+
+
+@override_settings(ALERTES_ASYNCHRONES=False)
+class SaisieLotTests(TestCase):
+    url = '/api/consumption/releves/saisie/lot/'
+
+    def setUp(self):
+        self.syndic, self.client_api = creer_syndic()
+        self.compteur, = CompteurFabrique.compteurs(1)
+
+    def test_statuts_par_element(self):
+        date = timezone.now() - timedelta(hours=3)
+        releve = lambda **champs: {'compteur_reference': self.compteur.reference, 'valeur': 10.0, 'date_releve': date.isoformat(), **champs}
+        reponse = self.client_api.post(self.url, {'releves': [
+            releve(),
+            releve(),  # répété dans le lot
+            releve(compteur_reference='INCONNU'),
+            releve(valeur='abc'),
+            releve(valeur=12.0, date_releve=(date + timedelta(hours=1)).isoformat()),
+        ]}, format='json')
+        self.assertEqual(reponse.status_code, 201)
+        self.assertEqual(
+            [resultat['statut'] for resultat in reponse.data['resultats']],
+            [STATUT_CREE, STATUT_DOUBLON, 'COMPTEUR_INCONNU', 'INVALIDE', STATUT_CREE],
+        )
+        self.assertEqual((reponse.data['crees'], reponse.data['doublons'], reponse.data['invalides']), (2, 1, 1))
+        self.assertEqual(Releve.objects.filter(compteur=self.compteur).count(), 2)
+
+        # Renvoi du même lot : tout est doublon, rien n'est créé
+        reponse = self.client_api.post(self.url, [releve()], format='json')
+        self.assertEqual((reponse.status_code, reponse.data['doublons']), (200, 1))
+
+    def test_alerte_sur_le_lot(self):
+        SeuilAlerte.objects.create(compteur=self.compteur, valeur_seuil=100)
+        date = timezone.now() - timedelta(hours=3)
+        reponse = self.client_api.post(self.url, [
+            {'compteur_reference': self.compteur.reference, 'valeur': valeur, 'date_releve': (date + timedelta(minutes=i)).isoformat()}
+            for i, valeur in enumerate((50.0, 150.0))
+        ], format='json')
+        self.assertEqual(reponse.data['alertes_generees'], 1)
+
+    def test_acces_et_validation(self):
+        self.assertEqual(self.client_api.post(self.url, {'releves': []}, format='json').status_code, 400)
+        resident = Resident.objects.create_user('resident@copro.fr', None, nom='N', prenom='P')
+        client = APIClient()
+        client.force_authenticate(resident)
+        self.assertEqual(client.post(self.url, {'releves': [{}]}, format='json').status_code, 403)
+
+
+class ImportHistoriqueTests(TestCase):
+
+    def setUp(self):
+        self.compteur, = CompteurFabrique.compteurs(1)
+        self.dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dossier)
+        origine = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        self.lignes = [
+            {'compteur_reference': self.compteur.reference, 'valeur': 100.0 + i, 'date_releve': (origine + timedelta(hours=i)).isoformat()}
+            for i in range(10)
+        ]
+
+    def ecrire(self, nom, contenu):
+        chemin = os.path.join(self.dossier, nom)
+        with open(chemin, 'w', encoding='utf-8') as f:
+            f.write(contenu)
+        return chemin
+
+    def importer(self, *args):
+        sortie = io.StringIO()
+        call_command('importer_releves', *args, stdout=sortie)
+        return sortie.getvalue()
+
+    def test_csv_et_rejets(self):
+        contenu = 'compteur_reference;valeur;date_releve\n' + ''.join(
+            f"{ligne['compteur_reference']};{ligne['valeur']};{ligne['date_releve']}\n" for ligne in self.lignes[:3]
+        ) + 'INCONNU;1;2025-01-01T00:00:00+00:00\n'
+        chemin = self.ecrire('releves.csv', contenu)
+        rejets = os.path.join(self.dossier, 'rejets.ndjson')
+        sortie = self.importer(chemin, '--delimiteur', ';', '--rejets', rejets)
+        self.assertIn('créés : 3, doublons : 0, rejets : 1', sortie)
+        self.assertEqual(Releve.objects.filter(methode_releve='Import').count(), 3)
+        with open(rejets, encoding='utf-8') as f:
+            rejet, = [json.loads(ligne) for ligne in f]
+        self.assertEqual((rejet['ligne'], rejet['statut']), (4, 'COMPTEUR_INCONNU'))
+
+        # Relance complète : tout est doublon
+        self.assertIn('créés : 0, doublons : 3, rejets : 1', self.importer(chemin, '--delimiteur', ';'))
+
+    def test_reprise_apres_interruption(self):
+        chemin = self.ecrire('releves.ndjson', ''.join(json.dumps(ligne) + '\n' for ligne in self.lignes))
+        traiter_lot = ImportCommande.traiter_lot
+        appels = []
+
+        def interrompre(commande, lot, *args):
+            appels.append(len(lot))
+            if len(appels) == 3:
+                raise KeyboardInterrupt
+            return traiter_lot(commande, lot, *args)
+
+        with mock.patch.object(ImportCommande, 'traiter_lot', interrompre), self.assertRaises(KeyboardInterrupt):
+            self.importer(chemin, '--taille-lot', '3')
+        self.assertEqual(Releve.objects.count(), 6)
+        with open(f'{chemin}.reprise.json', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['ligne'], 6)
+
+        # La reprise ne relit que les lignes après le dernier lot validé
+        sortie = self.importer(chemin, '--taille-lot', '3')
+        self.assertIn('4 lignes', sortie)
+        self.assertIn('créés : 10, doublons : 0, rejets : 0', sortie)
+        self.assertEqual(Releve.objects.count(), 10)
+        self.assertFalse(os.path.exists(f'{chemin}.reprise.json'))
+
+
+@override_settings(ALERTES_ASYNCHRONES=False)
+class AgregatsTests(TestCase):
+
+    def etat(self):
+        return sorted(
+            (modele.__name__, granularite, cle, debut.isoformat(), nombre, round(somme, 6), minimum, maximum)
+            for modele, champ in ((AgregatCompteur, 'compteur_id'), (AgregatPartieCommune, 'partie_commune_id'))
+            for granularite, cle, debut, nombre, somme, minimum, maximum in modele.objects.values_list(
+                'granularite', champ, 'debut_periode', 'nombre', 'somme', 'minimum', 'maximum')
+        )
+
+    def test_incremental_egal_recalcul(self):
+        zone = PartieCommune.objects.create(nom='Chaufferie', surface=80)
+        compteurs = CompteurFabrique.compteurs(2, partie_commune=zone) + CompteurFabrique.compteurs(1)
+        origine = datetime(2025, 1, 31, 23, 0, tzinfo=dt_timezone.utc)
+        for lot in range(3):
+            ingerer_releves([
+                {'compteur_reference': compteur.reference, 'valeur': 10.0 * lot + i, 'date_releve': origine + timedelta(minutes=40 * lot + i)}
+                for i, compteur in enumerate(compteurs)
+            ], verifier_alertes=False)
+        # Le dernier lot passe en février ; puis correction (recalcul ciblé) et suppression d'un relevé
+        releve = Releve.objects.order_by('date_releve').first()
+        releve.valeur = 500.0
+        releve.save()
+        Releve.objects.order_by('date_releve').last().delete()
+
+        incremental = self.etat()
+        self.assertEqual(AgregatCompteur.objects.filter(granularite='MOIS').count(), 5)
+        recalculer()
+        self.assertEqual(self.etat(), incremental)
+
+    def test_lot_en_requetes_constantes(self):
+        def requetes(n, decalage):
+            releves = Releve.objects.bulk_create(
+                Releve(compteur=compteur, valeur=1.0, date_releve=datetime(2025, 2, 1, tzinfo=dt_timezone.utc) + timedelta(hours=decalage), methode_releve='Import')
+                for compteur in CompteurFabrique.compteurs(n)
+            )
+            with CaptureQueriesContext(connection) as capture:
+                ajouter_releves(releves)
+            return len(capture)
+        requetes(1, 0)
+        self.assertEqual(requetes(2, 1), requetes(20, 2))
+
+
+class CalculConsommationsTests(TestCase):
+
+    def setUp(self):
+        self.zone = PartieCommune.objects.create(nom='Parking', surface=300)
+        a, b = CompteurFabrique.compteurs(2, partie_commune=self.zone)
+        jour = lambda mois, j: datetime(2025, mois, j, 12, tzinfo=dt_timezone.utc)
+        for compteur, date, valeur, est_corrige in (
+            (a, jour(1, 1), 100.0, False), (a, jour(1, 15), 150.0, False),
+            (a, jour(2, 1), 170.0, False), (a, jour(2, 10), 20.0, False),   # remise à zéro : +20
+            (a, jour(2, 20), 25.0, False),
+            (b, jour(1, 10), 500.0, False), (b, jour(2, 5), 520.0, False),
+            (b, jour(2, 6), 510.0, True),                                   # correction à la baisse : 0
+            (b, jour(2, 7), 530.0, False),
+        ):
+            Releve.objects.create(compteur=compteur, valeur=valeur, date_releve=date, methode_releve='Manuelle', est_corrige=est_corrige)
+
+    def consommations(self):
+        return {
+            periode: (valeur, cout)
+            for periode, valeur, cout in Consommation.objects.filter(partie_commune=self.zone).values_list('periode', 'valeur_consommee', 'cout')
+        }
+
+    def test_regles_des_intervalles(self):
+        self.assertEqual(calculer_consommations(tarif=2.0), 2)
+        self.assertEqual(self.consommations(), {'2025-01': (50.0, 100.0), '2025-02': (85.0, 170.0)})
+        fevrier = Consommation.objects.get(periode='2025-02')
+        self.assertEqual((str(fevrier.date_debut), str(fevrier.date_fin)), ('2025-02-01', '2025-02-28'))
+
+    def test_idempotent_et_fenetre(self):
+        calculer_consommations(tarif=2.0)
+        calculer_consommations(tarif=2.0)
+        self.assertEqual(Consommation.objects.count(), 2)
+
+        # Fenêtre de février seule : le premier intervalle part du dernier relevé de janvier
+        Releve.objects.filter(valeur=150.0).update(valeur=140.0)
+        self.assertEqual(calculer_consommations(datetime(2025, 2, 3, tzinfo=dt_timezone.utc), tarif=2.0), 1)
+        self.assertEqual(self.consommations(), {'2025-01': (50.0, 100.0), '2025-02': (95.0, 190.0)})
+
+        self.assertEqual(calculer_consommations(granularite='JOUR', tarif=2.0), 9)
+        self.assertEqual(Consommation.objects.filter(periode='2025-02-10').get().valeur_consommee, 20.0)
+        with self.assertRaises(ValueError):
+            calculer_consommations(granularite='HEURE')
+
+    def test_compteur_muet(self):
+        # Compteur sans relevé depuis 2020 : seul son dernier relevé est relu, pas tout son historique
+        muet, = CompteurFabrique.compteurs(1, partie_commune=self.zone)
+        for mois in range(1, 7):
+            Releve.objects.create(compteur=muet, valeur=10.0 * mois, date_releve=datetime(2020, mois, 1, tzinfo=dt_timezone.utc), methode_releve='Manuelle')
+        Releve.objects.create(compteur=muet, valeur=100.0, date_releve=datetime(2025, 2, 2, tzinfo=dt_timezone.utc), methode_releve='Manuelle')
+        fevrier = datetime(2025, 2, 1, tzinfo=dt_timezone.utc)
+        lus = avec_releve_precedent(Releve.objects.all(), fevrier)
+        self.assertEqual(
+            sorted(lus.values_list('valeur', flat=True)),
+            sorted([150.0, 500.0, 60.0] + list(Releve.objects.filter(date_releve__gte=fevrier).values_list('valeur', flat=True))),
+        )
+
+        calculer_consommations(fevrier, tarif=2.0)
+        self.assertEqual(self.consommations()['2025-02'], (85.0 + 40.0, 250.0))
+
+
+class PaginationCurseurTests(TestCase):
+
+    def setUp(self):
+        self.compteurs = CompteurFabrique.compteurs(2)
+        origine = datetime(2025, 1, 10, tzinfo=dt_timezone.utc)
+        Releve.objects.bulk_create(
+            # Deux compteurs relevés au même instant : l'id départage les relevés
+            Releve(compteur=self.compteurs[i % 2], valeur=float(i), date_releve=origine + timedelta(days=i // 2 * 3), methode_releve='Manuelle')
+            for i in range(40)
+        )
+        archiver(datetime(2025, 2, 15, tzinfo=dt_timezone.utc))
+        _, self.client_api = creer_syndic()
+
+    def parcourir(self, url):
+        pages = []
+        while url:
+            reponse = self.client_api.get(url)
+            self.assertEqual(reponse.status_code, 200)
+            pages.append([releve['valeur'] for releve in reponse.data['results']])
+            url = reponse.data['next']
+            if len(pages) == 1:
+                # Un relevé inséré en cours de parcours ne décale pas les pages suivantes
+                Releve.objects.create(compteur=self.compteurs[0], valeur=99.0, date_releve=timezone.now(), methode_releve='Manuelle')
+        return pages, reponse.data['previous']
+
+    def test_parcours_chaud_et_archive(self):
+        self.assertTrue(ArchiveReleve.objects.exists())
+        pages, precedent = self.parcourir('/api/consumption/releves/?page_size=7')
+        valeurs = [valeur for page in pages for valeur in page]
+        self.assertEqual(valeurs, [float(i) for i in reversed(range(40))])
+        self.assertEqual([len(page) for page in pages], [7] * 5 + [5])
+
+        # Lien précédent depuis la dernière page : l'avant-dernière page, dans le même ordre
+        reponse = self.client_api.get(precedent)
+        self.assertEqual([releve['valeur'] for releve in reponse.data['results']], pages[-2])
+
+    def test_curseur_invalide(self):
+        reponse = self.client_api.get('/api/consumption/releves/?cursor=invalide')
+        self.assertEqual(reponse.status_code, 404)
+
+
+class ExportRelevesTests(TestCase):
+
+    def setUp(self):
+        self.compteur, self.autre = CompteurFabrique.compteurs(2)
+        origine = datetime(2025, 1, 10, tzinfo=dt_timezone.utc)
+        for i in range(30):
+            Releve.objects.create(compteur=self.compteur, valeur=float(i), date_releve=origine + timedelta(days=i),
+                                  methode_releve='Manuelle', commentaire='Index, "contrôlé"' if i == 3 else None)
+        Releve.objects.create(compteur=self.autre, valeur=7.0, date_releve=origine, methode_releve='Manuelle')
+        archiver(datetime(2025, 2, 1, tzinfo=dt_timezone.utc))
+        _, self.client_api = creer_syndic()
+
+    def exporter(self, format_export, parametres=''):
+        reponse = self.client_api.get(f'/api/consumption/releves/export/{format_export}/?compteur={self.compteur.reference}{parametres}')
+        self.assertEqual(reponse.status_code, 200)
+        self.assertTrue(reponse.streaming)
+        return reponse, b''.join(reponse.streaming_content).decode('utf-8')
+
+    def test_csv(self):
+        reponse, contenu = self.exporter('csv')
+        self.assertTrue(reponse['Content-Type'].startswith('text/csv'))
+        self.assertIn('attachment; filename="releves_', reponse['Content-Disposition'])
+        lignes = list(csv.DictReader(io.StringIO(contenu)))
+        # Archive et table chaude fusionnées, par date croissante, sans l'autre compteur
+        self.assertEqual([float(ligne['valeur']) for ligne in lignes], [float(i) for i in range(30)])
+        self.assertEqual({ligne['compteur_reference'] for ligne in lignes}, {self.compteur.reference})
+        self.assertEqual(lignes[3]['commentaire'], 'Index, "contrôlé"')
+
+    def test_ndjson_et_bornes(self):
+        _, contenu = self.exporter('ndjson', '&date_debut=2025-01-20&date_fin=2025-01-25')
+        lignes = [json.loads(ligne) for ligne in contenu.splitlines()]
+        self.assertEqual([ligne['valeur'] for ligne in lignes], [float(i) for i in range(10, 16)])
+        self.assertEqual(lignes[0]['date_releve'], '2025-01-20T00:00:00+00:00')
+
+    def test_erreurs(self):
+        self.assertEqual(self.client_api.get('/api/consumption/releves/export/xml/').status_code, 404)
+        self.assertEqual(self.client_api.get('/api/consumption/releves/export/csv/?date_debut=hier').status_code, 400)
+        self.assertEqual(APIClient().get('/api/consumption/releves/export/csv/').status_code, 403)
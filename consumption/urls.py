@@ -1,9 +1,12 @@
 from django.urls import path
-from .views import SaisieReleveAPIView, PartieCommuneViewSet , CompteurViewSet , ReleveViewSet
+from .views import SaisieReleveAPIView, SaisieReleveLotAPIView, ExportRelevesAPIView, SerieTemporelleAPIView, PartieCommuneViewSet , CompteurViewSet , ReleveViewSet
 
 urlpatterns = [
     path('releves/saisie/', SaisieReleveAPIView.as_view(), name='saisie-releve'),
+    path('releves/saisie/lot/', SaisieReleveLotAPIView.as_view(), name='saisie-releve-lot'),
     path('releves/', ReleveViewSet.as_view({'get': 'list'}), name='releve-list'),
+    path('releves/export/<str:format_export>/', ExportRelevesAPIView.as_view(), name='releve-export'),
+    path('releves/serie/', SerieTemporelleAPIView.as_view(), name='releve-serie'),
     path('releves/<int:pk>/', ReleveViewSet.as_view({
         'get': 'retrieve',
         'put': 'update',
@@ -0,0 +1,215 @@
+# src/consumption/utils.py
+"""
+Calculs de consommation (calculerConsommation() du diagramme de classes).
+
+Les relevés sont des index cumulés : la consommation d'un intervalle est
+la différence entre deux relevés consécutifs d'un même compteur, obtenue
+côté base avec LAG(valeur) OVER (PARTITION BY compteur ORDER BY date_releve),
+puis sommée par partie commune et par période. Aucune boucle Python sur les relevés.
+"""
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Window, DateField
+from django.db.models.functions import Lag, TruncDay, TruncMonth
+from django.dispatch import Signal
+
+from .agregats import debut_periode, fin_periode
+from .archive import horizon_archive
+from .models import Compteur, Releve, Consommation
+
+# Émis après chaque matérialisation (consommations=[Consommation], granularite) : reports y reprend les coûts
+consommations_calculees = Signal()
+
+TRONCATURES_CONSOMMATION = {
+    'JOUR': TruncDay,
+    'MOIS': TruncMonth,
+}
+
+
+def _libelle_periode(jour, granularite):
+    return jour.strftime('%Y-%m') if granularite == 'MOIS' else jour.isoformat()
+
+
+def _en_date(valeur):
+    # Les curseurs bruts renvoient un texte (SQLite) ou une date/datetime (PostgreSQL)
+    if isinstance(valeur, datetime):
+        return valeur.date()
+    if isinstance(valeur, date):
+        return valeur
+    return date.fromisoformat(str(valeur)[:10])
+
+
+def avec_releve_precedent(releves, borne):
+    """
+    `releves` à partir de `borne`, plus le dernier relevé antérieur de chaque compteur :
+    LAG voit ainsi le prédécesseur du premier relevé de la fenêtre. Un compteur muet depuis
+    des années n'apporte que ce relevé (une recherche indexée par compteur), sans ramener
+    la lecture des autres compteurs à sa date.
+    """
+    precedent = Subquery(
+        releves.filter(compteur_id=OuterRef('id'), date_releve__lt=borne)
+        .order_by('-date_releve', '-id').values('id')[:1]
+    )
+    return releves.filter(
+        Q(date_releve__gte=borne)
+        | Q(id__in=Compteur.objects.annotate(precedent=precedent).filter(precedent__isnull=False).values('precedent'))
+    )
+
+
+def calculer_consommations(debut=None, fin=None, granularite='MOIS', partie_ids=None, tarif=None):
+    """
+    (Re)matérialise Consommation pour toutes les parties communes (ou `partie_ids`)
+    sur les périodes couvrant [debut, fin]. Idempotent : les périodes concernées sont remplacées.
+
+    Règles d'un intervalle (précédent -> courant) :
+    - index croissant : consommation = courant - précédent ;
+    - index qui recule sur un relevé normal : remise à zéro du compteur, consommation = courant ;
+    - index qui recule sur un relevé corrigé (est_corrige) : la correction annule l'excédent, consommation = 0.
+
+    Retourne le nombre de lignes Consommation écrites.
+    """
+    if granularite not in TRONCATURES_CONSOMMATION:
+        raise ValueError(f"Granularité non supportée : {granularite}")
+    tarif = getattr(settings, 'TARIF_ELECTRICITE', 1.0) if tarif is None else tarif
+
+    releves = Releve.objects.all()
+    if partie_ids is not None:
+        releves = releves.filter(compteur__partie_commune_id__in=partie_ids)
+
+    # 1. Bornes alignées sur les périodes entières pour ne jamais écrire de période partielle.
+    # Les mois déjà archivés sont figés (leurs relevés ne sont plus dans la table chaude).
+    borne_debut = debut_periode(debut, granularite) if debut is not None else None
+    horizon = horizon_archive()
+    if horizon is not None and (borne_debut is None or borne_debut < horizon):
+        borne_debut = horizon
+    borne_fin = fin_periode(debut_periode(fin, granularite), granularite) if fin is not None else None
+    fenetre = releves
+    if borne_fin is not None:
+        fenetre = fenetre.filter(date_releve__lt=borne_fin)
+    if borne_debut is not None:
+        fenetre = avec_releve_precedent(fenetre, borne_debut)
+
+    # 2. Deltas par fenêtre glissante, calculés par la base
+    deltas = fenetre.annotate(
+        partie=F('compteur__partie_commune_id'),
+        periode=TRONCATURES_CONSOMMATION[granularite]('date_releve', output_field=DateField()),
+        precedente=Window(Lag('valeur'), partition_by=[F('compteur_id')], order_by=F('date_releve').asc()),
+    ).values('partie', 'periode', 'date_releve', 'valeur', 'est_corrige', 'precedente').order_by()
+    sql_deltas, params = deltas.query.sql_with_params()
+
+    # 3. Somme par (partie commune, période) sur le résultat fenêtré
+    requete = f"""
+        SELECT d.partie, d.periode, SUM(
+            CASE
+                WHEN d.precedente IS NULL THEN 0
+                WHEN d.valeur >= d.precedente THEN d.valeur - d.precedente
+                WHEN d.est_corrige THEN 0
+                ELSE d.valeur
+            END
+        )
+        FROM ({sql_deltas}) d
+        {"WHERE d.date_releve >= %s" if borne_debut is not None else ""}
+        GROUP BY d.partie, d.periode
+    """
+    if borne_debut is not None:
+        params = (*params, connection.ops.adapt_datetimefield_value(borne_debut))
+    with connection.cursor() as cursor:
+        cursor.execute(requete, params)
+        lignes = cursor.fetchall()
+
+    # 4. Remplacement des périodes couvertes
+    consommations = []
+    for partie_id, periode, valeur in lignes:
+        jour = _en_date(periode)
+        dernier_jour = fin_periode(datetime(jour.year, jour.month, jour.day), granularite).date() - timedelta(days=1)
+        consommations.append(Consommation(
+            partie_commune_id=partie_id,
+            periode=_libelle_periode(jour, granularite),
+            valeur_consommee=valeur or 0.0,
+            cout=round((valeur or 0.0) * tarif, 2),
+            date_debut=jour,
+            date_fin=dernier_jour,
+        ))
+
+    with transaction.atomic():
+        anciennes = Consommation.objects.filter(periode__regex=r'^\d{4}-\d{2}$' if granularite == 'MOIS' else r'^\d{4}-\d{2}-\d{2}$')
+        if partie_ids is not None:
+            anciennes = anciennes.filter(partie_commune_id__in=partie_ids)
+        if borne_debut is not None:
+            anciennes = anciennes.filter(date_debut__gte=borne_debut.date())
+        if borne_fin is not None:
+            anciennes = anciennes.filter(date_debut__lt=borne_fin.date())
+        anciennes.delete()
+        Consommation.objects.bulk_create(consommations, batch_size=1000)
+        consommations_calculees.send(sender=Consommation, consommations=consommations, granularite=granularite)
+    return len(consommations)
+
+
+# --- Séries temporelles réduites pour les graphiques ---
+
+DUREES_GRANULARITE = {'HEURE': 3600, 'JOUR': 86400, 'MOIS': 30 * 86400}
+
+
+def lttb(instants, valeurs, seuil):
+    """
+    Largest-Triangle-Three-Buckets : choisit `seuil` points qui préservent la forme
+    de la courbe (pics et creux compris). `instants` et `valeurs` sont des séquences
+    de même longueur (array('d')), triées par instant. Retourne les indices retenus.
+    Boucle Python en O(n), sans calcul vectorisé : chaque point sert à une moyenne de seau puis à un calcul d'aire.
+    """
+    n = len(valeurs)
+    if seuil >= n or seuil < 3:
+        return list(range(n))
+
+    indices = [0]
+    pas = (n - 2) / (seuil - 2)
+    a = 0
+    for i in range(seuil - 2):
+        # Moyenne du seau suivant
+        debut_suivant = int((i + 1) * pas) + 1
+        fin_suivant = min(int((i + 2) * pas) + 1, n)
+        taille = fin_suivant - debut_suivant
+        moy_x = sum(instants[debut_suivant:fin_suivant]) / taille
+        moy_y = sum(valeurs[debut_suivant:fin_suivant]) / taille
+
+        # Point du seau courant qui forme le plus grand triangle avec a et la moyenne suivante (un calcul d'aire par point)
+        ax, ay = instants[a], valeurs[a]
+        dx, dy = ax - moy_x, moy_y - ay
+        a = max(
+            range(int(i * pas) + 1, int((i + 1) * pas) + 1),
+            key=lambda j: abs(dx * (valeurs[j] - ay) - (ax - instants[j]) * dy),
+        )
+        indices.append(a)
+    indices.append(n - 1)
+    return indices
+
+
+def fusionner_en_seaux(lignes, debut, fin, nombre):
+    """
+    Regroupe des agrégats (debut_periode, nombre, somme, minimum, maximum) en `nombre`
+    seaux de même largeur sur [debut, fin]. La fusion count/sum/min/max est exacte.
+    """
+    largeur = max((fin - debut).total_seconds() / nombre, 1)
+    seaux = {}
+    for periode, compte, somme, minimum, maximum in lignes:
+        index = min(int((periode - debut).total_seconds() // largeur), nombre - 1) if periode > debut else 0
+        seau = seaux.get(index)
+        if seau is None:
+            seaux[index] = [periode, compte, somme, minimum, maximum]
+        else:
+            seau[1] += compte
+            seau[2] += somme
+            seau[3] = min(seau[3], minimum)
+            seau[4] = max(seau[4], maximum)
+    return [seaux[index] for index in sorted(seaux)]
+
+
+def granularite_pour(debut, fin, nombre):
+    """ Granularité d'agrégat la plus grossière qui fournit encore au moins `nombre` périodes. """
+    duree = (fin - debut).total_seconds()
+    for granularite in ('MOIS', 'JOUR'):
+        if duree / DUREES_GRANULARITE[granularite] >= nombre:
+            return granularite
+    return 'HEURE'
@@ -1,4 +1,15 @@
+import csv
+import heapq
+import json
+from array import array
+from datetime import datetime, time, timedelta
 
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -7,11 +18,21 @@ from claims.views import IsSyndicPermission
 from rest_framework import viewsets
 
 from .serializers import ReleveSaisieSerializer , PartieCommuneSerializer , CompteurSerializer
-from .models import Releve, Compteur , PartieCommune
+from .models import Releve, Compteur , PartieCommune, AgregatCompteur, AgregatPartieCommune
 from users.models import Syndic 
 from alerts.models import Alerte , SeuilAlerte
+from alerts.services import evaluer_regles, evaluer_seuils, verifier_coherence
+from alerts.file_attente import mettre_en_file
+from .agregats import debut_periode
+from .archive import blocs, lire_archives
+from .pagination import ReleveCurseurPagination
+from .services import dates_archivees, ingerer_releves, STATUT_CREE, STATUT_DOUBLON, STATUT_COMPTEUR_INCONNU, STATUT_INVALIDE
+from .utils import lttb, fusionner_en_seaux, granularite_pour
 
 # src/consumption/views.py
+DOUBLON_MESSAGE = "Un relevé existe déjà à cette date pour ce compteur."
+
+
 class SaisieReleveAPIView(APIView):
     permission_classes = [IsAuthenticated] 
 
@@ -23,60 +44,346 @@ class SaisieReleveAPIView(APIView):
         serializer = ReleveSaisieSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Dernier relevé connu du compteur (cache dénormalisé, lu avant l'enregistrement)
+        etat = Compteur.objects.filter(reference=request.data.get('compteur_reference')).values_list(
+            'id', 'derniere_valeur', 'date_derniere_valeur'
+        ).first()
+        derniers = {etat[0]: etat[1:]} if etat else {}
+        # Doublon (dernier relevé ou plus ancien) : refusé avant tout contrôle, rien n'est enregistré
+        date_releve = serializer.validated_data['date_releve']
+        if etat and Releve.objects.filter(compteur_id=etat[0], date_releve=date_releve).exists():
+            return Response({"date_releve": DOUBLON_MESSAGE}, status=status.HTTP_400_BAD_REQUEST)
+        if etat and dates_archivees({(etat[0], date_releve)}):
+            return Response({"date_releve": "Un relevé archivé existe déjà à cette date pour ce compteur."}, status=status.HTTP_400_BAD_REQUEST)
         
-        # 2. Enregistrement
-        releve_instance = serializer.save() 
-        compteur = releve_instance.compteur
-        valeur_saisie = releve_instance.valeur
+        # 2. Enregistrement (une saisie concurrente du même relevé bute sur la contrainte unique)
+        try:
+            with transaction.atomic():
+                releve_instance = serializer.save()
+        except IntegrityError:
+            return Response({"date_releve": DOUBLON_MESSAGE}, status=status.HTTP_400_BAD_REQUEST)
 
         # 3. LOGIQUE DU CERVEAU (RETOUR AU SEUIL ALERTE)
-        alerte_creee = False
-        
-        # On cherche la config spécifique pour ce compteur
-        from alerts.models import SeuilAlerte, Alerte
-        seuil_config = SeuilAlerte.objects.filter(compteur=compteur, type_alerte='SURCONS').first()
-
-        if seuil_config and valeur_saisie > seuil_config.valeur_seuil:
-            Alerte.objects.create(
-                seuil=seuil_config,
-                compteur=compteur,
-                description=f"Dépassement détecté : {valeur_saisie} enregistré. Le seuil autorisé est de {seuil_config.valeur_seuil}.",
-                est_traitee=False
-            )
-            alerte_creee = True
+        if settings.ALERTES_ASYNCHRONES:
+            # Le worker (manage.py traiter_alertes) évaluera le relevé : la saisie rend la main tout de suite
+            mettre_en_file([releve_instance], derniers)
+            return Response({
+                "message": "Relevé enregistré.",
+                "id": releve_instance.id,
+                "evaluation_differee": True
+            }, status=status.HTTP_201_CREATED)
+
+        # On compare le relevé à la config spécifique de ce compteur
+        alerte_creee = evaluer_seuils([releve_instance])[0] is not None
+        # ... aux règles personnalisées (taux de variation, moyenne glissante, par m², durée)
+        alerte_creee = evaluer_regles([releve_instance])[0] is not None or alerte_creee
+        # ... puis au dernier relevé connu (recul d'index, saut impossible)
+        anomalie_detectee = verifier_coherence([releve_instance], derniers)[0] is not None
 
         return Response({
             "message": "Relevé enregistré.",
             "id": releve_instance.id,
-            "alerte_generee": alerte_creee
+            "alerte_generee": alerte_creee,
+            "anomalie_detectee": anomalie_detectee
         }, status=status.HTTP_201_CREATED)
+
+
+class SaisieReleveLotAPIView(APIView):
+    """
+    Saisie en lot pour les passerelles de comptage : plusieurs milliers de relevés par POST.
+    Corps attendu : {"releves": [{"compteur_reference", "valeur", "date_releve", "commentaire"}, ...]}
+    """
+    permission_classes = [IsAuthenticated]
+    TAILLE_MAX_LOT = 10000
+
+    def post(self, request, *args, **kwargs):
+        # 1. Sécurité Syndic
+        if not request.user.is_superuser and not hasattr(request.user, 'syndic'):
+            return Response({"detail": "Accès refusé."}, status=status.HTTP_403_FORBIDDEN)
+
+        lignes = request.data.get('releves') if isinstance(request.data, dict) else request.data
+        if not isinstance(lignes, list) or not lignes:
+            return Response({"releves": "Une liste non vide de relevés est attendue."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(lignes) > self.TAILLE_MAX_LOT:
+            return Response({"releves": f"Au plus {self.TAILLE_MAX_LOT} relevés par lot."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 2. Enregistrement et vérification des seuils pour tout le lot
+        resultats = ingerer_releves(lignes)
+
+        statuts = [resultat['statut'] for resultat in resultats]
+        crees = statuts.count(STATUT_CREE)
+        return Response({
+            "message": "Lot traité.",
+            "crees": crees,
+            "doublons": statuts.count(STATUT_DOUBLON),
+            "compteurs_inconnus": statuts.count(STATUT_COMPTEUR_INCONNU),
+            "invalides": statuts.count(STATUT_INVALIDE),
+            "alertes_generees": sum(1 for resultat in resultats if resultat.get('alerte_generee')),
+            "anomalies_detectees": sum(1 for resultat in resultats if resultat.get('anomalie_detectee')),
+            "evaluations_differees": sum(1 for resultat in resultats if resultat.get('evaluation_differee')),
+            "resultats": resultats,
+        }, status=status.HTTP_201_CREATED if crees else status.HTTP_200_OK)
+
+
 class PartieCommuneViewSet(viewsets.ModelViewSet):
     queryset = PartieCommune.objects.all()
     serializer_class = PartieCommuneSerializer
     permission_classes = [IsAuthenticated]  
 
 class CompteurViewSet(viewsets.ModelViewSet):
-    queryset = Compteur.objects.all()
+    queryset = Compteur.objects.select_related('partie_commune')
     serializer_class = CompteurSerializer
     permission_classes = [IsSyndicPermission]
-class ReleveViewSet(viewsets.ModelViewSet):
+class FiltreRelevesMixin:
     """
-    ViewSet pour lister, modifier et supprimer les relevés existants.
+    Filtres communs aux vues de relevés (liste paginée, export) :
+    ?compteur=<reference> ou ?zone_id=<partie commune>, sur la table chaude et l'archive.
     """
-    queryset = Releve.objects.all().order_by('-date_releve')
-    serializer_class = ReleveSaisieSerializer
-    permission_classes = [IsAuthenticated]
+    queryset = Releve.objects.select_related('compteur').order_by('-date_releve')
 
     def get_queryset(self):
         # Optionnel : filtrer par compteur via query params
-        queryset = self.queryset
+        queryset = self.queryset.all()
         compteur_ref = self.request.query_params.get('compteur')
         if compteur_ref:
-            return self.queryset.filter(compteur__reference=compteur_ref)
+            return queryset.filter(compteur__reference=compteur_ref)
         zone_id = self.request.query_params.get('zone_id')
         
         if zone_id:
             # On utilise le double underscore (__) pour traverser vers le compteur
             # puis vers la partie commune liée à ce compteur
             return queryset.filter(compteur__partie_commune_id=zone_id).order_by('-date_releve')
-        return self.queryset
\ No newline at end of file
+        return queryset
+
+    def get_archives(self):
+        # Mêmes filtres que get_queryset, appliqués aux blocs de l'archive froide
+        compteur_ref = self.request.query_params.get('compteur')
+        if compteur_ref:
+            return blocs().filter(compteur__reference=compteur_ref)
+        zone_id = self.request.query_params.get('zone_id')
+        if zone_id:
+            return blocs(partie_ids=[zone_id])
+        return blocs()
+
+
+class ReleveViewSet(FiltreRelevesMixin, viewsets.ModelViewSet):
+    """
+    ViewSet pour lister, modifier et supprimer les relevés existants.
+    """
+    serializer_class = ReleveSaisieSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = ReleveCurseurPagination
+
+    def list(self, request, *args, **kwargs):
+        # Lecture transparente : les relevés archivés complètent la table chaude, dans le même ordre
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginator.paginate_releves(queryset, self.get_archives(), request, view=self)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        releves = heapq.merge(queryset, lire_archives(self.get_archives()), key=lambda releve: releve.date_releve, reverse=True)
+        serializer = self.get_serializer(list(releves), many=True)
+        return Response(serializer.data)
+
+
+class _Tampon:
+    """ Pseudo-fichier pour csv.writer : renvoie la ligne au lieu de la stocker. """
+    def write(self, valeur):
+        return valeur
+
+
+def _parse_borne_date(valeur, fin_de_journee=False):
+    # Une date seule couvre toute la journée (parse_datetime accepterait aussi 'AAAA-MM-JJ')
+    jour = parse_date(valeur)
+    if jour is not None:
+        date = datetime.combine(jour, time.max if fin_de_journee else time.min)
+    else:
+        date = parse_datetime(valeur)
+        if date is None:
+            return None
+    return timezone.make_aware(date) if timezone.is_naive(date) else date
+
+
+class ExportRelevesAPIView(FiltreRelevesMixin, APIView):
+    """
+    Export complet des relevés en flux (CSV ou NDJSON) pour les audits.
+    Filtres identiques à ReleveViewSet (compteur, zone_id) + date_debut / date_fin.
+    La mémoire reste constante : les lignes sont lues par paquets côté base et envoyées au fil de l'eau.
+    """
+    permission_classes = [IsAuthenticated]
+    TAILLE_PAQUET = 2000
+    COLONNES = ('id', 'compteur_reference', 'valeur', 'date_releve', 'methode_releve', 'est_corrige', 'commentaire')
+
+    def get(self, request, format_export):
+        if format_export not in ('csv', 'ndjson'):
+            return Response({"detail": "Format inconnu (csv ou ndjson)."}, status=status.HTTP_404_NOT_FOUND)
+
+        bornes = {}
+        for param, fin_de_journee in (('date_debut', False), ('date_fin', True)):
+            valeur = request.query_params.get(param)
+            if valeur:
+                bornes[param] = _parse_borne_date(valeur, fin_de_journee)
+                if bornes[param] is None:
+                    return Response({param: "Date invalide (AAAA-MM-JJ ou ISO 8601)."}, status=status.HTTP_400_BAD_REQUEST)
+        debut, fin = bornes.get('date_debut'), bornes.get('date_fin')
+
+        # Mêmes filtres que la liste paginée, plus la plage de dates
+        queryset = self.get_queryset()
+        archives = self.get_archives()
+        if debut:
+            queryset = queryset.filter(date_releve__gte=debut)
+            archives = archives.filter(date_max__gte=debut)
+        if fin:
+            queryset = queryset.filter(date_releve__lte=fin)
+            archives = archives.filter(date_min__lte=fin)
+
+        lignes = heapq.merge(
+            queryset.order_by('date_releve', 'id').values_list(
+                'id', 'compteur__reference', 'valeur', 'date_releve', 'methode_releve', 'est_corrige', 'commentaire'
+            ).iterator(chunk_size=self.TAILLE_PAQUET),
+            (
+                (r.id, r.compteur.reference, r.valeur, r.date_releve, r.methode_releve, r.est_corrige, r.commentaire)
+                for r in lire_archives(archives, debut, fin, decroissant=False)
+            ),
+            key=lambda ligne: (ligne[3], ligne[0]),
+        )
+
+        if format_export == 'csv':
+            contenu, type_mime = self.flux_csv(lignes), 'text/csv; charset=utf-8'
+        else:
+            contenu, type_mime = self.flux_ndjson(lignes), 'application/x-ndjson'
+        reponse = StreamingHttpResponse(contenu, content_type=type_mime)
+        reponse['Content-Disposition'] = f'attachment; filename="releves_{timezone.now():%Y%m%d_%H%M%S}.{format_export}"'
+        return reponse
+
+    def flux_csv(self, lignes):
+        ecrivain = csv.writer(_Tampon())
+        yield ecrivain.writerow(self.COLONNES)
+        paquet = []
+        for ligne in lignes:
+            paquet.append(ecrivain.writerow((*ligne[:3], ligne[3].isoformat(), *ligne[4:])))
+            if len(paquet) >= self.TAILLE_PAQUET:
+                yield ''.join(paquet)
+                paquet = []
+        if paquet:
+            yield ''.join(paquet)
+
+    def flux_ndjson(self, lignes):
+        paquet = []
+        for ligne in lignes:
+            paquet.append(json.dumps(dict(zip(self.COLONNES, (*ligne[:3], ligne[3].isoformat(), *ligne[4:])))) + '\n')
+            if len(paquet) >= self.TAILLE_PAQUET:
+                yield ''.join(paquet)
+                paquet = []
+        if paquet:
+            yield ''.join(paquet)
+
+
+class SerieTemporelleAPIView(APIView):
+    """
+    Série réduite pour les graphiques : quelques centaines de points quelle que soit la plage.
+    Paramètres : compteur=<reference> ou zone_id=<partie commune>, date_debut, date_fin (30 jours par défaut),
+    points (cible, 300 par défaut) et methode :
+    - lttb  : points réels choisis pour garder la forme de la courbe (pics compris) ;
+    - seaux : min / max / moyenne par intervalle, lus dans les agrégats horaires / journaliers / mensuels.
+    """
+    permission_classes = [IsAuthenticated]
+    POINTS_DEFAUT = 300
+    POINTS_MAX = 2000
+    # Au-delà, LTTB travaille sur les moyennes horaires plutôt que sur les relevés bruts
+    LIMITE_BRUTE = 200000
+
+    def get(self, request):
+        compteur_ref = request.query_params.get('compteur')
+        zone_id = request.query_params.get('zone_id')
+        if bool(compteur_ref) == bool(zone_id):
+            return Response({"detail": "Préciser soit compteur, soit zone_id."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            points = int(request.query_params.get('points', self.POINTS_DEFAUT))
+        except ValueError:
+            return Response({"points": "Entier attendu."}, status=status.HTTP_400_BAD_REQUEST)
+        points = max(3, min(points, self.POINTS_MAX))
+
+        methode = request.query_params.get('methode', 'lttb' if compteur_ref else 'seaux')
+        if methode not in ('lttb', 'seaux'):
+            return Response({"methode": "lttb ou seaux."}, status=status.HTTP_400_BAD_REQUEST)
+
+        bornes = {}
+        for param, fin_de_journee in (('date_debut', False), ('date_fin', True)):
+            valeur = request.query_params.get(param)
+            if valeur:
+                bornes[param] = _parse_borne_date(valeur, fin_de_journee)
+                if bornes[param] is None:
+                    return Response({param: "Date invalide (AAAA-MM-JJ ou ISO 8601)."}, status=status.HTTP_400_BAD_REQUEST)
+        fin = bornes.get('date_fin') or timezone.now()
+        debut = bornes.get('date_debut') or fin - timedelta(days=30)
+        if debut >= fin:
+            return Response({"detail": "date_debut doit précéder date_fin."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if compteur_ref:
+            compteur = Compteur.objects.filter(reference=compteur_ref).first()
+            if compteur is None:
+                return Response({"detail": "Compteur introuvable."}, status=status.HTTP_404_NOT_FOUND)
+            agregats = AgregatCompteur.objects.filter(compteur=compteur)
+            reponse = {"compteur": compteur.reference}
+        else:
+            compteur = None
+            agregats = AgregatPartieCommune.objects.filter(partie_commune_id=zone_id)
+            reponse = {"zone_id": zone_id}
+        reponse.update({"methode": methode, "date_debut": debut, "date_fin": fin})
+
+        if methode == 'seaux':
+            granularite = granularite_pour(debut, fin, points)
+            lignes = self.lignes_agregats(agregats, granularite, debut, fin)
+            reponse["granularite"] = granularite
+            reponse["points"] = [
+                {
+                    "date": periode,
+                    "nombre": nombre,
+                    "moyenne": somme / nombre if nombre else None,
+                    "minimum": minimum,
+                    "maximum": maximum,
+                }
+                for periode, nombre, somme, minimum, maximum in fusionner_en_seaux(lignes, debut, fin, points)
+            ]
+            return Response(reponse)
+
+        # LTTB : colonnes (instants, valeurs) en array('d'), relevés bruts pour un compteur,
+        # moyennes horaires pour une zone ou une plage trop dense
+        volume = agregats.filter(
+            granularite='JOUR', debut_periode__gte=debut_periode(debut, 'JOUR'), debut_periode__lte=fin,
+        ).aggregate(total=Sum('nombre'))['total'] or 0
+        if compteur is not None and volume <= self.LIMITE_BRUTE:
+            source = heapq.merge(
+                Releve.objects.filter(compteur=compteur, date_releve__gte=debut, date_releve__lte=fin)
+                .order_by('date_releve').values_list('date_releve', 'valeur').iterator(chunk_size=5000),
+                (
+                    (releve.date_releve, releve.valeur)
+                    for releve in lire_archives(blocs([compteur.id], debut=debut, fin=fin), debut, fin, decroissant=False)
+                ),
+                key=lambda ligne: ligne[0],
+            )
+        else:
+            source = (
+                (periode, somme / nombre)
+                for periode, nombre, somme, _, _ in self.lignes_agregats(agregats, 'HEURE', debut, fin)
+                if nombre
+            )
+        dates, instants, valeurs = [], array('d'), array('d')
+        for date, valeur in source:
+            dates.append(date)
+            instants.append(date.timestamp())
+            valeurs.append(valeur)
+
+        reponse["nombre_source"] = len(valeurs)
+        reponse["points"] = [{"date": dates[i], "valeur": valeurs[i]} for i in lttb(instants, valeurs, points)]
+        return Response(reponse)
+
+    def lignes_agregats(self, agregats, granularite, debut, fin):
+        return (
+            agregats.filter(granularite=granularite, debut_periode__gte=debut_periode(debut, granularite), debut_periode__lte=fin)
+            .order_by('debut_periode')
+            .values_list('debut_periode', 'nombre', 'somme', 'minimum', 'maximum')
+        )
@@ -4,10 +4,11 @@ from .models import Rapport, StatistiqueConsommation
 
 @admin.register(Rapport)
 class RapportAdmin(admin.ModelAdmin):
-    list_display = ('type_rapport', 'format_export', 'date_generation')
-    list_filter = ('format_export',)
+    list_display = ('type_rapport', 'format_export', 'statut', 'progression', 'date_generation', 'date_fin_generation')
+    list_filter = ('format_export', 'statut')
 
 @admin.register(StatistiqueConsommation)
 class StatistiqueConsommationAdmin(admin.ModelAdmin):
-    list_display = ('periode', 'partie_commune', 'valeur_moyenne', 'date_calcul')
+    list_display = ('periode', 'partie_commune', 'nombre', 'valeur_moyenne', 'valeur_maximale', 'cout_total', 'date_calcul')
+    list_select_related = ('partie_commune',)
     list_filter = ('periode', 'partie_commune')
\ No newline at end of file
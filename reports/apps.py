@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ReportsConfig(AppConfig):
     name = 'reports'
+
+    def ready(self):
+        from . import signals  # noqa: F401 (statistiques tenues à jour avec les agrégats, tableau de bord)
@@ -0,0 +1,105 @@
+# src/reports/esquisses.py
+"""
+Esquisse de quantiles fusionnable (histogramme à pas logarithmique, principe de DDSketch).
+
+Chaque valeur v > 0 tombe dans le seau i = ceil(log_gamma(v)), avec gamma = (1 + a) / (1 - a) :
+tout quantile est restitué à une erreur relative a près (PRECISION = 1 %), quel que soit
+l'ordre d'arrivée. Deux esquisses se fusionnent en additionnant leurs seaux, ce qui permet
+de combiner des mois ou des zones sans relire les relevés.
+
+Les valeurs négatives ont leurs propres seaux (sur |v|), les valeurs quasi nulles un compteur à part.
+Au-delà de MAX_SEAUX, les plus petits seaux sont regroupés : seuls les quantiles bas perdent en précision.
+"""
+import math
+
+PRECISION = 0.01
+GAMMA = (1 + PRECISION) / (1 - PRECISION)
+LOG_GAMMA = math.log(GAMMA)
+VALEUR_NULLE = 1e-9
+MAX_SEAUX = 2048
+
+
+def _indice(valeur):
+    return math.ceil(math.log(valeur) / LOG_GAMMA)
+
+
+def _valeur(indice):
+    # Milieu (en erreur relative) du seau ]gamma^(i-1), gamma^i]
+    return 2 * GAMMA ** indice / (GAMMA + 1)
+
+
+class EsquisseQuantiles:
+
+    def __init__(self, positifs=None, negatifs=None, nuls=0):
+        self.positifs = positifs or {}
+        self.negatifs = negatifs or {}
+        self.nuls = nuls
+
+    @property
+    def nombre(self):
+        return self.nuls + sum(self.positifs.values()) + sum(self.negatifs.values())
+
+    def ajouter(self, valeur, nombre=1):
+        if valeur > VALEUR_NULLE:
+            seaux, indice = self.positifs, _indice(valeur)
+        elif valeur < -VALEUR_NULLE:
+            seaux, indice = self.negatifs, _indice(-valeur)
+        else:
+            self.nuls += nombre
+            return
+        seaux[indice] = seaux.get(indice, 0) + nombre
+        if len(seaux) > MAX_SEAUX:
+            self._regrouper(seaux)
+
+    def fusionner(self, autre):
+        for seaux, autres in ((self.positifs, autre.positifs), (self.negatifs, autre.negatifs)):
+            for indice, nombre in autres.items():
+                seaux[indice] = seaux.get(indice, 0) + nombre
+            if len(seaux) > MAX_SEAUX:
+                self._regrouper(seaux)
+        self.nuls += autre.nuls
+        return self
+
+    @staticmethod
+    def _regrouper(seaux):
+        indices = sorted(seaux)
+        cible = indices[-MAX_SEAUX]
+        seaux[cible] += sum(seaux.pop(indice) for indice in indices[:-MAX_SEAUX])
+
+    def quantile(self, q):
+        """ Valeur au rang q (0 <= q <= 1), à PRECISION près ; None si l'esquisse est vide. """
+        total = self.nombre
+        if not total:
+            return None
+        rang = q * (total - 1)
+        cumul = 0
+        # Parcours croissant : négatifs du plus grand |v| au plus petit, nuls, puis positifs
+        for indice in sorted(self.negatifs, reverse=True):
+            cumul += self.negatifs[indice]
+            if cumul > rang:
+                return -_valeur(indice)
+        cumul += self.nuls
+        if cumul > rang:
+            return 0.0
+        for indice in sorted(self.positifs):
+            cumul += self.positifs[indice]
+            if cumul > rang:
+                return _valeur(indice)
+        return _valeur(max(self.positifs)) if self.positifs else 0.0
+
+    # Stockage JSON (clés texte)
+    def en_json(self):
+        return {
+            'positifs': {str(indice): nombre for indice, nombre in self.positifs.items()},
+            'negatifs': {str(indice): nombre for indice, nombre in self.negatifs.items()},
+            'nuls': self.nuls,
+        }
+
+    @classmethod
+    def depuis_json(cls, donnees):
+        donnees = donnees or {}
+        return cls(
+            positifs={int(indice): nombre for indice, nombre in donnees.get('positifs', {}).items()},
+            negatifs={int(indice): nombre for indice, nombre in donnees.get('negatifs', {}).items()},
+            nuls=donnees.get('nuls', 0),
+        )
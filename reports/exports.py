@@ -0,0 +1,128 @@
+# src/reports/exports.py
+"""
+Écriture en flux des rapports tabulaires (XLSX et CSV), sans bibliothèque de classeur.
+
+Le XLSX est une archive zip de quelques parties XML (SpreadsheetML minimal) : seules les
+lignes de la feuille sont volumineuses, et elles sont compressées au fil de l'eau dans
+l'entrée zip à partir de l'itérateur reçu. La mémoire ne dépend pas du nombre de lignes.
+
+Les cellules texte sont « inline » (pas de table de chaînes partagées à construire
+en mémoire) ; les dates sont des numéros de série Excel avec un format date/heure.
+"""
+import csv
+import io
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+TAILLE_PAQUET = 1000
+EPOQUE_EXCEL = datetime(1899, 12, 30)
+
+_TYPES_CONTENU = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+</Types>"""
+
+_RELATIONS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_CLASSEUR = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{nom}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+
+_RELATIONS_CLASSEUR = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+
+# Style 0 : standard ; 1 : date et heure (format 22, « m/d/yy h:mm ») ; 2 : en-tête en gras
+_STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="3">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>
+</cellXfs>
+</styleSheet>"""
+
+
+def _cellule(valeur, zone, style_texte=0):
+    if valeur is None:
+        return '<c/>'
+    if isinstance(valeur, bool):
+        return f'<c t="b"><v>{int(valeur)}</v></c>'
+    if isinstance(valeur, (int, float)):
+        return f'<c><v>{valeur!r}</v></c>'
+    if isinstance(valeur, datetime):
+        if valeur.tzinfo is not None:
+            valeur = valeur.astimezone(zone).replace(tzinfo=None)
+        return f'<c s="1"><v>{(valeur - EPOQUE_EXCEL).total_seconds() / 86400!r}</v></c>'
+    style = f' s="{style_texte}"' if style_texte else ''
+    return f'<c t="inlineStr"{style}><is><t xml:space="preserve">{escape(str(valeur))}</t></is></c>'
+
+
+def ecrire_xlsx(fichier, entetes, lignes, nom_feuille='Rapport', progression=None):
+    """
+    Écrit un classeur d'une feuille dans `fichier` (binaire, ouvert en écriture).
+    `lignes` est un itérable de tuples ; `progression(nombre)` est appelé tous les TAILLE_PAQUET lignes.
+    Retourne le nombre de lignes écrites.
+    """
+    nombre = 0
+    # Fuseau résolu une fois par fichier (timezone.localtime le relit à chaque appel)
+    zone = timezone.get_current_timezone()
+    with zipfile.ZipFile(fichier, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _TYPES_CONTENU)
+        archive.writestr('_rels/.rels', _RELATIONS)
+        archive.writestr('xl/workbook.xml', _CLASSEUR.format(nom=escape(nom_feuille[:31], {'"': '&quot;'})))
+        archive.writestr('xl/_rels/workbook.xml.rels', _RELATIONS_CLASSEUR)
+        archive.writestr('xl/styles.xml', _STYLES)
+
+        # force_zip64 : la taille de la feuille n'est pas connue à l'ouverture de l'entrée
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as feuille:
+            feuille.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            feuille.write(('<row>' + ''.join(_cellule(entete, zone, style_texte=2) for entete in entetes) + '</row>').encode())
+            paquet = []
+            for ligne in lignes:
+                paquet.append('<row>' + ''.join([_cellule(valeur, zone) for valeur in ligne]) + '</row>')
+                nombre += 1
+                if len(paquet) >= TAILLE_PAQUET:
+                    feuille.write(''.join(paquet).encode())
+                    paquet = []
+                    if progression:
+                        progression(nombre)
+            feuille.write(''.join(paquet).encode())
+            feuille.write(b'</sheetData></worksheet>')
+    return nombre
+
+
+def ecrire_csv(fichier, entetes, lignes, progression=None):
+    """ Même contrat que ecrire_xlsx, en CSV UTF-8 (BOM pour l'ouverture directe dans Excel). """
+    texte = io.TextIOWrapper(fichier, encoding='utf-8-sig', newline='')
+    ecrivain = csv.writer(texte, delimiter=';')
+    ecrivain.writerow(entetes)
+    nombre = 0
+    for ligne in lignes:
+        ecrivain.writerow(valeur.isoformat() if isinstance(valeur, datetime) else valeur for valeur in ligne)
+        nombre += 1
+        if progression and nombre % TAILLE_PAQUET == 0:
+            progression(nombre)
+    texte.flush()
+    texte.detach()
+    return nombre
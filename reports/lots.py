@@ -0,0 +1,127 @@
+# src/reports/lots.py
+"""
+Génération par lots des rapports PDF de fin de mois : un rapport par partie commune et par période.
+
+1. lecture        : statistiques, situation globale et clés de cache de toutes les zones en
+                    quelques requêtes (services.statistiques_zones, versions_donnees_pdf) ;
+2. rendu          : dessin des PDF sur un pool de processus (un par cœur par défaut ; sans pool
+                    pour un seul processus). Les processus ne touchent pas à la base : ils reçoivent
+                    tout ce qu'ils impriment ;
+3. enregistrement : chaque rapport est enregistré TERMINE dès que son fichier est écrit. Un rendu
+                    en échec (ou un processus mort) est journalisé et compté ; les autres sont gardés.
+
+Les rapports déjà produits sur les mêmes données (même cle_cache, fichier présent) sont repris
+tels quels : relancer le lot ne redessine que les zones dont les données ont changé. Un rapport
+redessiné (`forcer`, fichier disparu) met à jour les lignes de même cle_cache au lieu d'en ajouter.
+La durée de chaque étape est mesurée pour voir où part le temps de la fin de mois.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.utils import timezone
+
+from consumption.models import PartieCommune
+from .models import Rapport
+from .services import (
+    _chemin_rapport, cle_rapport, dessiner_pdf_complet, situation_globale, statistiques_zones, versions_donnees_pdf,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _rendre(tache):
+    """ Exécuté dans un processus du pool : dessin et écriture d'un PDF. Retourne la durée du rendu. """
+    filepath, config, stats_conso, situation = tache
+    debut = time.perf_counter()
+    with default_storage.open(filepath, 'wb') as f:
+        dessiner_pdf_complet(f, config, stats_conso, situation)
+    return time.perf_counter() - debut
+
+
+def generer_lot(periodes, type_rapport='Rapport mensuel', processus=None, forcer=False):
+    """
+    Produit le PDF de chaque (période, partie commune). `forcer` redessine même les rapports à jour.
+    Retourne un bilan : rapports dessinés / repris / en échec, processus, durées par étape (s) et temps de rendu cumulé.
+    """
+    processus = processus or os.cpu_count() or 1
+    durees = {}
+
+    # 1. Lecture
+    debut = time.perf_counter()
+    partie_ids = list(PartieCommune.objects.order_by('id').values_list('id', flat=True))
+    situation = situation_globale()
+    stats = statistiques_zones(partie_ids)
+    versions = versions_donnees_pdf(partie_ids, situation)
+    demandes = []
+    for periode in periodes:
+        for partie_id in partie_ids:
+            config = {'type_rapport': type_rapport, 'periode': periode, 'format_export': 'PDF', 'partie_commune_id': partie_id}
+            demandes.append((config, cle_rapport(config, versions[partie_id])))
+    a_jour = set()
+    if not forcer:
+        a_jour = {
+            cle for cle, chemin in Rapport.objects.filter(
+                cle_cache__in=[cle for _, cle in demandes], statut=Rapport.STATUT_TERMINE
+            ).values_list('cle_cache', 'fichier_chemin')
+            if chemin and default_storage.exists(chemin)
+        }
+    demandes = [(config, cle) for config, cle in demandes if cle not in a_jour]
+    taches = [
+        (_chemin_rapport('rapport_global', config, cle, 'pdf'), config, stats[config['partie_commune_id']], situation)
+        for config, cle in demandes
+    ]
+    durees['lecture'] = time.perf_counter() - debut
+
+    # 2. Rendu et 3. enregistrement, rapport par rapport
+    debut = time.perf_counter()
+    rendus, echecs = [], 0
+    if taches and processus == 1:
+        for demande, tache in zip(demandes, taches):
+            try:
+                rendus.append(_rendre(tache))
+            except Exception:
+                logger.exception("Rendu du rapport %s impossible", tache[0])
+                echecs += 1
+                continue
+            _enregistrer(type_rapport, demande, tache)
+    elif taches:
+        # Les connexions sont fermées avant de créer les processus (rien à partager avec eux)
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=processus, initializer=django.setup) as pool:
+            en_cours = {pool.submit(_rendre, tache): (demande, tache) for demande, tache in zip(demandes, taches)}
+            for futur in as_completed(en_cours):
+                demande, tache = en_cours[futur]
+                try:
+                    rendus.append(futur.result())
+                except Exception:
+                    logger.exception("Rendu du rapport %s impossible", tache[0])
+                    echecs += 1
+                    continue
+                _enregistrer(type_rapport, demande, tache)
+    durees['rendu'] = time.perf_counter() - debut
+
+    return {
+        'rapports': len(rendus),
+        'repris': len(a_jour),
+        'echecs': echecs,
+        'processus': processus,
+        'durees': durees,
+        'rendu_cumule': sum(rendus),
+    }
+
+
+def _enregistrer(type_rapport, demande, tache):
+    """ Rapport TERMINE pour un fichier écrit : les lignes de même cle_cache sont mises à jour, sinon une est créée. """
+    config, cle = demande
+    filepath, _, stats_conso, _ = tache
+    valeurs = {
+        'fichier_chemin': filepath, 'apercu': stats_conso, 'statut': Rapport.STATUT_TERMINE, 'progression': 100,
+        'erreur': '', 'date_fin_generation': timezone.now(),
+    }
+    if not Rapport.objects.filter(cle_cache=cle, statut__in=[Rapport.STATUT_TERMINE, Rapport.STATUT_ECHEC]).update(**valeurs):
+        Rapport.objects.create(type_rapport=type_rapport, format_export='PDF', configuration=config, cle_cache=cle, **valeurs)
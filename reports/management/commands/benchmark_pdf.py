@@ -0,0 +1,76 @@
+# src/reports/management/commands/benchmark_pdf.py
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from reports.moteur_pdf import DocumentPDF
+from reports.services import COLONNES_RELEVES_PDF
+
+
+class Command(BaseCommand):
+    """
+    Mesure du moteur PDF (reports/moteur_pdf.py) sur des relevés synthétiques, sans base de données :
+    pages par seconde sur plusieurs rapports successifs (le premier remplit les caches du module),
+    et avec --memoire, la mémoire suivie à chaque quart du rendu puis au pic (écriture du fichier comprise).
+    """
+    help = "Mesure le nombre de pages PDF détaillées rendues par seconde et la mémoire du rendu."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lignes', type=int, default=40000, help="Relevés par rapport (environ 62 par page).")
+        parser.add_argument('--rapports', type=int, default=3, help="Rapports rendus l'un après l'autre.")
+        parser.add_argument('--memoire', action='store_true', help="Suivi mémoire (tracemalloc, rendu plus lent).")
+
+    def handle(self, *args, **options):
+        if min(options['lignes'], options['rapports']) < 1:
+            raise CommandError("Les paramètres doivent être positifs.")
+        aleatoire = random.Random(42)
+        origine = timezone.now()
+
+        def releves():
+            for i in range(options['lignes']):
+                yield (
+                    origine + timedelta(minutes=15 * i), aleatoire.uniform(0, 500),
+                    'AUTOMATIQUE' if i % 7 else 'MANUEL', i % 97 == 0,
+                )
+
+        pages_total, duree_totale = 0, 0.0
+        for numero in range(1, options['rapports'] + 1):
+            paliers = []
+            if options['memoire']:
+                tracemalloc.start()
+
+            def suivi(ecrites):
+                # Mémoire suivie relevée à chaque quart des lignes écrites
+                if options['memoire'] and ecrites * 4 // options['lignes'] > len(paliers):
+                    paliers.append(tracemalloc.get_traced_memory()[0])
+
+            depart = time.perf_counter()
+            with tempfile.TemporaryFile() as fichier:
+                document = DocumentPDF(fichier, "RAPPORT DÉTAILLÉ — banc d'essai", f"Rapport {numero}")
+                document.section("Relevés")
+                document.tableau(COLONNES_RELEVES_PDF, releves(), titre="Compteur BENCH-1", progression=suivi)
+                pages = document.terminer()
+                taille = fichier.tell()
+            duree = time.perf_counter() - depart
+            pages_total += pages
+            duree_totale += duree
+
+            ligne = f"Rapport {numero} : {pages} pages en {duree:.2f}s ({pages / duree:.0f} pages/s), {taille / 1024:.0f} Ko"
+            if options['memoire']:
+                pic = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                ligne += (
+                    " ; mémoire par quart : " + ", ".join(f"{valeur / 1024:.0f}" for valeur in paliers)
+                    + f" Ko, pic {pic / 1024:.0f} Ko"
+                )
+            self.stdout.write(ligne)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{pages_total / duree_totale:,.0f} pages par seconde "
+            f"({options['lignes'] * options['rapports'] / duree_totale:,.0f} lignes/s)."
+        ))
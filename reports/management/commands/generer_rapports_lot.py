@@ -0,0 +1,49 @@
+# src/reports/management/commands/generer_rapports_lot.py
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from reports.lots import generer_lot
+from reports.services import bornes_periode
+
+
+class Command(BaseCommand):
+    """
+    Rapports PDF de fin de mois : un par partie commune et par période (reports/lots.py),
+    dessinés en parallèle sur un pool de processus. Affiche la durée de chaque étape.
+    """
+    help = "Génère le rapport PDF de chaque partie commune pour les périodes données (mois précédent par défaut)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periode', action='append', dest='periodes', help="Période AAAA-MM (répétable).")
+        parser.add_argument('--type', dest='type_rapport', default='Rapport mensuel', help="Libellé des rapports créés.")
+        parser.add_argument('--processus', type=int, help="Processus de rendu (par défaut : un par cœur).")
+        parser.add_argument('--forcer', action='store_true', help="Redessine aussi les rapports déjà à jour.")
+
+    def handle(self, *args, **options):
+        periodes = options['periodes']
+        if not periodes:
+            mois = timezone.localtime().replace(day=1)
+            periodes = [f"{mois.year - (mois.month == 1)}-{(mois.month - 2) % 12 + 1:02d}"]
+        for periode in periodes:
+            if len(periode) != 7 or bornes_periode(periode) == (None, None):
+                raise CommandError(f"Période invalide : {periode} (AAAA-MM attendu)")
+        if options['processus'] is not None and options['processus'] < 1:
+            raise CommandError("--processus doit être positif.")
+
+        bilan = generer_lot(periodes, options['type_rapport'], options['processus'], options['forcer'])
+        durees = bilan['durees']
+        self.stdout.write(
+            f"Périodes : {', '.join(periodes)} ; {bilan['rapports']} rapports générés, "
+            f"{bilan['repris']} repris (données inchangées), {bilan['processus']} processus"
+        )
+        if bilan['echecs']:
+            self.stderr.write(f"{bilan['echecs']} rapport(s) en échec (voir le journal), relancer le lot pour les reprendre.")
+        for etape, duree in durees.items():
+            self.stdout.write(f"  {etape:<15} {duree:8.2f} s")
+        if bilan['rapports']:
+            self.stdout.write(
+                f"  rendu cumulé    {bilan['rendu_cumule']:8.2f} s "
+                f"({bilan['rapports'] / max(durees['rendu'], 1e-9):.0f} PDF/s, "
+                f"{bilan['rendu_cumule'] / max(durees['rendu'], 1e-9):.1f} processus occupés en moyenne)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Lot terminé en {sum(durees.values()):.2f}s."))
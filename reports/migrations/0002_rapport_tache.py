@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-18 09:24
+
+from django.db import migrations, models
+
+
+def marquer_rapports_existants(apps, schema_editor):
+    # Les rapports déjà présents ont été générés pendant la requête : ils sont terminés
+    Rapport = apps.get_model('reports', 'Rapport')
+    Rapport.objects.update(statut='TERMINE', progression=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rapport',
+            name='apercu',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rapport',
+            name='configuration',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='rapport',
+            name='date_fin_generation',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rapport',
+            name='erreur',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='rapport',
+            name='progression',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='rapport',
+            name='statut',
+            field=models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('EN_COURS', 'En cours'), ('TERMINE', 'Terminé'), ('ECHEC', 'Échec')], default='EN_ATTENTE', max_length=12),
+        ),
+        migrations.RunPython(marquer_rapports_existants, migrations.RunPython.noop),
+    ]
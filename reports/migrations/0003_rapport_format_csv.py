@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_rapport_tache'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rapport',
+            name='format_export',
+            field=models.CharField(choices=[('PDF', 'PDF'), ('EXCEL', 'Excel'), ('CSV', 'CSV')], max_length=10),
+        ),
+    ]
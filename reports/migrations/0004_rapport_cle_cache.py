@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0003_rapport_format_csv'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rapport',
+            name='cle_cache',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
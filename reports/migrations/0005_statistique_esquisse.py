@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0004_rapport_cle_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statistiqueconsommation',
+            name='esquisse',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='statistiqueconsommation',
+            name='nombre',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='statistiqueconsommation',
+            name='somme',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='statistiqueconsommation',
+            name='valeur_minimale',
+            field=models.FloatField(null=True),
+        ),
+    ]
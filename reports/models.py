@@ -5,12 +5,19 @@ class StatistiqueConsommation(models.Model):
     """
     Modèle StatistiqueConsommation (Diagramme de Packages). 
     Stocke les données agrégées pour éviter de recalculer constamment.
+    Une ligne par mois et par partie commune, tenue à jour au fil des relevés (reports/statistiques.py).
     """
     id = models.AutoField(primary_key=True)
     periode = models.CharField(max_length=50) # Ex: "2025-12"
     valeur_moyenne = models.FloatField()
     valeur_maximale = models.FloatField()
     cout_total = models.FloatField()
+
+    # Résumés fusionnables : plusieurs lignes (mois, zones) se combinent sans relire les relevés
+    nombre = models.IntegerField(default=0)
+    somme = models.FloatField(default=0.0)
+    valeur_minimale = models.FloatField(null=True)
+    esquisse = models.JSONField(default=dict, blank=True) # EsquisseQuantiles.en_json() (reports/esquisses.py)
     
     # Relation : Les statistiques sont généralement liées à une partie commune
     partie_commune = models.ForeignKey(PartieCommune, on_delete=models.CASCADE, related_name='statistiques')
@@ -31,6 +38,7 @@ class Rapport(models.Model):
     FORMAT_CHOICES = [
         ('PDF', 'PDF'),
         ('EXCEL', 'Excel'),
+        ('CSV', 'CSV'),
     ]
 
     id = models.AutoField(primary_key=True)
@@ -44,5 +52,26 @@ class Rapport(models.Model):
     # Chemin vers le fichier généré (stocké temporairement)
     fichier_chemin = models.CharField(max_length=255, null=True, blank=True) 
 
+    # Génération en tâche de fond (reports/taches.py) : l'état est suivi par GET rapports/<id>/statut/
+    STATUT_EN_ATTENTE = 'EN_ATTENTE'
+    STATUT_EN_COURS = 'EN_COURS'
+    STATUT_TERMINE = 'TERMINE'
+    STATUT_ECHEC = 'ECHEC'
+    STATUT_CHOICES = [
+        (STATUT_EN_ATTENTE, 'En attente'),
+        (STATUT_EN_COURS, 'En cours'),
+        (STATUT_TERMINE, 'Terminé'),
+        (STATUT_ECHEC, 'Échec'),
+    ]
+    statut = models.CharField(max_length=12, choices=STATUT_CHOICES, default=STATUT_EN_ATTENTE)
+    progression = models.PositiveSmallIntegerField(default=0) # en %
+    configuration = models.JSONField(default=dict, blank=True) # données validées de RapportConfigSerializer
+    apercu = models.JSONField(null=True, blank=True) # statistiques clés renvoyées avec le statut
+    erreur = models.TextField(blank=True, default='')
+    date_fin_generation = models.DateTimeField(null=True, blank=True)
+    # Empreinte de la configuration et des données couvertes (services.cle_rapport) : une demande
+    # identique, sur des données inchangées, reprend ce rapport au lieu d'en générer un autre
+    cle_cache = models.CharField(max_length=64, blank=True, default='', db_index=True)
+
     def __str__(self):
         return f"Rapport {self.type_rapport} ({self.format_export}) du {self.date_generation.date()}"
\ No newline at end of file
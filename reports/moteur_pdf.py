@@ -0,0 +1,264 @@
+# src/reports/moteur_pdf.py
+"""
+Moteur de rendu des rapports PDF détaillés (tableaux sur des centaines de pages), sur reportlab.
+
+- Pagination automatique : les lignes arrivent d'un itérateur (base de données, archive) et sont
+  consommées par paquets d'une page ; l'en-tête de tableau et le titre « (suite) » sont répétés
+  sur chaque page ;
+- Mémoire : les lignes ne sont jamais accumulées et seule la page en cours est gardée en clair.
+  Chaque page terminée est compressée aussitôt (~1 Ko au lieu de ~10 Ko de flux) ; reportlab
+  n'écrit le fichier qu'à save() et garde jusque-là ses objets page : ~4 Ko par page au total ;
+- Réutilisation : le cadre de page (bandeau, logo, pied) et chaque en-tête de tableau sont dessinés
+  une fois par document (Form XObject) puis référencés sur chaque page. Les gabarits de colonnes
+  et les largeurs de texte sont en cache au niveau du module : d'un rapport à l'autre, dans le même
+  processus, ils ne sont pas recalculés. Les polices sont les polices standard (non embarquées),
+  leurs métriques sont chargées une fois par reportlab.
+
+`manage.py benchmark_pdf` mesure les pages par seconde et la mémoire sur des lignes synthétiques.
+"""
+import hashlib
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+
+from django.utils import timezone
+from reportlab.lib.colors import HexColor
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfdoc import PDFArray, PDFName, PDFStream, PDFZCompress
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+LARGEUR, HAUTEUR = A4
+MARGE = 36
+HAUT = HAUTEUR - 78   # première ligne du corps
+BAS = 54              # sous cette ordonnée : pied de page
+POLICE, POLICE_GRAS = 'Helvetica', 'Helvetica-Bold'
+TAILLE = 8
+INTERLIGNE = 11
+RETRAIT = 3           # marge intérieure des colonnes
+GRIS, BLEU = HexColor('#E8ECF1'), HexColor('#1E3A5F')
+
+# alignement : 'gauche' ou 'droite' ; format : spécification de format() (ex. '.2f', '%d/%m/%Y')
+Colonne = namedtuple('Colonne', ['titre', 'largeur', 'alignement', 'format'], defaults=('gauche', None))
+Gabarit = namedtuple('Gabarit', ['colonnes', 'abscisses', 'largeurs', 'nom'])
+
+
+@lru_cache(maxsize=64)
+def gabarit(colonnes):
+    """
+    Position des colonnes sur la largeur utile (largeurs relatives mises à l'échelle) :
+    abscisse du bord gauche, ou du bord droit pour les colonnes alignées à droite.
+    """
+    echelle = (LARGEUR - 2 * MARGE) / sum(colonne.largeur for colonne in colonnes)
+    abscisses, largeurs, x = [], [], MARGE
+    for colonne in colonnes:
+        largeur = colonne.largeur * echelle
+        abscisses.append(x + largeur - RETRAIT if colonne.alignement == 'droite' else x + RETRAIT)
+        largeurs.append(largeur - 2 * RETRAIT)
+        x += largeur
+    # Nom du Form XObject de l'en-tête, stable pour un même jeu de colonnes
+    nom = 'entete' + hashlib.md5(repr(colonnes).encode()).hexdigest()[:12]
+    return Gabarit(colonnes, tuple(abscisses), tuple(largeurs), nom)
+
+
+@lru_cache(maxsize=4096)
+def ajuster(texte, largeur, police=POLICE, taille=TAILLE):
+    """ (texte, largeur en points) : tronqué avec « … » s'il dépasse `largeur`. """
+    mesure = stringWidth(texte, police, taille)
+    if mesure <= largeur:
+        return texte, mesure
+    while texte and mesure > largeur:
+        texte = texte[:-1]
+        mesure = stringWidth(texte + '…', police, taille)
+    return texte + '…', mesure
+
+
+def _texte(valeur, spec, zone):
+    if valeur is None:
+        return ''
+    if isinstance(valeur, bool):
+        return 'Oui' if valeur else 'Non'
+    if isinstance(valeur, datetime):
+        if valeur.tzinfo is not None:
+            valeur = valeur.astimezone(zone)
+        return format(valeur, spec or '%d/%m/%Y %H:%M')
+    return format(valeur, spec) if spec else str(valeur)
+
+
+class DocumentPDF:
+    """
+    Document paginé : section(), paires() et tableau() ajoutent du contenu à la suite,
+    terminer() écrit le fichier. `fichier` est un objet fichier binaire ouvert en écriture.
+    """
+
+    def __init__(self, fichier, titre, sous_titre=''):
+        self.canvas = canvas.Canvas(fichier, pagesize=A4, pageCompression=1)
+        self.canvas.setTitle(titre)
+        self.canvas.setAuthor('Smart Copro')
+        self.canvas.setPageCallBack(self._compresser_page)
+        # Fuseau résolu une fois par document (comme exports.ecrire_xlsx)
+        self.zone = timezone.get_current_timezone()
+        self.pages = 0
+        self._texte = None
+        self._y = HAUT
+        self._entetes = set()
+        self._dessiner_cadre(titre, sous_titre)
+
+    # --- Éléments communs, dessinés une fois par document ---
+    def _dessiner_cadre(self, titre, sous_titre):
+        c = self.canvas
+        c.beginForm('cadre')
+        c.setFillColor(BLEU)
+        c.roundRect(MARGE, HAUTEUR - 58, 84, 22, 4, stroke=0, fill=1)
+        c.setFillColor(HexColor('#FFFFFF'))
+        c.setFont(POLICE_GRAS, 10)
+        c.drawCentredString(MARGE + 42, HAUTEUR - 50, 'SMART COPRO')
+        c.setFillColor(BLEU)
+        c.setFont(POLICE_GRAS, 13)
+        c.drawString(MARGE + 96, HAUTEUR - 46, ajuster(titre, LARGEUR - 2 * MARGE - 96, POLICE_GRAS, 13)[0])
+        c.setFont(POLICE, 9)
+        c.drawString(MARGE + 96, HAUTEUR - 57, ajuster(sous_titre, LARGEUR - 2 * MARGE - 96, POLICE, 9)[0])
+        c.setStrokeColor(BLEU)
+        c.setLineWidth(1)
+        c.line(MARGE, HAUTEUR - 64, LARGEUR - MARGE, HAUTEUR - 64)
+        c.setLineWidth(0.5)
+        c.line(MARGE, BAS - 12, LARGEUR - MARGE, BAS - 12)
+        c.setFont(POLICE, 7)
+        c.drawString(MARGE, BAS - 24, f"Généré le {timezone.localtime():%d/%m/%Y à %H:%M}")
+        c.endForm()
+
+    def _entete(self, modele):
+        """ Bandeau d'en-tête du tableau, en Form XObject à l'origine (0, 0) : placé par translation. """
+        if modele.nom not in self._entetes:
+            c = self.canvas
+            c.beginForm(modele.nom, lowery=-INTERLIGNE, uppery=INTERLIGNE * 2)
+            c.setFillColor(GRIS)
+            c.rect(MARGE, -3, LARGEUR - 2 * MARGE, INTERLIGNE + 2, stroke=0, fill=1)
+            c.setFillColor(BLEU)
+            c.setFont(POLICE_GRAS, TAILLE)
+            for colonne, x, largeur in zip(modele.colonnes, modele.abscisses, modele.largeurs):
+                titre, mesure = ajuster(colonne.titre, largeur, POLICE_GRAS, TAILLE)
+                c.drawString(x - mesure if colonne.alignement == 'droite' else x, 0, titre)
+            c.endForm()
+            self._entetes.add(modele.nom)
+        c = self.canvas
+        c.saveState()
+        c.translate(0, self._y)
+        c.doForm(modele.nom)
+        c.restoreState()
+        self._y -= INTERLIGNE + 3
+
+    # --- Pages ---
+    def _compresser_page(self, numero):
+        # Appelé par reportlab juste après l'ajout de la page : le flux est compressé tout de suite.
+        # Un flux qui porte déjà son /Filter n'est pas recompressé à l'écriture du fichier.
+        page = self.canvas._doc.Pages.pages[-1]
+        flux = PDFStream(content=PDFZCompress.encode(page.stream))
+        flux.dictionary['Filter'] = PDFArray([PDFName('FlateDecode')])
+        flux.__Comment__ = 'page stream'
+        page.Contents, page.stream = flux, None
+
+    def _ouvrir_page(self):
+        self.pages += 1
+        self.canvas.doForm('cadre')
+        self._texte = self.canvas.beginText()
+        self._texte.setFont(POLICE, 7)
+        numero, mesure = ajuster(f'Page {self.pages}', LARGEUR, POLICE, 7)
+        self._texte.setTextOrigin(LARGEUR - MARGE - mesure, BAS - 24)
+        self._texte.textOut(numero)
+        self._y = HAUT
+
+    def _fermer_page(self):
+        if self._texte is not None:
+            self.canvas.drawText(self._texte)
+            self.canvas.showPage()
+            self._texte = None
+
+    def _place(self, hauteur):
+        """ Garantit `hauteur` points libres sur la page en cours (nouvelle page sinon). """
+        if self._texte is None or self._y - hauteur < BAS:
+            self._fermer_page()
+            self._ouvrir_page()
+
+    def _ligne(self, texte, x, police=POLICE, taille=TAILLE):
+        self._texte.setFont(police, taille)
+        self._texte.setTextOrigin(x, self._y)
+        self._texte.textOut(texte)
+
+    # --- Contenu ---
+    def section(self, titre):
+        """ Titre de section, gardé sur la même page que les premières lignes qui le suivent. """
+        self._place(INTERLIGNE * 6)
+        if self._y < HAUT:
+            self._y -= INTERLIGNE
+        self._ligne(ajuster(titre, LARGEUR - 2 * MARGE, POLICE_GRAS, 11)[0], MARGE, POLICE_GRAS, 11)
+        self._y -= INTERLIGNE * 1.6
+
+    def paires(self, elements):
+        """ Lignes « libellé : valeur » (synthèse). """
+        for libelle, valeur in elements:
+            self._place(INTERLIGNE)
+            self._ligne(f'{libelle} :', MARGE + 10, POLICE_GRAS, 9)
+            self._ligne(ajuster(_texte(valeur, None, self.zone), LARGEUR - 2 * MARGE - 170, POLICE, 9)[0], MARGE + 170, POLICE, 9)
+            self._y -= INTERLIGNE + 2
+
+    def tableau(self, colonnes, lignes, titre=None, progression=None):
+        """
+        Tableau de `lignes` (itérable de tuples, parcouru une seule fois), réparti sur autant de
+        pages que nécessaire. `progression(lignes écrites)` est appelé à chaque page.
+        Retourne le nombre de lignes écrites.
+        """
+        modele = gabarit(tuple(colonnes))
+        formats = [colonne.format for colonne in modele.colonnes]
+        droites = [colonne.alignement == 'droite' for colonne in modele.colonnes]
+        lignes = iter(lignes)
+        # Une ligne lue d'avance : pas de page « (suite) » vide quand le tableau remplit juste une page
+        suivante = next(lignes, None)
+        nombre = 0
+        while True:
+            self._place(INTERLIGNE * 3)
+            if titre:
+                libelle = f'{titre} (suite)' if nombre else titre
+                self._ligne(ajuster(libelle, LARGEUR - 2 * MARGE, POLICE_GRAS, 9)[0], MARGE, POLICE_GRAS, 9)
+                self._y -= INTERLIGNE * 1.4
+            self._entete(modele)
+            if suivante is None:
+                self._ligne('Aucune donnée sur la période.', MARGE + RETRAIT)
+                self._y -= INTERLIGNE
+                return nombre
+            # Paquet d'une page : autant de lignes qu'il en tient sous l'en-tête
+            capacite = int((self._y - BAS) // INTERLIGNE) + 1
+            paquet = [suivante, *islice(lignes, capacite - 1)]
+            suivante = next(lignes, None)
+            # Rendu colonne par colonne : une origine par colonne puis une ligne de texte par relevé
+            # (textLine ne remesure pas le texte) ; seules les cellules alignées à droite se placent une à une.
+            self._texte.setFont(POLICE, TAILLE, INTERLIGNE)
+            for indice, (x, largeur, spec, droite) in enumerate(zip(modele.abscisses, modele.largeurs, formats, droites)):
+                cellules = [ajuster(_texte(ligne[indice], spec, self.zone), largeur) for ligne in paquet]
+                if droite:
+                    y = self._y
+                    for texte, mesure in cellules:
+                        if texte:
+                            self._texte.setTextOrigin(x - mesure, y)
+                            self._texte.textLine(texte)
+                        y -= INTERLIGNE
+                else:
+                    self._texte.setTextOrigin(x, self._y)
+                    for texte, _ in cellules:
+                        self._texte.textLine(texte)
+            self._y -= INTERLIGNE * len(paquet)
+            nombre += len(paquet)
+            if progression:
+                progression(nombre)
+            if suivante is None:
+                return nombre
+            self._fermer_page()
+
+    def terminer(self):
+        """ Ferme la dernière page et écrit le fichier. Retourne le nombre de pages. """
+        if self._texte is None:
+            self._ouvrir_page()
+        self._fermer_page()
+        self.canvas.save()
+        return self.pages
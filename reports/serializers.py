@@ -8,5 +8,13 @@ class RapportConfigSerializer(serializers.Serializer):
     type_rapport = serializers.CharField(max_length=100)
     periode = serializers.CharField(max_length=50, help_text="Ex: '2025-12' ou 'Trimestre 4'")
     format_export = serializers.ChoiceField(choices=Rapport.FORMAT_CHOICES)
+    # PDF seulement : tableaux détaillés (mois par compteur, relevés) au lieu de la synthèse d'une page
+    detaille = serializers.BooleanField(required=False, help_text="PDF détaillé sur plusieurs pages.")
     # L'utilisateur doit choisir la partie commune concernée
-    partie_commune_id = serializers.IntegerField(help_text="ID de la partie commune pour le filtre.")
\ No newline at end of file
+    partie_commune_id = serializers.IntegerField(help_text="ID de la partie commune pour le filtre.")
+
+    def validate(self, data):
+        # Option sans effet retirée : la configuration (et donc services.cle_rapport) reste celle d'une demande sans l'option
+        if not data.get('detaille') or data['format_export'] != 'PDF':
+            data.pop('detaille', None)
+        return data
@@ -0,0 +1,315 @@
+# src/reports/services.py
+import hashlib
+import heapq
+import json
+import os
+from datetime import datetime, timedelta
+
+from django.core.files.storage import default_storage
+from django.db import models
+from django.utils import timezone
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from claims.models import Reclamation
+from consumption.agregats import fin_periode
+from consumption.archive import lire_archives
+from consumption.models import (
+    AgregatCompteur, AgregatPartieCommune, ArchiveReleve, Compteur, Consommation, PartieCommune, Releve,
+)
+from users.models import Resident
+from .exports import ecrire_csv, ecrire_xlsx
+from .models import StatistiqueConsommation
+from .moteur_pdf import Colonne, DocumentPDF
+from .statistiques import cumul
+
+COLONNES_RELEVES = ('Compteur', 'Date du relevé', 'Valeur', 'Méthode', 'Corrigé')
+
+# Tableaux du PDF détaillé (reports/moteur_pdf.py)
+COLONNES_MENSUELLES_PDF = (
+    Colonne('Mois', 3, format='%m/%Y'), Colonne('Consommation', 4, 'droite', '.2f'), Colonne('Coût', 4, 'droite', '.2f'),
+)
+COLONNES_COMPTEURS_PDF = (
+    Colonne('Compteur', 4), Colonne('Mois', 2, format='%m/%Y'), Colonne('Relevés', 2, 'droite', 'd'),
+    Colonne('Index minimum', 3, 'droite', '.2f'), Colonne('Index maximum', 3, 'droite', '.2f'),
+)
+COLONNES_RELEVES_PDF = (
+    Colonne('Date du relevé', 4), Colonne('Valeur', 3, 'droite', '.3f'), Colonne('Méthode', 4), Colonne('Corrigé', 2),
+)
+
+
+def statistiques_consommation(config):
+    """ Statistiques de consommation d'un rapport, lues dans les agrégats mensuels (quelques lignes au lieu de tous les relevés). """
+    return statistiques_zones([config['partie_commune_id']])[config['partie_commune_id']]
+
+
+def statistiques_zones(partie_ids):
+    """ statistiques_consommation de plusieurs zones en une requête (génération par lots). """
+    totaux = dict.fromkeys(partie_ids, (0.0, 0))
+    for partie_id, somme, nombre in (
+        AgregatPartieCommune.objects.filter(partie_commune_id__in=partie_ids, granularite='MOIS')
+        .values('partie_commune_id').annotate(somme=models.Sum('somme'), nombre=models.Sum('nombre'))
+        .values_list('partie_commune_id', 'somme', 'nombre').order_by()
+    ):
+        totaux[partie_id] = (somme, nombre)
+    return {
+        partie_id: {'valeur_moyenne': somme / nombre if nombre else 0}
+        for partie_id, (somme, nombre) in totaux.items()
+    }
+
+
+def situation_globale():
+    """ Effectifs imprimés dans la section « Membres et Réclamations » du PDF (communs à toutes les zones). """
+    return {
+        'residents': Resident.objects.count(),
+        'reclamations_ouvertes': Reclamation.objects.filter(statut='OUVERTE').count(),
+    }
+
+
+def _empreinte(elements):
+    return hashlib.sha256(json.dumps(elements, default=str).encode()).hexdigest()
+
+
+def version_donnees(config):
+    """
+    Empreinte des données que le rapport va lire (pas de compteur de version à entretenir) :
+    - relevés de la zone : les agrégats mensuels de la période. Toute insertion les met à jour,
+      toute correction ou suppression les recrée (nouveaux id) ; l'archivage n'y touche pas ;
+    - compteurs de la zone (référence affichée dans les exports) ;
+    - PDF : les deux effectifs imprimés dans la situation globale ;
+    - PDF détaillé : agrégats de la période et compteurs, plus la situation globale, le nom de la zone,
+      la localisation des compteurs et les consommations mensuelles (consommations_mensuelles).
+    Une modification ailleurs (autre zone, autre période) laisse l'empreinte inchangée.
+    """
+    detaille = config['format_export'] == 'PDF' and config.get('detaille')
+    if config['format_export'] == 'PDF' and not detaille:
+        return versions_donnees_pdf([config['partie_commune_id']])[config['partie_commune_id']]
+    agregats = AgregatPartieCommune.objects.filter(partie_commune_id=config['partie_commune_id'], granularite='MOIS')
+    debut, fin = bornes_periode(config['periode'])
+    if debut:
+        agregats = agregats.filter(debut_periode__gte=debut, debut_periode__lt=fin)
+    compteurs = Compteur.objects.filter(partie_commune_id=config['partie_commune_id']).order_by('id')
+    elements = list(compteurs.values_list('id', 'reference', *(['localisation'] if detaille else [])))
+    elements.extend(agregats.order_by('debut_periode').values_list('id', 'nombre', 'somme', 'minimum', 'maximum'))
+    if detaille:
+        elements.extend(consommations_mensuelles(config).values_list('id', 'valeur_consommee', 'cout'))
+        elements.append(sorted(situation_globale().items()))
+        elements.append(PartieCommune.objects.filter(pk=config['partie_commune_id']).values_list('nom', flat=True).first())
+    return _empreinte(elements)
+
+
+def versions_donnees_pdf(partie_ids, situation=None):
+    """ version_donnees des PDF de plusieurs zones, en une requête sur les agrégats (+ situation_globale). """
+    situation = situation or situation_globale()
+    # Les statistiques du PDF couvrent tout l'historique de la zone (statistiques_consommation)
+    elements = {partie_id: [situation['residents'], situation['reclamations_ouvertes']] for partie_id in partie_ids}
+    for partie_id, *agregat in (
+        AgregatPartieCommune.objects.filter(partie_commune_id__in=partie_ids, granularite='MOIS')
+        .order_by('partie_commune_id', 'debut_periode')
+        .values_list('partie_commune_id', 'id', 'nombre', 'somme', 'minimum', 'maximum')
+    ):
+        elements[partie_id].append(agregat)
+    return {partie_id: _empreinte(contenu) for partie_id, contenu in elements.items()}
+
+
+def cle_rapport(config, version=None):
+    """ Clé de cache d'un rapport : configuration demandée + version des données couvertes. """
+    contenu = json.dumps({'config': config, 'donnees': version or version_donnees(config)}, sort_keys=True, default=str)
+    return hashlib.sha256(contenu.encode()).hexdigest()
+
+
+def _periode_fichier(config):
+    # Libellé de période utilisable dans un nom de fichier ou de feuille
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in config['periode'])
+
+
+def _chemin_rapport(prefixe, config, cle, extension):
+    """ Nom de fichier propre à la zone, à la période et au contenu : deux rapports différents ne s'écrasent plus. """
+    periode = _periode_fichier(config)
+    folder = 'reports_exports'
+    if not os.path.exists(folder): os.makedirs(folder)
+    return os.path.join(folder, f"{prefixe}_{config['partie_commune_id']}_{periode}_{cle[:16]}.{extension}")
+
+
+def creer_pdf_complet(stats_conso, config, cle, situation=None):
+    """
+    Génère un PDF avec stats de consommation ET situation globale.
+    """
+    filepath = _chemin_rapport('rapport_global', config, cle, 'pdf')
+    situation = situation or situation_globale()
+    with default_storage.open(filepath, 'wb') as f:
+        dessiner_pdf_complet(f, config, stats_conso, situation)
+    return filepath
+
+
+def dessiner_pdf_complet(f, config, stats_conso, situation):
+    """ Dessin du PDF dans le fichier `f`, sans accès à la base (utilisable dans un processus de reports/lots.py). """
+    p = canvas.Canvas(f, pagesize=A4)
+    # --- EN-TÊTE ---
+    p.setFont("Helvetica-Bold", 18)
+    p.drawString(50, 800, "RAPPORT DE SITUATION COPROPRIÉTÉ")
+    p.setFont("Helvetica", 12)
+    p.drawString(50, 780, f"Période : {config['periode']}")
+    
+    # --- SECTION 1 : MEMBRES & RÉCLAMATIONS ---
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(50, 740, "1. Situation des Membres et Réclamations")
+    p.setFont("Helvetica", 11)
+    p.drawString(70, 720, f"- Nombre de Résidents : {situation['residents']}")
+    p.drawString(70, 700, f"- Réclamations en attente : {situation['reclamations_ouvertes']}")
+    
+    # --- SECTION 2 : CONSOMMATION ---
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(50, 660, "2. Analyse de Consommation")
+    p.setFont("Helvetica", 11)
+    p.drawString(70, 640, f"- Moyenne période : {stats_conso['valeur_moyenne']} unités")
+    
+    p.showPage()
+    p.save()
+
+
+def bornes_periode(periode):
+    """
+    [début, fin[ de la période demandée : 'AAAA-MM' (un mois) ou 'AAAA' (une année).
+    Tout autre libellé (ex. 'Trimestre 4') couvre l'historique complet : (None, None).
+    """
+    for motif, granularite in (('%Y-%m', 'MOIS'), ('%Y', 'ANNEE')):
+        try:
+            debut = timezone.make_aware(datetime.strptime(periode.strip(), motif))
+        except ValueError:
+            continue
+        if granularite == 'ANNEE':
+            return debut, debut.replace(year=debut.year + 1)
+        return debut, fin_periode(debut, granularite)
+    return None, None
+
+
+def consommations_mensuelles(config):
+    """ Consommations mensuelles de la zone sur la période (différences d'index, consumption.utils), par mois. """
+    consommations = Consommation.objects.filter(partie_commune_id=config['partie_commune_id'], periode__regex=r'^\d{4}-\d{2}$')
+    debut, fin = bornes_periode(config['periode'])
+    if debut:
+        consommations = consommations.filter(date_debut__gte=debut.date(), date_debut__lt=fin.date())
+    return consommations.order_by('date_debut')
+
+
+def releves_rapport(config, compteur_id=None):
+    """
+    (nombre estimé, itérateur) des relevés de la zone (ou d'un de ses compteurs) sur la période, par date
+    croissante : table chaude lue par paquets côté base, fusionnée avec l'archive froide.
+    """
+    debut, fin = bornes_periode(config['periode'])
+    releves = Releve.objects.filter(compteur__partie_commune_id=config['partie_commune_id'])
+    archives = ArchiveReleve.objects.filter(compteur__partie_commune_id=config['partie_commune_id'])
+    if compteur_id is not None:
+        releves, archives = releves.filter(compteur_id=compteur_id), archives.filter(compteur_id=compteur_id)
+    if debut:
+        releves = releves.filter(date_releve__gte=debut, date_releve__lt=fin)
+        archives = archives.filter(date_max__gte=debut, date_min__lt=fin)
+    # Borne de lecture de l'archive inclusive : on retire l'instant de fin exclu
+    fin_archive = fin - timedelta(microseconds=1) if fin else None
+
+    nombre = releves.count() + (archives.aggregate(total=models.Sum('nombre'))['total'] or 0)
+    lignes = heapq.merge(
+        releves.order_by('date_releve', 'id').values_list(
+            'date_releve', 'id', 'compteur__reference', 'valeur', 'methode_releve', 'est_corrige'
+        ).iterator(chunk_size=2000),
+        (
+            (r.date_releve, r.id, r.compteur.reference, r.valeur, r.methode_releve, r.est_corrige)
+            for r in lire_archives(archives, debut, fin_archive, decroissant=False)
+        ),
+    )
+    return nombre, ((reference, date, valeur, methode, corrige) for date, _, reference, valeur, methode, corrige in lignes)
+
+
+def creer_export_releves(config, cle, progression=lambda pourcentage: None):
+    """
+    Export tabulaire (XLSX ou CSV) des relevés de la zone, écrit en flux dans le stockage :
+    la mémoire reste constante quel que soit le nombre de lignes.
+    """
+    extension = 'xlsx' if config['format_export'] == 'EXCEL' else 'csv'
+    filepath = _chemin_rapport('rapport_releves', config, cle, extension)
+    periode = _periode_fichier(config)
+
+    nombre, lignes = releves_rapport(config)
+    # Progression de 30 à 95 % au fil des lignes écrites
+    avancement = lambda ecrites: progression(30 + min(65, 65 * ecrites // max(nombre, 1)))
+    with default_storage.open(filepath, 'wb') as f:
+        if extension == 'xlsx':
+            ecrites = ecrire_xlsx(f, COLONNES_RELEVES, lignes, nom_feuille=f"Relevés {periode}", progression=avancement)
+        else:
+            ecrites = ecrire_csv(f, COLONNES_RELEVES, lignes, progression=avancement)
+    return filepath, ecrites
+
+
+def creer_pdf_detaille(config, cle, progression=lambda pourcentage: None):
+    """
+    PDF détaillé de la zone sur la période (reports/moteur_pdf.py) : synthèse, répartition mensuelle
+    par compteur, puis un tableau des relevés par compteur, sur autant de pages que nécessaire.
+    Les lignes sont lues en flux (agrégats, table chaude, archive). Retourne (chemin, nombre de pages).
+    """
+    filepath = _chemin_rapport('rapport_detaille', config, cle, 'pdf')
+    partie = PartieCommune.objects.get(pk=config['partie_commune_id'])
+    compteurs = list(Compteur.objects.filter(partie_commune=partie).order_by('reference').values_list('id', 'reference', 'localisation'))
+    debut, fin = bornes_periode(config['periode'])
+    statistiques = StatistiqueConsommation.objects.filter(partie_commune=partie)
+    agregats = AgregatCompteur.objects.filter(compteur__partie_commune=partie, granularite='MOIS')
+    if debut:
+        statistiques = statistiques.filter(periode__gte=f"{debut:%Y-%m}", periode__lt=f"{fin:%Y-%m}")
+        agregats = agregats.filter(debut_periode__gte=debut, debut_periode__lt=fin)
+    resume = cumul(statistiques.only('nombre', 'somme', 'valeur_minimale', 'valeur_maximale', 'cout_total', 'esquisse'))
+    # Relevés = index cumulés : consommation et coût viennent des différences d'index (Consommation)
+    mensuelles = list(consommations_mensuelles(config).values_list('date_debut', 'valeur_consommee', 'cout'))
+    situation = situation_globale()
+    arrondi = lambda valeur: None if valeur is None else round(valeur, 2)
+
+    with default_storage.open(filepath, 'wb') as f:
+        document = DocumentPDF(f, f"RAPPORT DÉTAILLÉ — {partie.nom}", f"{config['type_rapport']} · Période : {config['periode']}")
+        document.section("1. Synthèse")
+        document.paires([
+            ("Compteurs", len(compteurs)),
+            ("Relevés", resume['nombre']),
+            ("Consommation totale", round(sum(valeur for _, valeur, _ in mensuelles), 2)),
+            ("Index moyen / médian", f"{arrondi(resume['moyenne'])} / {arrondi(resume['mediane'])}"),
+            ("Index minimum / maximum", f"{arrondi(resume['minimum'])} / {arrondi(resume['maximum'])}"),
+            ("Index centile 90 / 99", f"{arrondi(resume['p90'])} / {arrondi(resume['p99'])}"),
+            ("Coût total", round(sum(cout for _, _, cout in mensuelles), 2)),
+            ("Résidents", situation['residents']),
+            ("Réclamations en attente", situation['reclamations_ouvertes']),
+        ])
+        progression(35)
+
+        document.section("2. Consommation mensuelle")
+        document.tableau(COLONNES_MENSUELLES_PDF, mensuelles)
+        document.tableau(COLONNES_COMPTEURS_PDF, (
+            agregats.order_by('compteur__reference', 'debut_periode')
+            .values_list('compteur__reference', 'debut_periode', 'nombre', 'minimum', 'maximum').iterator(chunk_size=2000)
+        ), titre="Relevés par compteur")
+        progression(40)
+
+        document.section("3. Relevés par compteur")
+        for indice, (compteur_id, reference, localisation) in enumerate(compteurs, start=1):
+            _, lignes = releves_rapport(config, compteur_id)
+            document.tableau(COLONNES_RELEVES_PDF, (ligne[1:] for ligne in lignes), titre=f"Compteur {reference} — {localisation}")
+            # Progression de 40 à 95 % au fil des compteurs
+            progression(40 + 55 * indice // len(compteurs))
+        pages = document.terminer()
+    return filepath, pages
+
+
+def generer_rapport(config, progression=lambda pourcentage: None, cle=None):
+    """
+    Calcule les statistiques puis produit le fichier du rapport (PDF de synthèse ou détaillé, ou relevés en XLSX / CSV).
+    `progression(pourcentage)` est appelé entre les étapes ; `cle` (cle_rapport) nomme le fichier.
+    Retourne (chemin du fichier, aperçu).
+    """
+    cle = cle or cle_rapport(config)
+    stats_conso = statistiques_consommation(config)
+    progression(30)
+    if config['format_export'] == 'PDF' and config.get('detaille'):
+        path, stats_conso['nombre_pages'] = creer_pdf_detaille(config, cle, progression)
+    elif config['format_export'] == 'PDF':
+        path = creer_pdf_complet(stats_conso, config, cle)
+    else:
+        path, stats_conso['nombre_releves'] = creer_export_releves(config, cle, progression)
+    return path, stats_conso
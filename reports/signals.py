@@ -0,0 +1,45 @@
+# src/reports/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from alerts.models import Alerte
+from alerts.services import alertes_enregistrees
+from claims.models import Intervention, Reclamation
+from consumption.agregats import periodes_recalculees, releves_ajoutes
+from consumption.models import Compteur, PartieCommune
+from consumption.utils import consommations_calculees
+from users.models import ConseilSyndical, Resident, Syndic, TechnicienMaintenance, Utilisateur
+from . import statistiques, tableau_de_bord
+
+
+@receiver(releves_ajoutes)
+def maj_statistiques_apres_ajout(sender, releves, parties, **kwargs):
+    statistiques.ajouter_releves(releves, parties)
+
+
+@receiver(periodes_recalculees)
+def maj_statistiques_apres_recalcul(sender, partie_ids, debut, fin, **kwargs):
+    statistiques.recalculer(partie_ids, debut, fin)
+
+
+@receiver(consommations_calculees)
+def maj_couts_apres_calcul(sender, consommations, granularite, **kwargs):
+    if granularite == 'MOIS':
+        statistiques.maj_couts(consommations)
+
+
+# Tables comptées par le tableau de bord (les sous-classes d'Utilisateur émettent leurs propres signaux)
+MODELES_TABLEAU_DE_BORD = (
+    PartieCommune, Compteur, Reclamation, Intervention, Alerte,
+    Utilisateur, Syndic, Resident, ConseilSyndical, TechnicienMaintenance,
+)
+
+
+def invalider_tableau_de_bord(sender, **kwargs):
+    tableau_de_bord.invalider()
+
+
+for modele in MODELES_TABLEAU_DE_BORD:
+    post_save.connect(invalider_tableau_de_bord, sender=modele, dispatch_uid=f'tableau_de_bord_save_{modele.__name__}')
+    post_delete.connect(invalider_tableau_de_bord, sender=modele, dispatch_uid=f'tableau_de_bord_delete_{modele.__name__}')
+alertes_enregistrees.connect(invalider_tableau_de_bord, dispatch_uid='tableau_de_bord_alertes')
@@ -0,0 +1,225 @@
+# src/reports/statistiques.py
+"""
+Maintenance de StatistiqueConsommation : une ligne par (mois, partie commune), tenue à jour
+sur les mêmes chemins d'écriture que les agrégats (signaux de consumption.agregats) :
+
+- releves_ajoutes      : fusion incrémentale des nouveaux relevés (nombre, somme, min/max, esquisse) ;
+- periodes_recalculees : correction, suppression ou reconstruction -> les mois touchés sont recalculés
+  depuis les relevés bruts. Les seaux de l'esquisse sont comptés côté base (GROUP BY), l'archive froide
+  est relue en Python, comme dans agregats.recalculer.
+
+cumul() combine ensuite n'importe quel ensemble de lignes (plusieurs mois, plusieurs zones)
+en un résumé avec médiane et centiles, sans relire les relevés.
+
+Les relevés sont des index cumulés : leur somme ne mesure pas la consommation. Le coût d'une ligne
+est donc repris de la Consommation mensuelle de la zone (différences d'index, consumption.utils),
+au moment de l'écriture puis à chaque calcul des consommations (signal consommations_calculees).
+`manage.py reconstruire_agregats` reconstruit aussi ces statistiques.
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Min, Sum, Value, When
+from django.db.models.functions import Abs, Ceil, Ln, TruncMonth
+
+from consumption.agregats import debut_periode, fin_periode
+from consumption.archive import blocs, lire_archives
+from consumption.models import Compteur, Consommation, Releve
+from .esquisses import LOG_GAMMA, VALEUR_NULLE, EsquisseQuantiles
+from .models import StatistiqueConsommation
+
+QUANTILES = {'mediane': 0.5, 'p90': 0.9, 'p95': 0.95, 'p99': 0.99}
+
+
+def libelle_periode(date):
+    """ 'AAAA-MM' du mois (heure locale) contenant `date`. """
+    return f"{debut_periode(date, 'MOIS'):%Y-%m}"
+
+
+class _Resume:
+    """ Résumé fusionnable en cours de calcul pour une (partie commune, période). """
+    __slots__ = ('nombre', 'somme', 'minimum', 'maximum', 'esquisse')
+
+    def __init__(self):
+        self.nombre, self.somme, self.minimum, self.maximum = 0, 0.0, None, None
+        self.esquisse = EsquisseQuantiles()
+
+    def ajouter(self, valeur):
+        self.fusionner(1, valeur, valeur, valeur)
+        self.esquisse.ajouter(valeur)
+
+    def fusionner(self, nombre, somme, minimum, maximum):
+        self.nombre += nombre
+        self.somme += somme
+        self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+
+    def ecrire(self, statistique):
+        """ Reporte le résumé sur la ligne (champs fusionnables et champs dérivés). """
+        statistique.nombre, statistique.somme = self.nombre, self.somme
+        statistique.valeur_minimale = self.minimum
+        statistique.valeur_maximale = self.maximum if self.maximum is not None else 0.0
+        statistique.valeur_moyenne = self.somme / self.nombre if self.nombre else 0.0
+        statistique.esquisse = self.esquisse.en_json()
+
+    @classmethod
+    def depuis(cls, statistique):
+        resume = cls()
+        resume.nombre, resume.somme = statistique.nombre, statistique.somme
+        resume.minimum = statistique.valeur_minimale
+        resume.maximum = statistique.valeur_maximale if statistique.nombre else None
+        resume.esquisse = EsquisseQuantiles.depuis_json(statistique.esquisse)
+        return resume
+
+
+CHAMPS = ['nombre', 'somme', 'valeur_minimale', 'valeur_maximale', 'valeur_moyenne', 'cout_total', 'esquisse']
+
+
+def _couts(parties, periodes):
+    """ Coût des consommations mensuelles par (partie commune, période). """
+    return {
+        (partie, periode): cout
+        for partie, periode, cout in Consommation.objects.filter(
+            partie_commune_id__in=parties, periode__in=periodes
+        ).values_list('partie_commune_id', 'periode', 'cout')
+    }
+
+
+def ajouter_releves(releves, parties):
+    """ Fusionne de nouveaux relevés : une lecture et une écriture en bulk, quelle que soit la taille du lot. """
+    deltas = {}
+    for releve in releves:
+        cle = (parties[releve.compteur_id], libelle_periode(releve.date_releve))
+        deltas.setdefault(cle, _Resume()).ajouter(releve.valeur)
+
+    with transaction.atomic():
+        existantes = {
+            (statistique.partie_commune_id, statistique.periode): statistique
+            for statistique in StatistiqueConsommation.objects.select_for_update().filter(
+                partie_commune_id__in={partie for partie, _ in deltas}, periode__in={periode for _, periode in deltas}
+            )
+        }
+        couts = _couts({partie for partie, _ in deltas}, {periode for _, periode in deltas})
+        a_creer, a_modifier = [], []
+        for (partie, periode), delta in deltas.items():
+            statistique = existantes.get((partie, periode))
+            if statistique is None:
+                statistique = StatistiqueConsommation(partie_commune_id=partie, periode=periode)
+                a_creer.append(statistique)
+                resume = delta
+            else:
+                a_modifier.append(statistique)
+                resume = _Resume.depuis(statistique)
+                resume.fusionner(delta.nombre, delta.somme, delta.minimum, delta.maximum)
+                resume.esquisse.fusionner(delta.esquisse)
+            resume.ecrire(statistique)
+            statistique.cout_total = couts.get((partie, periode), 0.0)
+        StatistiqueConsommation.objects.bulk_create(a_creer, batch_size=500)
+        StatistiqueConsommation.objects.bulk_update(a_modifier, CHAMPS, batch_size=500)
+
+
+def recalculer(partie_ids=None, debut=None, fin=None):
+    """
+    Recalcule depuis les relevés bruts (table chaude + archive) les mois qui recoupent [debut, fin]
+    pour les parties communes données (toutes par défaut).
+    """
+    borne_debut = debut_periode(debut, 'MOIS') if debut is not None else None
+    borne_fin = fin_periode(debut_periode(fin, 'MOIS'), 'MOIS') if fin is not None else None
+
+    releves = Releve.objects.all()
+    statistiques = StatistiqueConsommation.objects.all()
+    if partie_ids is not None:
+        releves = releves.filter(compteur__partie_commune_id__in=partie_ids)
+        statistiques = statistiques.filter(partie_commune_id__in=partie_ids)
+    if borne_debut is not None:
+        releves = releves.filter(date_releve__gte=borne_debut)
+        statistiques = statistiques.filter(periode__gte=f"{borne_debut:%Y-%m}")
+    if borne_fin is not None:
+        releves = releves.filter(date_releve__lt=borne_fin)
+        statistiques = statistiques.filter(periode__lt=f"{borne_fin:%Y-%m}")
+
+    # Seau de l'esquisse calculé par la base : une ligne par (zone, mois, signe, seau) au lieu d'une par relevé
+    signe = Case(
+        When(valeur__gt=VALEUR_NULLE, then=Value(1)), When(valeur__lt=-VALEUR_NULLE, then=Value(-1)),
+        default=Value(0), output_field=IntegerField(),
+    )
+    seau = Case(
+        When(valeur__gt=VALEUR_NULLE, then=Ceil(Ln('valeur') / LOG_GAMMA)),
+        When(valeur__lt=-VALEUR_NULLE, then=Ceil(Ln(Abs('valeur')) / LOG_GAMMA)),
+        default=Value(0), output_field=IntegerField(),
+    )
+    lignes = (
+        releves.annotate(partie=F('compteur__partie_commune_id'), mois=TruncMonth('date_releve'), signe=signe, seau=seau)
+        .values('partie', 'mois', 'signe', 'seau')
+        .annotate(nombre=Count('id'), somme=Sum('valeur'), minimum=Min('valeur'), maximum=Max('valeur'))
+        .order_by()
+    )
+    resumes = {}
+    for ligne in lignes.iterator(chunk_size=2000):
+        resume = resumes.setdefault((ligne['partie'], f"{ligne['mois']:%Y-%m}"), _Resume())
+        resume.fusionner(ligne['nombre'], ligne['somme'], ligne['minimum'], ligne['maximum'])
+        if ligne['signe'] == 0:
+            resume.esquisse.nuls += ligne['nombre']
+        else:
+            seaux = resume.esquisse.positifs if ligne['signe'] > 0 else resume.esquisse.negatifs
+            seaux[int(ligne['seau'])] = seaux.get(int(ligne['seau']), 0) + ligne['nombre']
+
+    # Relevés déjà passés en archive froide sur la même fenêtre
+    parties = dict(Compteur.objects.values_list('id', 'partie_commune_id'))
+    archives = blocs(partie_ids=partie_ids, debut=borne_debut, fin=borne_fin)
+    for releve in lire_archives(archives, borne_debut, borne_fin, decroissant=False):
+        if borne_fin is not None and releve.date_releve >= borne_fin:
+            continue
+        resumes.setdefault((parties[releve.compteur_id], libelle_periode(releve.date_releve)), _Resume()).ajouter(releve.valeur)
+
+    couts = _couts({partie for partie, _ in resumes}, {periode for _, periode in resumes})
+    with transaction.atomic():
+        statistiques.delete()
+        a_creer = []
+        for (partie, periode), resume in resumes.items():
+            statistique = StatistiqueConsommation(partie_commune_id=partie, periode=periode)
+            resume.ecrire(statistique)
+            statistique.cout_total = couts.get((partie, periode), 0.0)
+            a_creer.append(statistique)
+        StatistiqueConsommation.objects.bulk_create(a_creer, batch_size=500)
+
+
+def maj_couts(consommations):
+    """ Reporte le coût des consommations mensuelles recalculées sur les lignes des mêmes mois. """
+    couts = {(consommation.partie_commune_id, consommation.periode): consommation.cout for consommation in consommations}
+    if not couts:
+        return
+    lignes = list(StatistiqueConsommation.objects.filter(
+        partie_commune_id__in={partie for partie, _ in couts}, periode__in={periode for _, periode in couts}
+    ).only('id', 'partie_commune_id', 'periode', 'cout_total'))
+    a_modifier = []
+    for statistique in lignes:
+        cout = couts.get((statistique.partie_commune_id, statistique.periode))
+        if cout is not None and cout != statistique.cout_total:
+            statistique.cout_total = cout
+            a_modifier.append(statistique)
+    StatistiqueConsommation.objects.bulk_update(a_modifier, ['cout_total'], batch_size=500)
+
+
+def cumul(statistiques):
+    """
+    Fusionne des lignes StatistiqueConsommation (n'importe quels mois / zones) en un seul résumé :
+    nombre, somme, moyenne, min, max des relevés, quantiles (QUANTILES, à 1 % près)
+    et coût des consommations de ces mois (somme des cout_total).
+    """
+    total = _Resume()
+    cout_total = 0.0
+    for statistique in statistiques:
+        cout_total += statistique.cout_total
+        if not statistique.nombre:
+            continue
+        total.fusionner(statistique.nombre, statistique.somme, statistique.valeur_minimale, statistique.valeur_maximale)
+        total.esquisse.fusionner(EsquisseQuantiles.depuis_json(statistique.esquisse))
+    resultat = {
+        'nombre': total.nombre,
+        'somme': total.somme,
+        'moyenne': total.somme / total.nombre if total.nombre else None,
+        'minimum': total.minimum,
+        'maximum': total.maximum,
+        'cout_total': round(cout_total, 2),
+    }
+    resultat.update({nom: total.esquisse.quantile(q) for nom, q in QUANTILES.items()})
+    return resultat
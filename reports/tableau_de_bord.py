@@ -0,0 +1,89 @@
+# src/reports/tableau_de_bord.py
+"""
+Instantané du tableau de bord syndic (GlobalDashboardStatsView).
+
+- Calcul : quatre requêtes à agrégation conditionnelle (une par famille de tables)
+  au lieu d'un COUNT par indicateur ;
+- Cache : l'instantané et son ETag sont gardés dans le cache Django jusqu'à la prochaine
+  écriture sur les tables comptées (reports/signals.py), avec TABLEAU_DE_BORD_DUREE comme filet
+  pour les écritures sans signal (QuerySet.update hors alertes).
+
+Invalidation par génération : invalider change un jeton, et l'instantané est rangé sous le jeton
+lu avant son calcul. Un calcul concurrent d'une écriture ne peut donc pas être servi après elle.
+Avec le cache local par défaut (LocMemCache), chaque processus a son instantané ; un cache
+partagé (Redis, Memcached) dans CACHES le rend commun à tous les workers.
+"""
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from alerts.models import Alerte
+from claims.models import Reclamation
+from consumption.models import PartieCommune
+from users.models import Utilisateur
+
+CLE_GENERATION = 'reports:tableau_de_bord:generation'
+
+
+def calculer():
+    """ Indicateurs du tableau de bord (même format que la réponse de l'API). """
+    infrastructure = PartieCommune.objects.aggregate(
+        parties_communes=Count('id', distinct=True), total_compteurs=Count('compteurs'),
+    )
+    # Héritage multi-tables : un Resident / TechnicienMaintenance est une ligne Utilisateur avec sa table fille
+    communaute = Utilisateur.objects.aggregate(habitants=Count('resident'), staff_technique=Count('technicienmaintenance'))
+    reclamations = Reclamation.objects.aggregate(
+        total=Count('id'),
+        ouvertes=Count('id', filter=Q(statut='OUVERTE')),
+        resolues=Count('id', filter=Q(statut='RESOLUE')),
+        interventions_en_cours=Count('intervention', filter=Q(statut='EN_COURS')),
+    )
+    alertes_critiques = Alerte.objects.filter(seuil__type_alerte='SURCONS', est_traitee=False).count()
+
+    total = reclamations['total']
+    return {
+        "infrastructure": infrastructure,
+        "communaute": communaute,
+        "maintenance": {
+            "reclamations_ouvertes": reclamations['ouvertes'],
+            "alertes_critiques": alertes_critiques,
+            "interventions_en_cours": reclamations['interventions_en_cours'],
+            "taux_resolution": round((reclamations['resolues'] / total) * 100, 2) if total else 100,
+        },
+    }
+
+
+def _generation():
+    generation = cache.get(CLE_GENERATION)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        cache.add(CLE_GENERATION, generation, None)
+        generation = cache.get(CLE_GENERATION, generation)
+    return generation
+
+
+def instantane():
+    """ (etag, indicateurs) : depuis le cache, ou recalculés si une écriture les a invalidés. """
+    cle = f'reports:tableau_de_bord:{_generation()}'
+    resultat = cache.get(cle)
+    if resultat is None:
+        donnees = calculer()
+        etag = '"' + hashlib.sha1(json.dumps(donnees, sort_keys=True).encode()).hexdigest() + '"'
+        resultat = (etag, donnees)
+        cache.set(cle, resultat, settings.TABLEAU_DE_BORD_DUREE)
+    return resultat
+
+
+def _nouvelle_generation():
+    cache.set(CLE_GENERATION, uuid.uuid4().hex, None)
+
+
+def invalider():
+    # Tout de suite pour ce thread, puis au commit pour les lectures faites entre-temps par d'autres transactions
+    _nouvelle_generation()
+    transaction.on_commit(_nouvelle_generation)
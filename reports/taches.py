@@ -0,0 +1,87 @@
+# src/reports/taches.py
+"""
+Génération des rapports hors requête : le POST crée un Rapport EN_ATTENTE et le confie
+au pool local de ce processus ; GET rapports/<id>/statut/ suit la progression.
+
+- RAPPORTS_CONCURRENCE : rapports rendus en même temps (threads du pool) ;
+- RAPPORTS_FILE_MAX    : rapports acceptés en plus, en attente d'un thread.
+  Au-delà, le POST répond 429 : une rafale de rapports ne peut pas occuper tout le serveur.
+
+Un rapport en cours lors d'un arrêt du processus reste dans son état : il suffit d'en redemander un
+(le cache de la vue ne reprend un rapport inachevé que s'il est encore pris en charge par le pool).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import Rapport
+from .services import generer_rapport
+
+logger = logging.getLogger(__name__)
+
+
+class PoolRapports:
+
+    def __init__(self):
+        self._executeur = None
+        self._verrou = threading.Lock()
+        self._acceptes = set()  # rapports en cours + en attente dans ce processus
+
+    @property
+    def capacite(self):
+        return settings.RAPPORTS_CONCURRENCE + settings.RAPPORTS_FILE_MAX
+
+    def soumettre(self, rapport_id):
+        """ Confie le rapport au pool. Retourne False si le pool est saturé (le rapport n'est pas pris). """
+        with self._verrou:
+            if len(self._acceptes) >= self.capacite:
+                return False
+            if self._executeur is None:
+                self._executeur = ThreadPoolExecutor(max_workers=settings.RAPPORTS_CONCURRENCE, thread_name_prefix='rapport')
+            self._acceptes.add(rapport_id)
+        self._executeur.submit(self._executer, rapport_id)
+        return True
+
+    def _executer(self, rapport_id):
+        close_old_connections()
+        try:
+            executer_rapport(rapport_id)
+        except Exception:
+            logger.exception("Génération du rapport %s impossible", rapport_id)
+        finally:
+            close_old_connections()
+            with self._verrou:
+                self._acceptes.discard(rapport_id)
+
+    def en_charge(self, rapport_id):
+        """ Le rapport est-il en attente ou en cours dans ce pool ? (sinon : abandonné par un processus arrêté) """
+        with self._verrou:
+            return rapport_id in self._acceptes
+
+
+def executer_rapport(rapport_id):
+    """ Rend un rapport EN_ATTENTE et enregistre son résultat (ou l'erreur). """
+    rapports = Rapport.objects.filter(pk=rapport_id)
+    if not rapports.filter(statut=Rapport.STATUT_EN_ATTENTE).update(statut=Rapport.STATUT_EN_COURS, progression=5):
+        return
+    rapport = rapports.get()
+
+    def progression(pourcentage):
+        rapports.update(progression=pourcentage)
+
+    try:
+        chemin, apercu = generer_rapport(rapport.configuration, progression, cle=rapport.cle_cache or None)
+    except Exception as erreur:
+        rapports.update(statut=Rapport.STATUT_ECHEC, erreur=str(erreur), date_fin_generation=timezone.now())
+        raise
+    rapports.update(
+        statut=Rapport.STATUT_TERMINE, progression=100, fichier_chemin=chemin, apercu=apercu,
+        date_fin_generation=timezone.now(),
+    )
+
+
+pool_rapports = PoolRapports()
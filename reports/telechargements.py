@@ -0,0 +1,137 @@
+# src/reports/telechargements.py
+"""
+Envoi des fichiers de rapport (RapportDownloadAPIView).
+
+- Requêtes conditionnelles : ETag et Last-Modified tirés du fichier (taille, date de modification) ;
+  If-None-Match / If-Modified-Since -> 304, If-Match / If-Unmodified-Since -> 412
+  (django.utils.cache.get_conditional_response) ;
+- Plages : « Range: bytes=début-fin » (ou « début- », « -n ») -> 206 avec Content-Range, lu par blocs
+  depuis le stockage ; plage hors du fichier -> 416. If-Range : la plage n'est servie que si le fichier
+  n'a pas changé depuis, sinon c'est le fichier complet (200). Une demande de plusieurs plages reçoit
+  le fichier complet (permis par la RFC 9110) : les reprises de téléchargement n'en demandent qu'une ;
+- Délégation (RAPPORTS_DELEGATION) : Django contrôle les droits et les préconditions, puis le serveur
+  web envoie les octets (plages comprises) via X-Accel-Redirect (nginx) ou X-Sendfile (Apache, lighttpd).
+
+L'ETag a le format de celui de nginx ("mtime-taille" en hexadécimal) : il reste le même que le fichier
+soit envoyé par Django ou par le serveur web.
+"""
+import mimetypes
+import re
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+TAILLE_BLOC = 64 * 1024
+_PLAGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def plage_demandee(entete, taille):
+    """
+    (début, fin incluse) de l'en-tête Range pour un fichier de `taille` octets.
+    None : pas d'en-tête, en-tête invalide ou plusieurs plages (fichier complet).
+    ValueError : plage entièrement hors du fichier (416).
+    """
+    correspondance = _PLAGE.match(entete.replace(' ', '')) if entete else None
+    if not correspondance or correspondance.group(1) == correspondance.group(2) == '':
+        return None
+    debut, fin = correspondance.groups()
+    if debut == '':
+        # « -n » : les n derniers octets
+        if int(fin) == 0 or taille == 0:
+            raise ValueError("Plage vide.")
+        return max(0, taille - int(fin)), taille - 1
+    debut = int(debut)
+    if fin != '' and int(fin) < debut:
+        return None
+    if debut >= taille:
+        raise ValueError("Plage au-delà de la fin du fichier.")
+    return debut, taille - 1 if fin == '' else min(int(fin), taille - 1)
+
+
+def _if_range_valide(request, etag, derniere_modification):
+    """ If-Range absent, ou désignant encore la version actuelle du fichier (comparaison forte). """
+    valeur = request.META.get('HTTP_IF_RANGE')
+    if not valeur:
+        return True
+    if valeur.startswith(('"', 'W/')):
+        return valeur == etag
+    return parse_http_date_safe(valeur) == derniere_modification
+
+
+def _lire(chemin, debut, fin):
+    with default_storage.open(chemin, 'rb') as fichier:
+        fichier.seek(debut)
+        reste = fin - debut + 1
+        while reste > 0:
+            bloc = fichier.read(min(TAILLE_BLOC, reste))
+            if not bloc:
+                break
+            reste -= len(bloc)
+            yield bloc
+
+
+def _deleguer(chemin, nom, type_contenu):
+    """ Réponse vide qui confie l'envoi au serveur web ; None si le stockage n'a pas de fichier local. """
+    delegation = settings.RAPPORTS_DELEGATION
+    reponse = HttpResponse(content_type=type_contenu)
+    if delegation == 'x-accel-redirect':
+        reponse['X-Accel-Redirect'] = settings.RAPPORTS_DELEGATION_PREFIXE.rstrip('/') + '/' + chemin.replace('\\', '/').lstrip('/')
+    elif delegation == 'x-sendfile':
+        try:
+            reponse['X-Sendfile'] = default_storage.path(chemin)
+        except NotImplementedError:
+            return None
+    else:
+        raise ValueError(f"RAPPORTS_DELEGATION inconnu : {delegation!r}")
+    reponse['Content-Disposition'] = content_disposition_header(True, nom)
+    return reponse
+
+
+def _envoyer(request, chemin, nom, type_contenu, taille, etag, derniere_modification):
+    """ Envoi par Django : fichier complet (200), plage (206) ou plage impossible (416). """
+    plage = None
+    if _if_range_valide(request, etag, derniere_modification):
+        try:
+            plage = plage_demandee(request.META.get('HTTP_RANGE'), taille)
+        except ValueError:
+            reponse = HttpResponse(status=416)
+            reponse['Content-Range'] = f'bytes */{taille}'
+            return reponse
+    if plage is None:
+        return FileResponse(default_storage.open(chemin, 'rb'), as_attachment=True, filename=nom, content_type=type_contenu)
+
+    debut, fin = plage
+    reponse = StreamingHttpResponse(_lire(chemin, debut, fin), status=206, content_type=type_contenu)
+    reponse['Content-Length'] = fin - debut + 1
+    reponse['Content-Range'] = f'bytes {debut}-{fin}/{taille}'
+    reponse['Content-Disposition'] = content_disposition_header(True, nom)
+    return reponse
+
+
+def reponse_fichier(request, chemin, nom):
+    """
+    Réponse HTTP pour le fichier `chemin` du stockage, téléchargé sous le nom `nom` :
+    304 / 412 selon les préconditions, 206 ou 416 pour une plage, 200 sinon.
+    FileNotFoundError si le fichier n'existe plus.
+    """
+    taille = default_storage.size(chemin)
+    derniere_modification = int(default_storage.get_modified_time(chemin).timestamp())
+    etag = f'"{derniere_modification:x}-{taille:x}"'
+
+    reponse = get_conditional_response(request, etag=etag, last_modified=derniere_modification)
+    if reponse is None:
+        type_contenu = mimetypes.guess_type(nom)[0] or 'application/octet-stream'
+        if settings.RAPPORTS_DELEGATION:
+            reponse = _deleguer(chemin, nom, type_contenu)
+        if reponse is None:
+            reponse = _envoyer(request, chemin, nom, type_contenu, taille, etag, derniere_modification)
+
+    reponse['ETag'] = etag
+    reponse['Last-Modified'] = http_date(derniere_modification)
+    reponse['Accept-Ranges'] = 'bytes'
+    # Fichier réservé au syndic : gardé par le navigateur seulement, revalidé à chaque téléchargement
+    reponse['Cache-Control'] = 'private, no-cache'
+    return reponse
@@ -1,3 +1,357 @@
-from django.test import TestCase
+import codecs
+import csv
+import io
+import zipfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from claims.models import Reclamation
+from consumption.models import Releve
+from consumption.tests import CompteurFabrique, RequetesConstantesMixin, creer_syndic
+from consumption.utils import calculer_consommations
+from users.models import Resident
+from . import lots
+from .exports import ecrire_csv, ecrire_xlsx
+from .models import Rapport, StatistiqueConsommation
+from .lots import generer_lot
+from .moteur_pdf import Colonne, DocumentPDF
+from .services import cle_rapport, creer_pdf_detaille, version_donnees, versions_donnees_pdf
+from .statistiques import cumul, recalculer
+from .taches import pool_rapports
+
+
+class RequetesRapportsTests(RequetesConstantesMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.syndic, self.client_api = creer_syndic()
+        self.numero = 0
+
+    def test_tableau_de_bord(self):
+        def creer(n):
+            CompteurFabrique.compteurs(n)
+            for _ in range(n):
+                self.numero += 1
+                resident = Resident.objects.create_user(f"r{self.numero}@copro.fr", None, nom='N', prenom='P')
+                Reclamation.objects.create(resident=resident, description="Fuite")
+        self.assertRequetesConstantes(self.client_api, '/api/reports/dashboard/', creer)
+
+    def test_tableau_de_bord_conditionnel(self):
+        url = '/api/reports/dashboard/'
+        premiere = self.client_api.get(url)
+        self.assertEqual(self.compter_requetes(self.client_api, url), 0)
+
+        inchange = self.client_api.get(url, HTTP_IF_NONE_MATCH=premiere['ETag'])
+        self.assertEqual(inchange.status_code, 304)
+
+        # Une écriture sur une table comptée invalide l'instantané
+        resident = Resident.objects.create_user("nouveau@copro.fr", None, nom='N', prenom='P')
+        Reclamation.objects.create(resident=resident, description="Fuite")
+        modifie = self.client_api.get(url, HTTP_IF_NONE_MATCH=premiere['ETag'])
+        self.assertEqual(modifie.status_code, 200)
+        self.assertEqual(modifie.data['communaute']['habitants'], premiere.data['communaute']['habitants'] + 1)
+        self.assertEqual(modifie.data['maintenance']['reclamations_ouvertes'], 1)
+
+
+class GenerationRapportTests(TestCase):
+    url = '/api/reports/rapports/generer/'
+
+    def setUp(self):
+        self.syndic, self.client_api = creer_syndic()
+        compteur, = CompteurFabrique.compteurs(1)
+        self.demande = {'type_rapport': 'Mensuel', 'periode': '2026-01', 'format_export': 'CSV', 'partie_commune_id': compteur.partie_commune_id}
+
+    def test_reserve_au_syndic(self):
+        resident = Resident.objects.create_user("resident@copro.fr", None, nom='N', prenom='P')
+        client = APIClient()
+        client.force_authenticate(resident)
+        with mock.patch.object(pool_rapports, 'soumettre') as soumettre:
+            self.assertEqual(client.post(self.url, self.demande, format='json').status_code, 403)
+        soumettre.assert_not_called()
+        self.assertFalse(Rapport.objects.exists())
+
+    def test_demande_acceptee_puis_reprise(self):
+        with mock.patch.object(pool_rapports, 'soumettre', return_value=True) as soumettre, \
+                mock.patch.object(pool_rapports, 'en_charge', return_value=True):
+            premiere = self.client_api.post(self.url, self.demande, format='json')
+            seconde = self.client_api.post(self.url, self.demande, format='json')
+        self.assertEqual((premiere.status_code, seconde.status_code), (202, 202))
+        # Demande identique sur les mêmes données : même rapport, pas de nouvelle génération
+        self.assertEqual(premiere.data['rapport_id'], seconde.data['rapport_id'])
+        soumettre.assert_called_once()
+
+    def test_pool_sature(self):
+        with mock.patch.object(pool_rapports, 'soumettre', return_value=False):
+            reponse = self.client_api.post(self.url, self.demande, format='json')
+        self.assertEqual(reponse.status_code, 429)
+        self.assertEqual(reponse['Retry-After'], '10')
+        self.assertFalse(Rapport.objects.exists())
+
+
+class GenerationLotTests(TestCase):
+
+    def setUp(self):
+        self.zones = [compteur.partie_commune_id for compteur in CompteurFabrique.compteurs(2)]
+
+    def generer(self, **options):
+        bilan = generer_lot(['2026-01'], processus=1, **options)
+        for chemin in Rapport.objects.values_list('fichier_chemin', flat=True):
+            self.addCleanup(default_storage.delete, chemin)
+        return bilan
+
+    def test_lot_puis_reprise(self):
+        bilan = self.generer()
+        self.assertEqual((bilan['rapports'], bilan['repris'], bilan['echecs']), (2, 0, 0))
+        rapports = list(Rapport.objects.order_by('id'))
+        self.assertEqual(sorted(rapport.configuration['partie_commune_id'] for rapport in rapports), self.zones)
+        for rapport in rapports:
+            self.assertEqual(rapport.statut, Rapport.STATUT_TERMINE)
+            with default_storage.open(rapport.fichier_chemin) as f:
+                self.assertEqual(f.read(5), b'%PDF-')
+
+        # Données inchangées : rien n'est redessiné
+        bilan = self.generer()
+        self.assertEqual((bilan['rapports'], bilan['repris']), (0, 2))
+        # Forcé : mêmes lignes mises à jour, pas de doublons
+        bilan = self.generer(forcer=True)
+        self.assertEqual(bilan['rapports'], 2)
+        self.assertEqual(list(Rapport.objects.order_by('id').values_list('id', 'cle_cache')), [(r.id, r.cle_cache) for r in rapports])
+
+    def test_echec_d_un_rendu(self):
+        rendre = lots._rendre
+
+        def _rendre(tache):
+            if tache[1]['partie_commune_id'] == self.zones[0]:
+                raise OSError("disque plein")
+            return rendre(tache)
+
+        with mock.patch.object(lots, '_rendre', _rendre), self.assertLogs('reports.lots', 'ERROR'):
+            bilan = self.generer()
+        # Le rapport dessiné est gardé, l'autre sera repris au prochain lot
+        self.assertEqual((bilan['rapports'], bilan['echecs']), (1, 1))
+        self.assertEqual(Rapport.objects.get().configuration['partie_commune_id'], self.zones[1])
+        self.assertEqual(self.generer()['rapports'], 1)
+        self.assertEqual(Rapport.objects.count(), 2)
+
+
+class CleRapportTests(TestCase):
+
+    def test_invalidation_limitee_aux_donnees_couvertes(self):
+        compteur, autre_zone = CompteurFabrique.compteurs(2)
+        septembre = datetime(2026, 9, 10, tzinfo=dt_timezone.utc)
+        releve = Releve.objects.create(compteur=compteur, valeur=10, date_releve=septembre, methode_releve='Manuelle')
+        config = {'type_rapport': 'Relevés', 'periode': '2026-09', 'format_export': 'EXCEL',
+                  'partie_commune_id': compteur.partie_commune_id}
+        cle = cle_rapport(config)
+        self.assertEqual(cle, cle_rapport(dict(config)))
+        self.assertNotEqual(cle, cle_rapport({**config, 'format_export': 'CSV'}))
+
+        # Relevés hors du rapport : autre mois, autre zone
+        Releve.objects.create(compteur=compteur, valeur=12, date_releve=septembre + timedelta(days=30), methode_releve='Manuelle')
+        Releve.objects.create(compteur=autre_zone, valeur=12, date_releve=septembre, methode_releve='Manuelle')
+        self.assertEqual(cle, cle_rapport(config))
+
+        # Correction d'un relevé couvert
+        releve.est_corrige = True
+        releve.save()
+        self.assertNotEqual(cle, cle_rapport(config))
+
+    def test_versions_par_lot_identiques(self):
+        compteurs = CompteurFabrique.compteurs(3)
+        for i, compteur in enumerate(compteurs[:2]):
+            Releve.objects.create(compteur=compteur, valeur=10 + i, date_releve=datetime(2026, 9, 1, tzinfo=dt_timezone.utc), methode_releve='Manuelle')
+        partie_ids = [compteur.partie_commune_id for compteur in compteurs]
+        versions = versions_donnees_pdf(partie_ids)
+        for partie_id in partie_ids:
+            config = {'type_rapport': 'Mensuel', 'periode': '2026-09', 'format_export': 'PDF', 'partie_commune_id': partie_id}
+            self.assertEqual(versions[partie_id], version_donnees(config))
+        self.assertEqual(len(set(versions.values())), 3)
+
+
+
+class StatistiquesConsommationTests(TestCase):
+
+    def test_maintenance_incrementale_identique_au_recalcul(self):
+        compteur, = CompteurFabrique.compteurs(1)
+        debut = datetime(2026, 1, 31, 20, tzinfo=dt_timezone.utc)
+        valeurs = [float(1 + (i * 37) % 200) for i in range(400)]
+        for i, valeur in enumerate(valeurs):
+            Releve.objects.create(compteur=compteur, valeur=valeur, date_releve=debut + timedelta(minutes=5 * i), methode_releve='Manuelle')
+
+        lignes = list(StatistiqueConsommation.objects.order_by('periode'))
+        self.assertEqual([ligne.periode for ligne in lignes], ['2026-01', '2026-02'])
+        total = cumul(lignes)
+        self.assertEqual((total['nombre'], total['minimum'], total['maximum']), (400, 1.0, 200.0))
+        self.assertAlmostEqual(total['somme'], sum(valeurs))
+        mediane = sorted(valeurs)[len(valeurs) // 2]
+        self.assertLess(abs(total['mediane'] - mediane) / mediane, 0.02)
+
+        incrementales = {ligne.periode: (ligne.nombre, ligne.somme, ligne.esquisse) for ligne in lignes}
+        recalculer()
+        self.assertEqual(
+            incrementales,
+            {ligne.periode: (ligne.nombre, ligne.somme, ligne.esquisse) for ligne in StatistiqueConsommation.objects.all()},
+        )
+
+    def test_cout_depuis_les_consommations(self):
+        # Index cumulés : 1000 -> 1010 -> 1030 en janvier, soit 30 consommés (et non 3040)
+        compteur, = CompteurFabrique.compteurs(1)
+        debut = datetime(2026, 1, 5, tzinfo=dt_timezone.utc)
+        for i, valeur in enumerate((1000.0, 1010.0, 1030.0)):
+            Releve.objects.create(compteur=compteur, valeur=valeur, date_releve=debut + timedelta(days=i), methode_releve='Manuelle')
+        self.assertEqual(cumul(StatistiqueConsommation.objects.all())['cout_total'], 0.0)
+
+        calculer_consommations(tarif=2.0)
+        self.assertEqual(StatistiqueConsommation.objects.get().cout_total, 60.0)
+        self.assertEqual(cumul(StatistiqueConsommation.objects.all())['cout_total'], 60.0)
+        recalculer()
+        self.assertEqual(StatistiqueConsommation.objects.get().cout_total, 60.0)
+
+
+class MoteurPDFTests(TestCase):
+    COLONNES = (Colonne('Date', 4), Colonne('Valeur', 3, 'droite', '.2f'), Colonne('Corrigé', 2))
+
+    def rendre(self, nombre):
+        """ (pages, lignes par page) d'un tableau de `nombre` lignes. """
+        origine = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        ecrites = []
+        document = DocumentPDF(io.BytesIO(), "Essai", "Pagination")
+        document.tableau(
+            self.COLONNES, ((origine + timedelta(hours=i), i * 1.5, i % 2 == 0) for i in range(nombre)),
+            titre="Compteur", progression=ecrites.append,
+        )
+        pages = document.terminer()
+        # Chaque page terminée a été compressée au fil du rendu
+        self.assertTrue(all(page.stream is None and 'Filter' in page.Contents.dictionary.dict for page in document.canvas._doc.Pages.pages))
+        return pages, [fin - debut for debut, fin in zip([0] + ecrites, ecrites)]
+
+    def test_pagination(self):
+        pages, par_page = self.rendre(500)
+        self.assertEqual(sum(par_page), 500)
+        self.assertEqual(pages, len(par_page))
+        # Un tableau qui remplit exactement deux pages n'en ouvre pas une troisième (« suite » vide)
+        self.assertEqual(self.rendre(par_page[0] + par_page[1])[0], 2)
+        self.assertEqual(self.rendre(0)[0], 1)
+
+
+class RapportDetailleTests(TestCase):
+
+    def test_consommation_et_cout_depuis_les_differences_d_index(self):
+        compteur, = CompteurFabrique.compteurs(1)
+        debut = datetime(2026, 1, 5, tzinfo=dt_timezone.utc)
+        for i, valeur in enumerate((1000.0, 1010.0, 1030.0)):
+            Releve.objects.create(compteur=compteur, valeur=valeur, date_releve=debut + timedelta(days=i), methode_releve='Manuelle')
+        calculer_consommations(tarif=2.0)
+        config = {
+            'partie_commune_id': compteur.partie_commune_id, 'periode': '2026-01', 'type_rapport': 'Mensuel',
+            'format_export': 'PDF', 'detaille': True,
+        }
+        paires = []
+        with mock.patch.object(DocumentPDF, 'paires', autospec=True, side_effect=lambda document, lignes: paires.extend(lignes)):
+            chemin, pages = creer_pdf_detaille(config, cle_rapport(config))
+        self.addCleanup(default_storage.delete, chemin)
+        self.assertEqual(pages, 1)
+        synthese = dict(paires)
+        self.assertEqual((synthese['Consommation totale'], synthese['Coût total']), (30.0, 60.0))
+
+
+class TelechargementRapportTests(TestCase):
+
+    def setUp(self):
+        self.syndic, self.client_api = creer_syndic()
+        self.contenu = bytes(range(256)) * 40
+        chemin = default_storage.save('reports_exports/test_telechargement.pdf', ContentFile(self.contenu))
+        self.addCleanup(default_storage.delete, chemin)
+        rapport = Rapport.objects.create(
+            type_rapport='Test', format_export='PDF', configuration={}, statut=Rapport.STATUT_TERMINE, fichier_chemin=chemin
+        )
+        self.url = f'/api/reports/rapports/telecharger/{rapport.id}/'
+
+    def telecharger(self, **entetes):
+        reponse = self.client_api.get(self.url, **entetes)
+        corps = b''.join(reponse.streaming_content) if reponse.streaming else reponse.content
+        return reponse, corps
+
+    def test_plages_et_preconditions(self):
+        complet, corps = self.telecharger()
+        self.assertEqual((complet.status_code, corps), (200, self.contenu))
+        self.assertEqual(complet['Accept-Ranges'], 'bytes')
+        etag, taille = complet['ETag'], len(self.contenu)
+
+        for plage, debut, fin in (('bytes=100-199', 100, 199), ('bytes=10000-', 10000, taille - 1), ('bytes=-24', taille - 24, taille - 1)):
+            partiel, corps = self.telecharger(HTTP_RANGE=plage)
+            self.assertEqual(partiel.status_code, 206, plage)
+            self.assertEqual(corps, self.contenu[debut:fin + 1])
+            self.assertEqual(partiel['Content-Range'], f'bytes {debut}-{fin}/{taille}')
+
+        hors, _ = self.telecharger(HTTP_RANGE=f'bytes={taille}-')
+        self.assertEqual((hors.status_code, hors['Content-Range']), (416, f'bytes */{taille}'))
+        # Plusieurs plages, ou If-Range sur une autre version : fichier complet
+        self.assertEqual(self.telecharger(HTTP_RANGE='bytes=0-1,5-6')[0].status_code, 200)
+        self.assertEqual(self.telecharger(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"autre"')[0].status_code, 200)
+        self.assertEqual(self.telecharger(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=etag)[0].status_code, 206)
+
+        self.assertEqual(self.telecharger(HTTP_IF_NONE_MATCH=etag)[0].status_code, 304)
+        self.assertEqual(self.telecharger(HTTP_IF_MODIFIED_SINCE=complet['Last-Modified'])[0].status_code, 304)
+        self.assertEqual(self.telecharger(HTTP_IF_MATCH='"autre"')[0].status_code, 412)
+
+    @override_settings(RAPPORTS_DELEGATION='x-accel-redirect', RAPPORTS_DELEGATION_PREFIXE='/rapports-internes/')
+    def test_envoi_delegue(self):
+        reponse, corps = self.telecharger(HTTP_RANGE='bytes=0-9')
+        self.assertEqual((reponse.status_code, corps), (200, b''))
+        self.assertEqual(reponse['X-Accel-Redirect'], '/rapports-internes/reports_exports/test_telechargement.pdf')
+        self.assertIn('attachment', reponse['Content-Disposition'])
+        self.assertEqual(self.telecharger(HTTP_IF_NONE_MATCH=reponse['ETag'])[0].status_code, 304)
+
+
+class ExportsTabulairesTests(TestCase):
+    entetes = ('Compteur', 'Valeur', 'Date', 'Corrigé', 'Commentaire')
+    lignes = [
+        ('CPT-1', 12.5, datetime(2025, 1, 1, 12, tzinfo=dt_timezone.utc), False, 'Index <relu> & "validé"'),
+        ('CPT-2', 3, datetime(2025, 1, 2, 6, tzinfo=dt_timezone.utc), True, None),
+    ] * 3
+
+    def test_xlsx(self):
+        fichier, avancements = io.BytesIO(), []
+        with mock.patch('reports.exports.TAILLE_PAQUET', 4):
+            self.assertEqual(ecrire_xlsx(fichier, self.entetes, iter(self.lignes), nom_feuille='Relevés & co ' * 4, progression=avancements.append), 6)
+        self.assertEqual(avancements, [4])
+
+        with zipfile.ZipFile(fichier) as archive:
+            self.assertIsNone(archive.testzip())
+            classeur = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+            feuille = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        ns = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        self.assertEqual(classeur.find('x:sheets/x:sheet', ns).get('name'), ('Relevés & co ' * 4)[:31])
+
+        def valeur(cellule):
+            texte = cellule.find('x:is/x:t', ns)
+            return texte.text if texte is not None else (cellule.findtext('x:v', namespaces=ns), cellule.get('t'), cellule.get('s'))
+        lignes = [[valeur(cellule) for cellule in ligne] for ligne in feuille.iter('{%s}row' % ns['x'])]
+        self.assertEqual(len(lignes), 7)
+        self.assertEqual(lignes[0], list(self.entetes))
+        self.assertEqual(lignes[1], ['CPT-1', ('12.5', None, None), (str(45658.5), None, '1'), ('0', 'b', None), 'Index <relu> & "validé"'])
+        self.assertEqual(lignes[2][1], ('3', None, None))
+        self.assertEqual(lignes[2][4], (None, None, None))
+
+    def test_csv(self):
+        fichier, avancements = io.BytesIO(), []
+        with mock.patch('reports.exports.TAILLE_PAQUET', 4):
+            self.assertEqual(ecrire_csv(fichier, self.entetes, iter(self.lignes), progression=avancements.append), 6)
+        self.assertEqual(avancements, [4])
+        self.assertFalse(fichier.closed)
+
+        contenu = fichier.getvalue()
+        self.assertTrue(contenu.startswith(codecs.BOM_UTF8))
+        lignes = list(csv.reader(io.StringIO(contenu.decode('utf-8-sig')), delimiter=';'))
+        self.assertEqual(lignes[0], list(self.entetes))
+        self.assertEqual(lignes[1], ['CPT-1', '12.5', '2025-01-01T12:00:00+00:00', 'False', 'Index <relu> & "validé"'])
+        self.assertEqual(lignes[2][4], '')
+        self.assertEqual(len(lignes), 7)
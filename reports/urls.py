@@ -3,7 +3,9 @@ from django.urls import path
 from .views import (
     RapportGenerationAPIView, 
     RapportDownloadAPIView, 
-    GlobalDashboardStatsView
+    RapportStatutAPIView,
+    GlobalDashboardStatsView,
+    StatistiquesConsommationAPIView,
 )
 
 urlpatterns = [
@@ -13,6 +15,12 @@ urlpatterns = [
     # 2. Génération du rapport (POST avec config)
     path('rapports/generer/', RapportGenerationAPIView.as_view(), name='generer-rapport'),
     
-    # 3. Téléchargement du fichier (GET avec ID)
+    # 3. Suivi de la génération (statut, progression)
+    path('rapports/<int:rapport_id>/statut/', RapportStatutAPIView.as_view(), name='statut-rapport'),
+
+    # 4. Téléchargement du fichier (GET avec ID)
     path('rapports/telecharger/<int:rapport_id>/', RapportDownloadAPIView.as_view(), name='telecharger-rapport'),
+
+    # 5. Statistiques mensuelles combinées (zones, périodes, centiles)
+    path('statistiques/', StatistiquesConsommationAPIView.as_view(), name='statistiques-consommation'),
 ]
\ No newline at end of file
@@ -3,125 +3,118 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from django.db import models
-from django.http import FileResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
 
 from .serializers import RapportConfigSerializer
 from .models import Rapport, StatistiqueConsommation
 from claims.models import Reclamation , Intervention
 from consumption.models import Releve, PartieCommune
 from users.models import Syndic, Resident , TechnicienMaintenance
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
 from django.core.files.storage import default_storage
-from consumption.models import PartieCommune, Compteur
+from consumption.models import PartieCommune, Compteur, AgregatPartieCommune
 from alerts.models import Alerte , SeuilAlerte
 import os
 from claims.views import IsSyndicPermission
+from .services import cle_rapport
+from .statistiques import cumul
+from . import tableau_de_bord
+from .taches import pool_rapports
+from .telechargements import reponse_fichier
 
-def creer_pdf_complet(stats_conso, config):
-    """
-    Génère un PDF avec stats de consommation ET situation globale.
-    """
-    filename = f"rapport_global_{config['periode']}.pdf"
-    folder = 'reports_exports'
-    if not os.path.exists(folder): os.makedirs(folder)
-    filepath = os.path.join(folder, filename)
-    
-    with default_storage.open(filepath, 'wb') as f:
-        p = canvas.Canvas(f, pagesize=A4)
-        # --- EN-TÊTE ---
-        p.setFont("Helvetica-Bold", 18)
-        p.drawString(50, 800, "RAPPORT DE SITUATION COPROPRIÉTÉ")
-        p.setFont("Helvetica", 12)
-        p.drawString(50, 780, f"Période : {config['periode']}")
-        
-        # --- SECTION 1 : MEMBRES & RÉCLAMATIONS ---
-        p.setFont("Helvetica-Bold", 14)
-        p.drawString(50, 740, "1. Situation des Membres et Réclamations")
-        p.setFont("Helvetica", 11)
-        p.drawString(70, 720, f"- Nombre de Résidents : {Resident.objects.count()}")
-        p.drawString(70, 700, f"- Réclamations en attente : {Reclamation.objects.filter(statut='OUVERTE').count()}")
-        
-        # --- SECTION 2 : CONSOMMATION ---
-        p.setFont("Helvetica-Bold", 14)
-        p.drawString(50, 660, "2. Analyse de Consommation")
-        p.setFont("Helvetica", 11)
-        p.drawString(70, 640, f"- Moyenne période : {stats_conso['valeur_moyenne']} unités")
-        
-        p.showPage()
-        p.save()
-    
-    return filepath
-# Mise à jour de GlobalDashboardStatsView dans reports/views.py
 
 class GlobalDashboardStatsView(APIView):
+    """
+    Indicateurs globaux du tableau de bord syndic, servis depuis un instantané en cache
+    (reports/tableau_de_bord.py). ETag : un tableau de bord inchangé coûte une réponse 304.
+    """
     permission_classes = [IsAuthenticated, IsSyndicPermission]
 
     def get(self, request):
-        return Response({
-            "infrastructure": {
-                "parties_communes": PartieCommune.objects.count(),
-                "total_compteurs": Compteur.objects.count(),
-            },
-            "communaute": {
-                "habitants": Resident.objects.count(),
-                "staff_technique": TechnicienMaintenance.objects.count(),
-            },
-            "maintenance": {
-                # Correction du nom de clé pour le frontend
-                "reclamations_ouvertes": Reclamation.objects.filter(statut='OUVERTE').count(),
-                "alertes_critiques": Alerte.objects.filter(seuil__type_alerte='SURCONS', est_traitee=False).count(),
-                "interventions_en_cours": Intervention.objects.filter(reclamation__statut='EN_COURS').count(),
-                "taux_resolution": self.get_resolution_rate(),
-            }
-        })
-
-    def get_resolution_rate(self):
-        total = Reclamation.objects.count()
-        if total == 0: return 100
-        resolues = Reclamation.objects.filter(statut='RESOLUE').count()
-        return round((resolues / total) * 100, 2)
-    
+        etag, donnees = tableau_de_bord.instantane()
+        reponse = get_conditional_response(request, etag=etag) or Response(donnees)
+        reponse['ETag'] = etag
+        # Le navigateur garde la réponse mais la revalide à chaque appel (If-None-Match)
+        reponse['Cache-Control'] = 'private, no-cache'
+        return reponse
+
+
+def etat_rapport(rapport):
+    """ Corps de réponse décrivant l'état d'une génération (statut, progression, liens). """
+    donnees = {
+        "rapport_id": rapport.id,
+        "statut": rapport.statut,
+        "progression": rapport.progression,
+        "preview_stats": rapport.apercu,
+        "url_statut": reverse('statut-rapport', args=[rapport.id]),
+    }
+    if rapport.statut == Rapport.STATUT_TERMINE:
+        donnees["url_telechargement"] = reverse('telecharger-rapport', args=[rapport.id])
+    elif rapport.statut == Rapport.STATUT_ECHEC:
+        donnees["erreur"] = rapport.erreur
+    return donnees
+
+
 class RapportGenerationAPIView(APIView):
-    Permission_classes= [IsAuthenticated, IsSyndicPermission]
+    """
+    Demande de rapport : répond tout de suite (202) avec l'identifiant de la tâche.
+    Le fichier est rendu par le pool de reports/taches.py ; suivre GET rapports/<id>/statut/.
+
+    Cache : une demande identique sur des données inchangées (même services.cle_rapport) reprend
+    le rapport existant, déjà prêt (200) ou encore en cours (202), sans nouvelle génération.
+    """
+    permission_classes = [IsAuthenticated, IsSyndicPermission]
+
     def post(self, request):
         serializer = RapportConfigSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=400)
         
         config = serializer.validated_data
-        
-        # Calcul des stats de consommation réelles
-        releves = Releve.objects.filter(compteur__partie_commune_id=config['partie_commune_id'])
-        stats_conso = {
-            'valeur_moyenne': releves.aggregate(models.Avg('valeur'))['valeur__avg'] or 0
-        }
-
-        # Génération du fichier réel
-        if config['format_export'] == 'PDF':
-            path = creer_pdf_complet(stats_conso, config)
-        else:
-            return Response({"error": "Excel non implémenté"}, status=400)
-
-        # Enregistrement en base pour historique
+        cle = cle_rapport(config)
+        existant = (
+            Rapport.objects.filter(cle_cache=cle)
+            .exclude(statut=Rapport.STATUT_ECHEC).order_by('-id').first()
+        )
+        if existant is not None:
+            if existant.statut != Rapport.STATUT_TERMINE and pool_rapports.en_charge(existant.id):
+                return Response({"status": "accepted", **etat_rapport(existant)}, status=status.HTTP_202_ACCEPTED)
+            if existant.statut == Rapport.STATUT_TERMINE and existant.fichier_chemin and default_storage.exists(existant.fichier_chemin):
+                return Response({"status": "cached", **etat_rapport(existant)}, status=status.HTTP_200_OK)
+
+        # Enregistrement en base : le rapport sert aussi de tâche
         rapport = Rapport.objects.create(
             type_rapport=config['type_rapport'],
             format_export=config['format_export'],
-            fichier_chemin=path
+            configuration=config,
+            cle_cache=cle,
         )
+        if not pool_rapports.soumettre(rapport.id):
+            rapport.delete()
+            return Response(
+                {"detail": "Trop de rapports en cours de génération, réessayez dans un instant."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': '10'}
+            )
+
+        return Response({"status": "accepted", **etat_rapport(rapport)}, status=status.HTTP_202_ACCEPTED)
 
-        return Response({
-            "status": "success",
-            "rapport_id": rapport.id,
-            "preview_stats": stats_conso
-        })
+
+class RapportStatutAPIView(APIView):
+    """
+    État d'une génération de rapport (à interroger jusqu'à TERMINE ou ECHEC).
+    """
+    permission_classes = [IsAuthenticated, IsSyndicPermission]
+
+    def get(self, request, rapport_id):
+        return Response(etat_rapport(get_object_or_404(Rapport, pk=rapport_id)))
 
 
 class RapportDownloadAPIView(APIView):
     """
     Vue pour télécharger le fichier PDF/Excel une fois généré.
+    Reprise (Range, If-Range), revalidation (ETag, Last-Modified -> 304) et envoi délégué
+    au serveur web selon RAPPORTS_DELEGATION : voir reports/telechargements.py.
     """
     permission_classes = [IsAuthenticated, IsSyndicPermission] # Protection Syndic
 
@@ -129,12 +122,54 @@ class RapportDownloadAPIView(APIView):
         # On récupère les infos du rapport en base de données
         rapport = get_object_or_404(Rapport, pk=rapport_id)
         
+        if rapport.statut != Rapport.STATUT_TERMINE:
+            return Response({"detail": "Le rapport n'est pas encore prêt.", "statut": rapport.statut}, status=status.HTTP_409_CONFLICT)
         if not rapport.fichier_chemin:
             return Response({"detail": "Le fichier n'a pas été trouvé sur le serveur."}, status=404)
 
-        # On ouvre le fichier en mode binaire 'rb'
         try:
-            file_handle = default_storage.open(rapport.fichier_chemin, 'rb')
-            return FileResponse(file_handle, as_attachment=True, filename=os.path.basename(rapport.fichier_chemin))
+            return reponse_fichier(request, rapport.fichier_chemin, os.path.basename(rapport.fichier_chemin))
         except FileNotFoundError:
-            return Response({"detail": "Fichier physique manquant."}, status=404)
\ No newline at end of file
+            return Response({"detail": "Fichier physique manquant."}, status=404)
+
+
+class StatistiquesConsommationAPIView(APIView):
+    """
+    Statistiques de consommation combinées à la demande, à partir des lignes mensuelles de
+    StatistiqueConsommation (fusionnées, sans relire les relevés) : nombre, somme, moyenne,
+    min/max des relevés (index), médiane et centiles (p90, p95, p99), et coût des consommations
+    mensuelles correspondantes (Consommation).
+    Paramètres : zone_id (répétable ou séparé par des virgules), depuis / jusqua (AAAA-MM, inclus),
+    grouper=periode|zone pour un détail en plus du total.
+    """
+    permission_classes = [IsAuthenticated, IsSyndicPermission]
+
+    def get(self, request):
+        statistiques = StatistiqueConsommation.objects.all()
+        zones = [zone for valeur in request.query_params.getlist('zone_id') for zone in valeur.split(',') if zone]
+        if zones:
+            if not all(zone.isdigit() for zone in zones):
+                return Response({"zone_id": "Identifiants de zone entiers attendus."}, status=status.HTTP_400_BAD_REQUEST)
+            statistiques = statistiques.filter(partie_commune_id__in=zones)
+        for param, lookup in (('depuis', 'periode__gte'), ('jusqua', 'periode__lte')):
+            valeur = request.query_params.get(param)
+            if valeur:
+                if len(valeur) != 7 or valeur[4] != '-' or not (valeur[:4] + valeur[5:]).isdigit():
+                    return Response({param: "Période invalide (AAAA-MM)."}, status=status.HTTP_400_BAD_REQUEST)
+                statistiques = statistiques.filter(**{lookup: valeur})
+
+        grouper = request.query_params.get('grouper')
+        if grouper not in (None, 'periode', 'zone'):
+            return Response({"grouper": "Valeurs possibles : periode, zone."}, status=status.HTTP_400_BAD_REQUEST)
+
+        lignes = list(statistiques.only(
+            'periode', 'partie_commune_id', 'nombre', 'somme', 'valeur_minimale', 'valeur_maximale', 'cout_total', 'esquisse'
+        ))
+        donnees = {"total": cumul(lignes)}
+        if grouper:
+            champ = 'periode' if grouper == 'periode' else 'partie_commune_id'
+            groupes = {}
+            for ligne in lignes:
+                groupes.setdefault(getattr(ligne, champ), []).append(ligne)
+            donnees["detail"] = [{grouper: cle, **cumul(groupe)} for cle, groupe in sorted(groupes.items())]
+        return Response(donnees)
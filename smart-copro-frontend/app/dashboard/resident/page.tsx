@@ -3,6 +3,7 @@
 import React, { useState, useEffect, useCallback } from "react"
 import { ProtectedRoute } from "@/components/protected-route"
 import { axiosInstance } from "@/lib/axios-config"
+import { abonnerFlux } from "@/lib/flux-evenements"
 import { Card, CardContent } from "@/components/ui/card"
 import { Button } from "@/components/ui/button"
 import { Textarea } from "@/components/ui/textarea"
@@ -64,7 +65,7 @@ export default function ResidentDashboard() {
     const fetchEnergyData = async () => {
       setFetchingEnergy(true)
       try {
-        const readingRes = await axiosInstance.get(`/api/consumption/releves/?zone_id=${selectedZone}&limit=1`)
+        const readingRes = await axiosInstance.get(`/api/consumption/releves/?zone_id=${selectedZone}&page_size=1`)
         const readingData = readingRes.data.results || readingRes.data
         setLastReading(readingData[0] || null)
 
@@ -76,6 +77,17 @@ export default function ResidentDashboard() {
     fetchEnergyData()
   }, [selectedZone])
 
+  // Alertes de la zone et statut de mes réclamations poussés par le serveur
+  useEffect(() => abonnerFlux((type, donnees) => {
+    if (type === "alerte") {
+      setAlerts((prev) => [donnees, ...prev.filter((a) => a.id !== donnees.id)])
+    } else if (type === "reclamation") {
+      setClaims((prev) => prev.map((c) => (c.id === donnees.id ? { ...c, statut: donnees.statut } : c)))
+    } else {
+      fetchData()
+    }
+  }, selectedZone || undefined), [selectedZone, fetchData])
+
   const filteredClaims = claims.filter(c => 
     c.description.toLowerCase().includes(searchTerm.toLowerCase()) ||
     c.type_reclamation.toLowerCase().includes(searchTerm.toLowerCase())
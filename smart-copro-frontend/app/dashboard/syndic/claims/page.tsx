@@ -5,6 +5,7 @@ import { useRouter } from "next/navigation"
 import { SidebarNav } from "@/components/sidebar-nav"
 import { ProtectedRoute } from "@/components/protected-route"
 import { axiosInstance } from "@/lib/axios-config"
+import { abonnerFlux } from "@/lib/flux-evenements"
 import { Button } from "@/components/ui/button"
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
 import { toast } from "sonner"
@@ -31,8 +32,8 @@ export default function ClaimsAndAlerts() {
         axiosInstance.get("/api/claims/traitement/reclamations/"),
         axiosInstance.get("/api/alerts/liste/")
       ])
-      setReclamations(Array.isArray(recRes.data) ? recRes.data : [])
-      setAlerts(Array.isArray(alertRes.data) ? alertRes.data : [])
+      setReclamations(Array.isArray(recRes.data) ? recRes.data : recRes.data.results || [])
+      setAlerts(Array.isArray(alertRes.data) ? alertRes.data : alertRes.data.results || [])
     } catch (err) {
       toast.error("Erreur de synchronisation")
     } finally {
@@ -42,6 +43,19 @@ export default function ClaimsAndAlerts() {
 
   useEffect(() => { fetchData() }, [])
 
+  // Nouvelles alertes et changements de statut poussés par le serveur (plus de rechargement périodique)
+  useEffect(() => abonnerFlux((type, donnees) => {
+    if (type === "alerte") {
+      setAlerts((prev) => [donnees, ...prev.filter((a) => a.id !== donnees.id)])
+    } else if (type === "reclamation") {
+      setReclamations((prev) => prev.some((r) => r.id === donnees.id)
+        ? prev.map((r) => (r.id === donnees.id ? { ...r, ...donnees } : r))
+        : [donnees, ...prev])
+    } else {
+      fetchData()
+    }
+  }), [])
+
   const handleUpdateStatus = async (id: number, newStatus: string) => {
     try {
       await axiosInstance.patch(`/api/claims/traitement/reclamations/${id}/`, { statut: newStatus })
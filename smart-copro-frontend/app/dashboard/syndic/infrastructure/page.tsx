@@ -4,6 +4,7 @@ import { useState, useEffect, useMemo } from "react"
 import { SidebarNav } from "@/components/sidebar-nav"
 import { ProtectedRoute } from "@/components/protected-route"
 import { axiosInstance } from "@/lib/axios-config"
+import { abonnerFlux } from "@/lib/flux-evenements"
 import { Button } from "@/components/ui/button"
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
 import { Input } from "@/components/ui/input"
@@ -45,9 +46,10 @@ export default function InfrastructureManagement() {
   const [deletingZoneId, setDeletingZoneId] = useState<number | null>(null)
 
   const [zoneForm, setZoneForm] = useState({ nom: "", surface: 0 })
-  const [compteurForm, setCompteurForm] = useState({
+  // seuil_alerte vide : le seuil global de surconsommation s'applique
+  const [compteurForm, setCompteurForm] = useState<any>({
     reference: "", localisation: "", date_installation: "", 
-    type_compteur: "Eau", etat_compteur: "Actif", seuil_alerte: 200, partie_commune: ""
+    type_compteur: "Eau", etat_compteur: "Actif", seuil_alerte: null, partie_commune: ""
   })
   const [releveForm, setReleveForm] = useState({
     compteur_reference: "", valeur: 0, 
@@ -80,11 +82,26 @@ export default function InfrastructureManagement() {
     c.reference.toLowerCase().includes(searchTerm.toLowerCase())
   )
 
+  const surveillerAlerte = (reference: string) => {
+    const desabonner = abonnerFlux((type, donnees) => {
+      if (type === "alerte" && donnees.compteur_reference === reference) {
+        toast.warning("ALERTE : Seuil de consommation dépassé !")
+        arreter()
+      }
+    })
+    const minuterie = setTimeout(() => arreter(), 60000)
+    const arreter = () => { clearTimeout(minuterie); desabonner() }
+  }
+
   const handleSaisieReleve = async (e: React.FormEvent) => {
     e.preventDefault()
     try {
       const res = await axiosInstance.post("/api/consumption/releves/saisie/", releveForm)
-      if (res.data.alerte_generee) {
+      if (res.data.evaluation_differee) {
+        // Seuils évalués par le worker : l'alerte éventuelle arrive par le flux temps réel
+        toast.success("Relevé archivé, vérification des seuils en cours")
+        surveillerAlerte(releveForm.compteur_reference)
+      } else if (res.data.alerte_generee) {
         toast.warning("ALERTE : Seuil de consommation dépassé !")
       } else {
         toast.success("Relevé archivé avec succès")
@@ -196,7 +213,7 @@ export default function InfrastructureManagement() {
                           <AlertCircle className="w-3 h-3 text-red-400" /> Seuil
                         </label>
                         <span className="text-xl font-black text-red-600 italic">
-                          {comp.seuil_alerte} <small className="text-[10px] uppercase font-bold text-red-400">U</small>
+                          {comp.seuil_alerte ?? "Global"} {comp.seuil_alerte != null && <small className="text-[10px] uppercase font-bold text-red-400">U</small>}
                         </span>
                       </div>
 
@@ -236,7 +253,7 @@ export default function InfrastructureManagement() {
                 <div className="space-y-4">
                   <div className="p-4 bg-red-50 rounded-2xl border border-red-100 flex justify-between items-center">
                     <span className="text-xs font-black text-red-400 uppercase">Seuil critique</span>
-                    <span className="text-lg font-black text-red-600">{selectedCompteurForReleve?.seuil_alerte} U</span>
+                    <span className="text-lg font-black text-red-600">{selectedCompteurForReleve?.seuil_alerte != null ? `${selectedCompteurForReleve.seuil_alerte} U` : "Seuil global"}</span>
                   </div>
                   <div className="space-y-1">
                     <label className="text-[10px] font-black text-slate-400 uppercase tracking-widest ml-1">Nouvelle Valeur</label>
@@ -295,7 +312,7 @@ export default function InfrastructureManagement() {
                   </Select>
                 </div>
                 <div className="space-y-1"><label className="text-[10px] font-black text-slate-400 uppercase">Date Installation</label><Input type="date" value={compteurForm.date_installation} onChange={e => setCompteurForm({...compteurForm, date_installation: e.target.value})} required className="rounded-2xl h-14 border-2" /></div>
-                <div className="space-y-1"><label className="text-[10px] font-black text-slate-400 uppercase">Seuil Critique</label><Input type="number" value={compteurForm.seuil_alerte} onChange={e => setCompteurForm({...compteurForm, seuil_alerte: parseFloat(e.target.value)})} required className="rounded-2xl h-14 text-red-600 font-black border-2 border-red-100" /></div>
+                <div className="space-y-1"><label className="text-[10px] font-black text-slate-400 uppercase">Seuil Critique</label><Input type="number" value={compteurForm.seuil_alerte ?? ""} placeholder="Seuil global" onChange={e => setCompteurForm({...compteurForm, seuil_alerte: e.target.value === "" ? null : parseFloat(e.target.value)})} className="rounded-2xl h-14 text-red-600 font-black border-2 border-red-100" /></div>
                 <Button type="submit" className="col-span-2 h-16 bg-blue-600 hover:bg-blue-700 text-white font-black text-xl rounded-2xl shadow-xl mt-4 uppercase">Valider l'installation</Button>
               </form>
             </DialogContent>
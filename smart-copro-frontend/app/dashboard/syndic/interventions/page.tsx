@@ -38,7 +38,7 @@ export default function InterventionsManagement() {
       ])
       setInterventions(intRes.data)
       setTechnicians(techRes.data)
-      setClaims(claimRes.data.filter((c: any) => c.statut !== "RESOLUE"))
+      setClaims((claimRes.data.results || claimRes.data).filter((c: any) => c.statut !== "RESOLUE"))
     } catch (err) {
       toast.error("Erreur de chargement des données")
     } finally {
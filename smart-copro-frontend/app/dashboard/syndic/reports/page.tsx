@@ -53,21 +53,33 @@ export default function ReportsManagement() {
       setGeneratedReport(null)
       
       // Préparation des données pour le backend (conversion ID en number)
+      // "PDF_DETAILLE" n'est qu'un choix d'interface : PDF + option detaille côté backend
       const payload = {
         ...config,
+        format_export: config.format_export === "PDF_DETAILLE" ? "PDF" : config.format_export,
+        ...(config.format_export === "PDF_DETAILLE" ? { detaille: true } : {}),
         partie_commune_id: parseInt(config.partie_commune_id)
       }
 
-      // Appel direct à l'URL exacte du urls.py
+      // La génération est une tâche de fond : on suit son statut jusqu'à ce que le fichier soit prêt
       const res = await axiosInstance.post("/api/reports/rapports/generer/", payload)
-      
-      if (res.data.status === "success") {
+      let suivi = res.data
+      while (suivi.statut !== "TERMINE" && suivi.statut !== "ECHEC") {
+        await new Promise((resolve) => setTimeout(resolve, 1000))
+        suivi = (await axiosInstance.get(`/api/reports/rapports/${res.data.rapport_id}/statut/`)).data
+      }
+
+      if (suivi.statut === "TERMINE") {
         toast.success("Analyse terminée. Rapport disponible !")
-        setGeneratedReport(res.data)
+        setGeneratedReport(suivi)
+      } else {
+        toast.error(`Échec de la génération : ${suivi.erreur || "erreur inconnue"}`)
       }
     } catch (err: any) {
       console.error("Erreur Backend:", err.response?.data)
-      toast.error("Échec de la génération : Vérifiez les données")
+      toast.error(err.response?.status === 429
+        ? "Trop de rapports en cours, réessayez dans un instant."
+        : "Échec de la génération : Vérifiez les données")
     } finally {
       setIsGenerating(false)
     }
@@ -83,7 +95,8 @@ export default function ReportsManagement() {
       const url = window.URL.createObjectURL(new Blob([res.data]))
       const link = document.createElement('a')
       link.href = url
-      link.setAttribute('download', `rapport_copro_${config.periode}.pdf`)
+      const extension = { PDF: 'pdf', PDF_DETAILLE: 'pdf', EXCEL: 'xlsx', CSV: 'csv' }[config.format_export] ?? 'pdf'
+      link.setAttribute('download', `rapport_copro_${config.periode}.${extension}`)
       document.body.appendChild(link)
       link.click()
       link.remove()
@@ -140,7 +153,7 @@ export default function ReportsManagement() {
                       <label className="text-[10px] font-black uppercase text-slate-400 tracking-widest">Format</label>
                       <Select onValueChange={(v) => setConfig({...config, format_export: v})} defaultValue={config.format_export}>
                         <SelectTrigger className="h-14 rounded-2xl border-2 font-bold"><SelectValue /></SelectTrigger>
-                        <SelectContent><SelectItem value="PDF">Standard PDF</SelectItem><SelectItem value="EXCEL">Excel</SelectItem></SelectContent>
+                        <SelectContent><SelectItem value="PDF">Standard PDF</SelectItem><SelectItem value="PDF_DETAILLE">PDF détaillé</SelectItem><SelectItem value="EXCEL">Excel</SelectItem><SelectItem value="CSV">CSV</SelectItem></SelectContent>
                       </Select>
                     </div>
                   </div>
@@ -59,7 +59,7 @@ export default function ThresholdsManagement() {
       setFormData({ 
         ...formData, 
         compteur_reference: ref, 
-        valeur_seuil: selectedCompteur.seuil_alerte.toString() 
+        valeur_seuil: selectedCompteur.seuil_alerte != null ? selectedCompteur.seuil_alerte.toString() : formData.valeur_seuil
       })
     }
   }
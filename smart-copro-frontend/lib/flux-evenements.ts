@@ -0,0 +1,72 @@
+import { axiosInstance } from "@/lib/axios-config"
+
+export type TypeEvenement = "alerte" | "reclamation" | "resynchroniser"
+
+const DELAI_RECONNEXION = 5000
+const INTERVALLE_POLLING = 30000
+
+// Abonnement au flux temps réel (SSE) des alertes et réclamations.
+// EventSource ne permet pas d'en-tête Authorization : on demande d'abord un jeton de flux
+// (valable une minute, propre au flux) qui passe en paramètre à la place du jeton de session.
+// Si le serveur ne sert pas le flux (503, hors ASGI), on se rabat sur un rechargement périodique.
+export function abonnerFlux(
+  onEvenement: (type: TypeEvenement, donnees: any) => void,
+  zoneId?: string | number,
+) {
+  let source: EventSource | null = null
+  let minuterie: ReturnType<typeof setTimeout> | null = null
+  let polling: ReturnType<typeof setInterval> | null = null
+  let ferme = false
+  let reconnexion = false
+
+  const demarrerPolling = () => {
+    if (!polling) polling = setInterval(() => onEvenement("resynchroniser", {}), INTERVALLE_POLLING)
+  }
+
+  const planifier = (delai: number) => {
+    if (!ferme) minuterie = setTimeout(connecter, delai)
+  }
+
+  async function connecter() {
+    let jeton: string
+    try {
+      const { data } = await axiosInstance.post("/api/alerts/flux/jeton/")
+      jeton = data.jeton
+    } catch (erreur: any) {
+      if (erreur?.response?.status === 503) demarrerPolling()
+      else planifier(INTERVALLE_POLLING)
+      return
+    }
+    if (ferme) return
+
+    const params = new URLSearchParams({ jeton })
+    if (zoneId) params.set("zone_id", String(zoneId))
+    source = new EventSource(`${axiosInstance.defaults.baseURL}/api/alerts/flux/?${params}`)
+    source.onopen = () => {
+      // Événements manqués pendant la coupure : on recharge
+      if (reconnexion) onEvenement("resynchroniser", {})
+      reconnexion = true
+    }
+    source.onerror = () => {
+      // Le jeton a expiré entre-temps : EventSource ne peut pas se reconnecter seul avec la même URL
+      if (source && source.readyState === EventSource.CLOSED) {
+        source.close()
+        source = null
+        reconnexion = true
+        planifier(DELAI_RECONNEXION)
+      }
+    }
+    const types: TypeEvenement[] = ["alerte", "reclamation", "resynchroniser"]
+    types.forEach((type) =>
+      source!.addEventListener(type, (e) => onEvenement(type, JSON.parse((e as MessageEvent).data))),
+    )
+  }
+
+  connecter()
+  return () => {
+    ferme = true
+    if (minuterie) clearTimeout(minuterie)
+    if (polling) clearInterval(polling)
+    source?.close()
+  }
+}
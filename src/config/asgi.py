@@ -13,4 +13,5 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
+# Requis pour le flux temps réel /api/alerts/flux/ (SSE) : ex. `uvicorn config.asgi:application`
 application = get_asgi_application()
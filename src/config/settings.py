@@ -141,3 +141,28 @@ REST_FRAMEWORK = {
     )
 }
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Tarif de l'électricité (MAD / kWh) utilisé pour le coût des consommations
+TARIF_ELECTRICITE = 1.5
+
+# Évaluation des alertes hors requête (file TacheEvaluation + `manage.py traiter_alertes`).
+# À False (défaut), les seuils sont vérifiés pendant la saisie, sans worker.
+# À True, le worker doit tourner en permanence : sans lui, aucune alerte n'est levée
+# (surveiller le retard de la file : GET /api/alerts/file/ ou `traiter_alertes --etat`).
+ALERTES_ASYNCHRONES = False
+
+# Génération des rapports en tâche de fond (reports/taches.py) : rapports rendus en parallèle
+# par processus, et rapports acceptés en attente au-delà (ensuite : 429)
+RAPPORTS_CONCURRENCE = 2
+RAPPORTS_FILE_MAX = 20
+
+# Téléchargement des rapports (reports/telechargements.py) : '' = fichier envoyé par Django ;
+# 'x-accel-redirect' (nginx) ou 'x-sendfile' (Apache mod_xsendfile, lighttpd) = octets envoyés par le
+# serveur web après contrôle des droits. Pour nginx, le préfixe est une location interne sur la racine
+# du stockage, ex. : location /rapports-internes/ { internal; alias /srv/smart-copro/src/; }
+RAPPORTS_DELEGATION = ''
+RAPPORTS_DELEGATION_PREFIXE = '/rapports-internes/'
+
+# Instantané du tableau de bord syndic (reports/tableau_de_bord.py) : invalidé à chaque écriture
+# sur les tables comptées ; cette durée (s) borne l'âge d'un instantané pour les écritures sans signal
+TABLEAU_DE_BORD_DUREE = 300
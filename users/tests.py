@@ -1,3 +1,26 @@
 from django.test import TestCase
 
-# Create your tests here.
+from consumption.tests import RequetesConstantesMixin, creer_syndic
+from .models import Resident, TechnicienMaintenance
+
+
+class RequetesUtilisateursTests(RequetesConstantesMixin, TestCase):
+
+    def setUp(self):
+        self.syndic, self.client_api = creer_syndic()
+        self.numero = 0
+
+    def creer_utilisateurs(self, modele):
+        def creer(n):
+            for _ in range(n):
+                self.numero += 1
+                modele.objects.create_user(f"{modele.__name__.lower()}{self.numero}@copro.fr", None, nom='Nom', prenom='Prénom')
+        return creer
+
+    def test_liste_residents(self):
+        self.assertRequetesConstantes(self.client_api, '/api/users/gestion-residents/', self.creer_utilisateurs(Resident))
+
+    def test_liste_techniciens(self):
+        self.assertRequetesConstantes(
+            self.client_api, '/api/users/gestion-techniciens/', self.creer_utilisateurs(TechnicienMaintenance)
+        )